@@ -0,0 +1,323 @@
+import base64, json, os, socket, struct, threading, time, zlib
+from urllib.parse import urlsplit
+
+# Offline stand-ins for the browser side of the tools:
+#   FakeBrowser        in-memory cookie jar / DOM storage answering CDP commands
+#   FakeDriver         the Selenium WebDriver surface the scripts use (execute_cdp_cmd
+#                      pays a simulated chromedriver HTTP round trip + JSON hop)
+#   FakeDevToolsServer a local DevTools endpoint (/json/list + page websocket that
+#                      can also push events)
+# plus generators for synthetic jars, storage maps and profile trees.
+
+def synthetic_jar(n: int, value_size: int = 32, domains: int = 50):
+    """n CDP-shaped cookies spread over `domains` sites."""
+    now = time.time()
+    return [{
+        "name": f"ck_{i}",
+        "value": ("v%d_" % i).ljust(value_size, "x"),
+        "domain": f".site{i % domains}.example.co.uk",
+        "path": "/",
+        "expires": now + 86400 * (1 + i % 30) if i % 4 else -1,
+        "size": value_size + 8,
+        "httpOnly": i % 3 == 0,
+        "secure": i % 2 == 0,
+        "session": i % 4 == 0,
+        "sameSite": ("Lax", "Strict", "None")[i % 3],
+        "priority": "Medium",
+    } for i in range(n)]
+
+def synthetic_storage(n: int, value_size: int = 256):
+    return {f"key_{i}": ("s%d_" % i).ljust(value_size, "y") for i in range(n)}
+
+def synthetic_profile(root: str, files: int, file_size: int = 16 * 1024):
+    """A profile-shaped tree: half in Default/, half in a read-only component dir (hardlink candidates)."""
+    for i in range(files):
+        sub = "Default" if i % 2 else os.path.join("ZxcvbnData", "3")
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+        with open(os.path.join(root, sub, f"f{i}"), "wb") as f:
+            f.write(os.urandom(file_size))
+    return root
+
+def synthetic_png(width: int, height: int, banner: bool = False) -> bytes:
+    """RGB gradient page; a dark band over the bottom quarter stands in for a consent banner."""
+    rows = []
+    for y in range(height):
+        dark = banner and y >= height * 3 // 4
+        rows.append(b"\x00" + bytes(v for x in range(width)
+                                     for v in ((20, 20, 20) if dark else (255 * x // max(1, width - 1), 128, 200))))
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"".join(rows))) + chunk(b"IEND", b""))
+
+class FakeBrowser:
+    """Just enough CDP semantics for the extractor/importer hot paths."""
+
+    def __init__(self, cookies=None, storage=None, frames=None):
+        self.lock = threading.Lock()
+        self.cookies = {}
+        for c in cookies or []:
+            self._set(c)
+        self.storage = storage or {}   # {(origin, isLocal): {k: v}}
+        self.frames = frames or []     # extra iframe origins for Page.getFrameTree
+        self.url = "about:blank"
+        self.scripts = {}
+        self.perf_log = []      # chromedriver performance log entries (get_log("performance"))
+        self.js_cookie_log = []  # document.cookie writes buffered by the cookielab.timeline hook
+
+    def _set(self, c):
+        self.cookies[(c.get("name"), c.get("domain"), c.get("path") or "/")] = dict(c)
+
+    def navigate(self, url: str):
+        self.url = url
+
+    def origin(self):
+        u = urlsplit(self.url)
+        return f"{u.scheme}://{u.netloc}"
+
+    def command(self, method: str, params: dict):
+        with self.lock:
+            if method == "Network.getAllCookies":
+                return {"cookies": list(self.cookies.values())}
+            if method == "Network.setCookies":
+                for c in params.get("cookies", []):
+                    self._set(c)
+                return {}
+            if method == "Network.clearBrowserCookies":
+                self.cookies.clear()
+                return {}
+            if method == "Storage.clearDataForOrigin":
+                for key in [k for k in self.storage if k[0] == params.get("origin")]:
+                    del self.storage[key]
+                return {}
+            if method == "Page.addScriptToEvaluateOnNewDocument":
+                ident = str(len(self.scripts) + 1)
+                self.scripts[ident] = params.get("source", "")
+                return {"identifier": ident}
+            if method == "Page.removeScriptToEvaluateOnNewDocument":
+                self.scripts.pop(params.get("identifier"), None)
+                return {}
+            if method == "Page.getFrameTree":
+                return {"frameTree": {"frame": {"id": "main", "securityOrigin": self.origin()},
+                                      "childFrames": [{"frame": {"id": f"f{i}", "securityOrigin": o}}
+                                                      for i, o in enumerate(self.frames)]}}
+            if method == "Page.navigate":
+                self.url = params.get("url", self.url)
+                return {"frameId": "main", "loaderId": "L%d" % time.monotonic_ns()}
+            if method == "Page.getNavigationHistory":
+                return {"currentIndex": 0, "entries": [{"id": 0, "url": self.url}]}
+            if method == "Page.getLayoutMetrics":
+                return {"cssLayoutViewport": {"pageX": 0, "pageY": 0, "clientWidth": 1280, "clientHeight": 720}}
+            if method == "Page.captureScreenshot":
+                clip = params.get("clip") or {"width": 1280, "height": 720, "scale": 1}
+                banner = not any("consent" in (k[0] or "") for k in self.cookies)
+                png = synthetic_png(max(1, int(clip["width"] * clip["scale"])),
+                                    max(1, int(clip["height"] * clip["scale"])), banner)
+                return {"data": base64.b64encode(png).decode("ascii")}
+            if method.startswith("DOMStorage.") and method != "DOMStorage.enable":
+                sid = params.get("storageId") or {}
+                store = self.storage.setdefault((sid.get("securityOrigin"), bool(sid.get("isLocalStorage"))), {})
+                if method == "DOMStorage.getDOMStorageItems":
+                    return {"entries": [[k, v] for k, v in store.items()]}
+                if method == "DOMStorage.setDOMStorageItem":
+                    store[params["key"]] = params["value"]
+                elif method == "DOMStorage.clear":
+                    store.clear()
+                return {}
+            return {}
+
+class FakeDriver:
+    """Selenium WebDriver stand-in; rtt simulates the chromedriver HTTP hop per command."""
+
+    def __init__(self, browser: FakeBrowser = None, rtt: float = 0.001, debugger_address: str = None, **_):
+        self.browser = browser or FakeBrowser()
+        self.rtt = rtt
+        self.capabilities = {"goog:chromeOptions": {"debuggerAddress": debugger_address}} if debugger_address else {}
+        self.current_window_handle = "page-1"
+
+    def _hop(self, obj):
+        if self.rtt:
+            time.sleep(self.rtt)
+        return json.loads(json.dumps(obj))
+
+    @property
+    def current_url(self):
+        return self.browser.url
+
+    def get(self, url):
+        self._hop(url)
+        self.browser.navigate(url)
+
+    def execute_cdp_cmd(self, method, params):
+        return self._hop(self.browser.command(method, self._hop(params)))
+
+    def get_cookies(self):
+        return self._hop(list(self.browser.cookies.values()))
+
+    def add_cookie(self, c):
+        """Like WebDriver: only for the current document's host (InvalidCookieDomain otherwise)."""
+        self._hop(c)
+        host = urlsplit(self.browser.url).hostname or ""
+        dom = (c.get("domain") or host).lstrip(".")
+        if not (host == dom or host.endswith("." + dom)):
+            raise ValueError(f"invalid cookie domain: {c.get('domain')} on {host}")
+        self.browser._set(c)
+
+    def delete_all_cookies(self):
+        """Like WebDriver: only the cookies visible to the current document."""
+        self._hop(None)
+        host = urlsplit(self.browser.url).hostname or ""
+        for key in [k for k in self.browser.cookies
+                    if host == (k[1] or "").lstrip(".") or (k[1] or "").startswith(".") and host.endswith(k[1])]:
+            del self.browser.cookies[key]
+
+    def execute_script(self, script, *args):
+        self._hop(args)
+        if "document.cookie = " in script:  # cookielab.planner batch: [[i, "n=v; attr...", "n=v", check], ...]
+            host = urlsplit(self.browser.url).hostname
+            for _, line, _, _ in args[0]:
+                (pair, *attrs) = line.split("; ")
+                attrs = dict(a.split("=", 1) if "=" in a else (a, True) for a in attrs)
+                name, value = pair.split("=", 1)
+                dom = attrs.get("domain")
+                self.browser._set({"name": name, "value": value, "domain": f".{dom}" if dom else host,
+                                   "path": attrs.get("path", "/"), "secure": "secure" in attrs})
+            return []
+        if "__cookielabCookieLog" in script:  # cookielab.timeline page-buffer drain
+            out, self.browser.js_cookie_log = self.browser.js_cookie_log, []
+            return self._hop(out)
+        return None
+
+    def get_log(self, kind):
+        if kind != "performance":
+            return []
+        out, self.browser.perf_log = self.browser.perf_log, []
+        return self._hop(out)
+
+    def quit(self):
+        pass
+
+class FakeDevToolsServer:
+    """Local DevTools endpoint: GET /json/list plus one page websocket served with wsproto."""
+
+    def __init__(self, browser: FakeBrowser):
+        self.browser = browser
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.address = "127.0.0.1:%d" % self.sock.getsockname()[1]
+        self.clients = []  # (conn, WSConnection, send lock) of open page websockets
+        # Browser endpoint: Target.createBrowserContext etc.; each context is its own FakeBrowser
+        self.contexts, self.targets, self.sessions = {}, {}, {}
+        self.page_enabled = set()  # sessions that sent Page.enable (only they get Page.* events)
+        self._ids = iter(range(1, 1 << 30))
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        head = b""
+        while b"\r\n\r\n" not in head:
+            chunk = conn.recv(65536)
+            if not chunk:
+                conn.close()
+                return
+            head += chunk
+        if b"upgrade: websocket" not in head.lower():
+            if head.startswith(b"GET /json/version"):
+                body = json.dumps({"Browser": "FakeChrome/1.0",
+                                   "webSocketDebuggerUrl": f"ws://{self.address}/devtools/browser/b-1"}).encode()
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                             b"Connection: close\r\n\r\n%s" % (len(body), body))
+                conn.close()
+                return
+            body = json.dumps([{"id": "page-1", "type": "page", "url": self.browser.url,
+                                "webSocketDebuggerUrl": f"ws://{self.address}/devtools/page/page-1"}]).encode()
+            conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n%s" % (len(body), body))
+            conn.close()
+            return
+        self._serve_ws(conn, head)
+
+    def _serve_ws(self, conn, data):
+        from wsproto import ConnectionType, WSConnection
+        from wsproto.events import AcceptConnection, CloseConnection, Request, TextMessage
+        ws = WSConnection(ConnectionType.SERVER)
+        lock = threading.Lock()
+        parts = []
+        self.clients.append((conn, ws, lock))
+        try:
+            while data:
+                ws.receive_data(data)
+                for ev in ws.events():
+                    if isinstance(ev, Request):
+                        with lock:
+                            conn.sendall(ws.send(AcceptConnection()))
+                    elif isinstance(ev, TextMessage):
+                        parts.append(ev.data)
+                        if not ev.message_finished:
+                            continue
+                        msg, parts = json.loads("".join(parts)), []
+                        method, params = msg["method"], msg.get("params") or {}
+                        browser = self.sessions.get(msg.get("sessionId"), self.browser)
+                        result = (self._target(method, params) if method.startswith("Target.")
+                                  else browser.command(method, params))
+                        reply = {"id": msg["id"], "result": result}
+                        out = [reply]
+                        if "sessionId" in msg:
+                            reply["sessionId"] = msg["sessionId"]
+                            if method == "Page.enable":
+                                self.page_enabled.add(msg["sessionId"])
+                            elif method == "Page.navigate" and msg["sessionId"] in self.page_enabled:
+                                # the load follows instantly; like Chromium, only with the Page domain enabled
+                                out.append({"method": "Page.loadEventFired", "params": {"timestamp": time.time()},
+                                            "sessionId": msg["sessionId"]})
+                        with lock:
+                            conn.sendall(b"".join(ws.send(TextMessage(json.dumps(m))) for m in out))
+                    elif isinstance(ev, CloseConnection):
+                        with lock:
+                            conn.sendall(ws.send(ev.response()))
+                        return
+                data = conn.recv(1 << 20)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.clients = [c for c in self.clients if c[0] is not conn]
+            conn.close()
+
+    def _target(self, method: str, params: dict):
+        """Browser-level Target.* commands: contexts, one page target each, flattened sessions."""
+        n = next(self._ids)
+        if method == "Target.createBrowserContext":
+            self.contexts[f"ctx-{n}"] = FakeBrowser()
+            return {"browserContextId": f"ctx-{n}"}
+        if method == "Target.createTarget":
+            self.targets[f"t-{n}"] = self.contexts.get(params.get("browserContextId"), self.browser)
+            return {"targetId": f"t-{n}"}
+        if method == "Target.attachToTarget":
+            self.sessions[f"s-{n}"] = self.targets[params["targetId"]]
+            return {"sessionId": f"s-{n}"}
+        if method == "Target.disposeBrowserContext":
+            gone = self.contexts.pop(params.get("browserContextId"), None)
+            for table in (self.targets, self.sessions):
+                for key in [k for k, b in table.items() if b is gone]:
+                    del table[key]
+        return {}
+
+    def emit(self, events):
+        """Push [(method, params), ...] as CDP events to every connected page websocket."""
+        from wsproto.events import TextMessage
+        for conn, ws, lock in list(self.clients):
+            with lock:
+                conn.sendall(b"".join(ws.send(TextMessage(json.dumps({"method": m, "params": p})))
+                                      for m, p in events))
+
+    def close(self):
+        self.sock.close()
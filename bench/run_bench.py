@@ -0,0 +1,290 @@
+import argparse, importlib.util, json, os, platform, shutil, statistics, sys, tempfile, time, tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Offline benchmark of the extractor / importer hot paths against bench.fake_browser.
+# Per stage: median latency over --repeat runs, items/s and peak traced memory.
+#   python bench/run_bench.py --save bench/results/base.json
+#   python bench/run_bench.py --compare bench/results/base.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bench.fake_browser import (FakeBrowser, FakeDevToolsServer, FakeDriver,  # noqa: E402
+                                synthetic_jar, synthetic_png, synthetic_profile, synthetic_storage)
+from cookielab import artifact, artifact_index, cdp as cdp_transport, contexts, planner, profiles, shots, timeline  # noqa: E402
+from cookielab.jar import Cookie, CookieJar  # noqa: E402
+from cookielab.psl import etld1  # noqa: E402
+
+def load_script(name: str, rel: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, rel))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def measure(fn, repeat: int):
+    """(median seconds, min seconds, peak bytes); peak comes from one extra traced run."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), min(times), peak
+
+def legacy_autoselect(dirs, target_domain, url):
+    """The pre-index selection loop: json.load every candidate (kept here as the comparison point)."""
+    chosen, tgt = None, etld1(target_domain)
+    for d in dirs:
+        for p in os.listdir(d):
+            if p.startswith("cookies_") and p.endswith(".json"):
+                with open(os.path.join(d, p), "r", encoding="utf-8") as f:
+                    pl = json.load(f)
+                dom = (pl.get("meta") or {}).get("final_domain") or ""
+                score = 3 if dom == target_domain else 2 if dom and etld1(dom) == tgt else 1 if dom and dom in url else 0
+                if score and (not chosen or score > chosen[0]):
+                    chosen = (score, p)
+    return chosen
+
+def run(args):
+    ext = load_script("cookie_extractor", "extractor/cookie_extractor.py")
+    imp = load_script("cookie_importer", "importer/cookie_importer.py")
+    rtt = args.rtt_ms / 1000
+    results = []
+
+    def record(stage, size, fn, items=None):
+        med, best, peak = measure(fn, args.repeat)
+        items = size if items is None else items
+        results.append({"stage": stage, "size": size, "median_s": med, "min_s": best,
+                        "throughput": (items / med) if med and items else None, "peak_bytes": peak})
+        tp = f"{items / med:>12,.0f}/s" if med and items else " " * 14
+        print(f"{stage:<28}{size:>8}  {med * 1000:>10.3f} ms {tp}  {peak / 1024:>10,.0f} KiB")
+
+    print(f"{'stage':<28}{'size':>8}  {'median':>13} {'throughput':>14}  {'peak':>14}")
+    tmp = tempfile.mkdtemp(prefix="cookielab_bench_")
+    try:
+        # make_driver: option building + (fake) session start
+        from selenium import webdriver
+        real_chrome, webdriver.Chrome = webdriver.Chrome, lambda options=None: FakeDriver(rtt=rtt)
+        try:
+            record("make_driver", 1, lambda: ext.make_driver("chrome", os.path.join(tmp, "profile"), True, False))
+        finally:
+            webdriver.Chrome = real_chrome
+
+        for n in args.sizes:
+            jar = synthetic_jar(n)
+            browser = FakeBrowser(cookies=jar)
+            server = FakeDevToolsServer(browser)
+            driver = FakeDriver(browser, rtt=rtt, debugger_address=server.address)
+            sel = cdp_transport.SeleniumCDP(driver)
+            ws = cdp_transport.DevToolsClient(cdp_transport.page_websocket_url(server.address))
+            try:
+                record("navigate", n, lambda: driver.get("https://www.site0.example.co.uk/"), items=1)
+                record("getAllCookies[selenium]", n, lambda: sel.call("Network.getAllCookies", {}))
+                record("getAllCookies[ws]", n, lambda: ws.call("Network.getAllCookies", {}))
+                record("normalize_from_cdp", n, lambda: [ext.normalize_from_cdp(c) for c in jar])
+                normalized = [ext.normalize_from_cdp(c) for c in jar]
+                # Analysis working set: 20 artifacts parsed and kept as dicts vs as CookieJars
+                text = json.dumps(normalized)
+                record("jar_x20[dicts]", n, lambda: [json.loads(text) for _ in range(20)], items=20 * n)
+                record("jar_x20[CookieJar]", n, lambda: [CookieJar.from_json(json.loads(text)) for _ in range(20)],
+                       items=20 * n)
+                record("sanitize_cookie_for_cdp", n, lambda: [imp.sanitize_cookie_for_cdp(c) for c in normalized])
+                sanitized = {"cookies": [imp.sanitize_cookie_for_cdp(c) for c in normalized]}
+                record("setCookies[selenium]", n, lambda: sel.call("Network.setCookies", sanitized))
+                record("setCookies[ws]", n, lambda: ws.call("Network.setCookies", sanitized))
+
+                payload = {"meta": {"final_domain": "www.site0.example.co.uk"}, "cookies": normalized,
+                           "localStorage": {}, "sessionStorage": {}}
+                path = os.path.join(tmp, f"cookies_bench_{n}.json")
+
+                # Selenium-mode import of a realistic jar (many sites, HttpOnly mix): open each
+                # cookie host and add_cookie one by one, vs the planner's per-host batches
+                sel_driver = FakeDriver(FakeBrowser(), rtt=rtt)
+
+                def add_each():
+                    host = None
+                    for c in sorted(normalized, key=planner.cookie_host):
+                        if planner.cookie_host(c) != host:
+                            host = planner.cookie_host(c)
+                            sel_driver.get(f"https://{host}{planner.LIGHT_PATH}")
+                        sel_driver.add_cookie(Cookie.from_json(c).to_selenium())
+                record("selenium_import[add_cookie]", n, add_each)
+                record("selenium_import[planner]", n, lambda: planner.apply_plan(
+                    sel_driver, *planner.plan(normalized, etld1, "https://www.site0.example.co.uk/")))
+
+                def write():
+                    with open(path, "w", encoding="utf-8") as f:
+                        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+                def read():
+                    with open(path, "r", encoding="utf-8") as f:
+                        return json.load(f)
+                record("json_write", n, write)
+                record("json_read", n, read)
+                # Compact artifact: gzip NDJSON; meta-only reads decode the header line
+                gz = artifact.path_for(tmp, f"cookies_bench_{n}", "gz")
+                record("artifact_write[gz]", n, lambda: artifact.write(gz, payload))
+                record("artifact_read[gz]", n, lambda: artifact.read(gz))
+                record("artifact_meta[json]", n, lambda: artifact.read_meta(path))
+                record("artifact_meta[gz]", n, lambda: artifact.read_meta(gz))
+                print(f"{'  on disk':<28}{n:>8}  json {os.path.getsize(path) / 1024:,.1f} KiB, "
+                      f"ndjson.gz {os.path.getsize(gz) / 1024:,.1f} KiB")
+            finally:
+                ws.close()
+                server.close()
+
+        for n in args.storage_sizes:
+            origin = "https://www.site0.example.co.uk"
+            store = synthetic_storage(n)
+            browser = FakeBrowser(storage={(origin, True): dict(store), (origin, False): dict(store)},
+                                  frames=["https://cmp.example.net", "https://sso.example.org"])
+            browser.navigate(origin + "/")
+            server = FakeDevToolsServer(browser)
+            ws = cdp_transport.DevToolsClient(cdp_transport.page_websocket_url(server.address))
+            driver = FakeDriver(browser, rtt=rtt)
+            try:
+                record("storage_capture[ws]", n, lambda: ext.get_storage_all_origins(ws), items=2 * n)
+                record("storage_restore[ws]", n, lambda: imp.restore_storage_domstorage(
+                    driver, ws, origin, store, store), items=2 * n)
+            finally:
+                ws.close()
+                server.close()
+
+        # Cookie timeline: Set-Cookie responses pushed over the websocket until all are on disk
+        n = args.timeline_responses
+        server = FakeDevToolsServer(FakeBrowser())
+        ws = cdp_transport.DevToolsClient(cdp_transport.page_websocket_url(server.address))
+        rec = timeline.CookieTimeline().attach(ws, None)
+        burst = []
+        for i in range(n):
+            rid = f"r{i}"
+            burst.append(("Network.requestWillBeSent", {
+                "requestId": rid, "documentURL": "https://www.site0.example.co.uk/",
+                "request": {"url": f"https://ads{i % 40}.example.net/px?i={i}"},
+                "initiator": {"type": "script", "url": "https://cdn.example.net/tag.js"}}))
+            burst.append(("Network.responseReceivedExtraInfo", {"requestId": rid, "headers": {
+                "content-type": "image/gif",
+                "set-cookie": f"uid{i}=abc{i}; Domain=.example.net; Path=/; Max-Age=31536000; Secure; SameSite=None\n"
+                              f"seen=1; Path=/; Expires=Thu, 01 Jan 1970 00:00:00 GMT"}}))
+
+        def record_burst():
+            rec.start(os.path.join(tmp, "timeline", "cookie_timeline_bench.ndjson"))
+            server.emit(burst)
+            deadline = time.monotonic() + 60
+            while rec.stats["events"] < 2 * n and time.monotonic() < deadline:
+                time.sleep(0.001)
+            return rec.stop()
+        try:
+            record("cookie_timeline[ws]", n, record_burst, items=2 * n)
+        finally:
+            ws.close()
+            server.close()
+
+        # Isolated sessions in one browser: open context, setCookies, read back, dispose (all concurrently)
+        n = args.contexts
+        server = FakeDevToolsServer(FakeBrowser())
+        ctx_jar = {"cookies": [imp.sanitize_cookie_for_cdp(ext.normalize_from_cdp(c)) for c in synthetic_jar(200)]}
+
+        def one_context(ctxs):
+            s = ctxs.open()
+            try:
+                s.call("Network.setCookies", ctx_jar)
+                return len(s.call("Network.getAllCookies", {})["cookies"])
+            finally:
+                s.close()
+        try:
+            with contexts.BrowserContexts(FakeDriver(debugger_address=server.address)) as ctxs, \
+                    ThreadPoolExecutor(max_workers=n) as pool:
+                record("contexts[import]", n, lambda: list(pool.map(lambda _: one_context(ctxs), range(n))))
+        finally:
+            server.close()
+
+        # Auto-select scan over a directory of artifacts
+        adir = os.path.join(tmp, "artifacts")
+        os.makedirs(adir)
+        jar = [ext.normalize_from_cdp(c) for c in synthetic_jar(args.artifact_cookies)]
+        for i in range(args.artifacts):
+            with open(os.path.join(adir, f"cookies_www.site{i}.example.com.json"), "w", encoding="utf-8") as f:
+                json.dump({"meta": {"final_domain": f"www.site{i}.example.com"}, "cookies": jar}, f, indent=2)
+        target = "news.site%d.example.com" % (args.artifacts - 1)
+        url = f"https://{target}/"
+        record("autoselect[full-parse]", args.artifacts, lambda: legacy_autoselect([adir], target, url))
+
+        def cold():
+            db = os.path.join(adir, artifact_index.INDEX_NAME)
+            if os.path.exists(db):
+                os.remove(db)
+            return artifact_index.select_artifact([adir], target, url, etld1)
+        record("autoselect[index-cold]", args.artifacts, cold)
+        record("autoselect[index-warm]", args.artifacts,
+               lambda: artifact_index.select_artifact([adir], target, url, etld1))
+
+        # Perceptual hash: browser-downscaled thumbnail vs decoding the full-size PNG
+        thumb, full = synthetic_png(shots.HASH_WIDTH, 36, True), synthetic_png(1280, 720, True)
+        record("dhash[thumb]", 1, lambda: shots.dhash(*shots.decode_png_gray(thumb)))
+        record("dhash[full-png]", 1, lambda: shots.dhash(*shots.decode_png_gray(full)))
+
+        # Per-run profile: plain copy vs template clone (reflink / hardlink where possible)
+        template = synthetic_profile(os.path.join(tmp, "template"), args.profile_files)
+        runs = iter(range(1 << 30))
+        record("profile[copytree]", args.profile_files,
+               lambda: shutil.copytree(template, os.path.join(tmp, f"copy{next(runs)}")))
+        record("profile[clone]", args.profile_files,
+               lambda: profiles.clone_tree(template, os.path.join(tmp, f"clone{next(runs)}")))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return results
+
+def compare(results, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = {(r["stage"], r["size"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\n--- vs {baseline_path} (regression if > {threshold:.2f}x) ---")
+    for r in results:
+        b = base.get((r["stage"], r["size"]))
+        if not b or not b["median_s"]:
+            continue
+        ratio = r["median_s"] / b["median_s"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{r['stage']:<28}{r['size']:>8}  {ratio:>6.2f}x  {flag}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of extractor/importer stages (no browser needed)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Cookie jar sizes")
+    parser.add_argument("--storage-sizes", type=int, nargs="+", default=[10, 1000], help="Storage map sizes")
+    parser.add_argument("--artifacts", type=int, default=200, help="Artifact files for the auto-select scan")
+    parser.add_argument("--artifact-cookies", type=int, default=200, help="Cookies per scanned artifact")
+    parser.add_argument("--timeline-responses", type=int, default=5000,
+                        help="Set-Cookie responses in the cookie timeline burst")
+    parser.add_argument("--contexts", type=int, default=50, help="Concurrent browser contexts in one browser")
+    parser.add_argument("--profile-files", type=int, default=400, help="Files in the synthetic profile template")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="Simulated chromedriver HTTP round trip")
+    parser.add_argument("--save", default=None, help="Write results JSON here (e.g. bench/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"created_at": int(time.time()), "python": platform.python_version(),
+                       "platform": platform.platform(), "args": vars(args), "results": results}, f, indent=2)
+        print(f"[ARTIFACT] Results saved -> {args.save}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Shared helpers for the cookie extractor / importer scripts.
+Modules here must not import selenium at module level so offline tools stay light.
+"""
@@ -0,0 +1,58 @@
+import os, sys
+
+# Single entry point: python -m cookielab <command> [args...]
+#
+# Commands are resolved lazily (module path strings, imported only when run), so
+# offline commands never pay for selenium, websocket or asyncio imports.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMMANDS = {
+    # name: (target, summary); "file:<path>" targets are the standalone scripts
+    "extract":  ("file:extractor/cookie_extractor.py", "Extract cookies (and storage) from a browser profile"),
+    "import":   ("file:importer/cookie_importer.py", "Import an artifact into a browser profile"),
+    "filter":   ("cookielab.filters", "Derive consent-only / login-only / all-except-auth variants"),
+    "select":   ("cookielab.artifact_index", "Print the artifact the importer would pick for a URL"),
+    "diff":     ("cookielab.verify", "Diff imported jars against cookies_after_*"),
+    "artifact": ("cookielab.artifact", "Convert artifacts to/from compressed NDJSON, print headers"),
+    "bench":    ("bench.run_bench", "Offline benchmark of the hot paths"),
+    "matrix":   ("cookielab.matrix", "Run a sites x variants x browsers experiment"),
+    "shots":    ("cookielab.shots", "Cluster screenshots and flag reappearing banners"),
+    "store":    ("cookielab.store", "Deduplicated snapshot store"),
+    "daemon":   ("cookielab.daemon", "Warm browser daemon (start/stop/status)"),
+    "profiles": ("cookielab.profiles", "Profile templates and per-run clones"),
+}
+
+def usage(out=sys.stdout):
+    print("usage: python -m cookielab <command> [args...]   (<command> -h for its options)\n", file=out)
+    for name, (_, summary) in COMMANDS.items():
+        print(f"  {name:<10}{summary}", file=out)
+
+def load(target: str):
+    if target.startswith("file:"):
+        import importlib.util
+        path = os.path.join(ROOT, target[5:])
+        spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        return mod
+    import importlib
+    return importlib.import_module(target)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        usage()
+        return
+    cmd = COMMANDS.get(argv[0])
+    if cmd is None:
+        print(f"[ABORT] unknown command: {argv[0]}\n", file=sys.stderr)
+        usage(sys.stderr)
+        sys.exit(2)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)  # bench/ lives next to the package
+    sys.argv = [f"cookielab {argv[0]}"] + argv[1:]
+    load(cmd[0]).main(argv[1:])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import argparse, gzip, json, os, sys
+
+# Artifact files: classic JSON, or compact NDJSON (optionally gzip / zstd compressed).
+#
+#   cookies_<domain>.json                    {"meta", "cookies", "localStorage", ...}, indent=2
+#   cookies_<domain>.ndjson[.gz|.zst]
+#       line 1   header  {"cookielab": 1, "meta": {...}, "counts": {"cookies": n}}
+#       then     one cookie per line
+#       then     {"@": "<key>", "value": ...} for every other top-level key
+#                (localStorage, sessionStorage, storageByOrigin, ...)
+#
+# The format follows from the file name, so every tool reads any of them through
+# read() and gets the same dict (or bare list for cookies_after_*) back. read_meta()
+# decodes only the header line: for .gz/.zst that inflates the first block, not the
+# whole jar. iter_cookies() streams cookies without holding the jar in memory.
+# gzip is stdlib; .zst needs the optional `zstandard` package.
+#
+#   python -m cookielab.artifact convert output --to gz --remove   # every artifact below output/
+#   python -m cookielab.artifact meta output/cookies_example.com.ndjson.gz
+
+VERSION = 1
+FORMATS = {"json": ".json", "ndjson": ".ndjson", "gz": ".ndjson.gz", "zst": ".ndjson.zst"}
+EXTENSIONS = (".ndjson.gz", ".ndjson.zst", ".ndjson", ".json")  # longest first for suffix matching
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+def split_name(fn: str):
+    """'cookies_x.ndjson.gz' -> ('cookies_x', '.ndjson.gz'); (None, None) for other files."""
+    for ext in EXTENSIONS:
+        if fn.endswith(ext):
+            return fn[:-len(ext)], ext
+    return None, None
+
+def format_of(path: str) -> str:
+    ext = split_name(os.path.basename(path))[1]
+    return next((k for k, v in FORMATS.items() if v == ext), "json")
+
+def path_for(base_dir: str, stem: str, fmt: str = "json") -> str:
+    return os.path.join(base_dir, stem + FORMATS[fmt])
+
+def find(base_dir: str, stem: str):
+    """Existing artifact <stem>.<any extension> in base_dir (newest if several), else None."""
+    best = None
+    for ext in EXTENSIONS:
+        p = os.path.join(base_dir, stem + ext)
+        try:
+            mtime = os.path.getmtime(p)
+        except OSError:
+            continue
+        if best is None or mtime > best[0]:
+            best = (mtime, p)
+    return best[1] if best else None
+
+def zstd_available() -> bool:
+    try:
+        import zstandard  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def format_or_abort(fmt: str) -> str:
+    """For CLIs: stop before any browser work when the requested format cannot be written here."""
+    if fmt == "zst" and not zstd_available():
+        print("[ABORT] .ndjson.zst artifacts need the zstandard package (pip install zstandard); "
+              "use gz for the stdlib codec")
+        sys.exit(1)
+    return fmt
+
+def _zstd_open(path: str, mode: str):
+    try:
+        import zstandard  # optional, only needed for .zst artifacts
+    except ImportError:
+        raise RuntimeError(f"{path}: .zst artifacts need the zstandard package (pip install zstandard)") from None
+    cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if "w" in mode else None
+    return zstandard.open(path, mode, cctx=cctx, encoding="utf-8")
+
+def open_text(path: str, mode: str = "r"):
+    """Text handle for any artifact format; mode 'r' or 'w'."""
+    mode = mode[0] + "t"
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL, encoding="utf-8")
+    if path.endswith(".zst"):
+        return _zstd_open(path, mode)
+    return open(path, mode[0], encoding="utf-8", buffering=1 << 16)
+
+# ---------- writing ----------
+class ArtifactWriter:
+    """
+    Streaming NDJSON writer: header first, then cookie() per cookie, then section() per
+    remaining key. Use as a context manager; the header's counts are only written by write().
+    """
+
+    def __init__(self, path: str, meta: dict = None, shape: str = "payload", counts: dict = None):
+        if format_of(path) == "json":
+            raise ValueError(f"{path}: ArtifactWriter writes .ndjson[.gz|.zst]; use write() for .json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.f = open_text(path, "w")
+        header = {"cookielab": VERSION, "meta": meta or {}}
+        if shape != "payload":
+            header["shape"] = shape
+        if counts:
+            header["counts"] = counts
+        self.f.write(_dumps(header) + "\n")
+        self._sections = False
+
+    def cookie(self, c: dict):
+        if self._sections:
+            raise ValueError("cookies must come before sections")
+        self.f.write(_dumps(c) + "\n")
+
+    def cookies(self, cookies):
+        self.f.write("".join(_dumps(c) + "\n" for c in cookies))
+
+    def section(self, key: str, value):
+        self._sections = True
+        self.f.write(_dumps({"@": key, "value": value}) + "\n")
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write(path: str, payload):
+    """Write an artifact payload dict (or a bare cookie list) in the format the extension names."""
+    if format_of(path) == "json":
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        return path
+    if isinstance(payload, list):
+        with ArtifactWriter(path, shape="list", counts={"cookies": len(payload)}) as w:
+            w.cookies(payload)
+        return path
+    cookies = payload.get("cookies") or []
+    with ArtifactWriter(path, payload.get("meta"), counts={"cookies": len(cookies)}) as w:
+        w.cookies(cookies)
+        for k, v in payload.items():
+            if k not in ("meta", "cookies"):
+                w.section(k, v)
+    return path
+
+# ---------- reading ----------
+def _header(line: str, path: str) -> dict:
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or "cookielab" not in header:
+        raise ValueError(f"{path}: not a cookielab NDJSON artifact (bad header)")
+    if header["cookielab"] > VERSION:
+        raise ValueError(f"{path}: artifact format version {header['cookielab']} is newer than this tool ({VERSION})")
+    return header
+
+def _rows(block: str):
+    """Parse a run of NDJSON lines with one json.loads (a JSON array) instead of one call per line."""
+    block = block.strip()
+    if not block:
+        return []
+    try:
+        return json.loads("[" + block.replace("\n", ",") + "]")
+    except ValueError:  # blank or CRLF lines from a hand-edited file
+        return [json.loads(line) for line in block.splitlines() if line.strip()]
+
+def read(path: str):
+    """Artifact in any format -> the .json shape (payload dict, or bare list for cookies_after_*)."""
+    if format_of(path) == "json":
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open_text(path) as f:
+        text = f.read()
+    first, _, body = text.partition("\n")
+    if not first.strip():
+        raise ValueError(f"{path}: empty artifact")
+    header = _header(first, path)
+    # Sections follow the cookies and always start with '{"@":' (the writer puts "@" first)
+    cut = 0 if body.startswith('{"@":') else body.find('\n{"@":') + 1 or len(body)
+    cookies = _rows(body[:cut])
+    if header.get("shape") == "list":
+        return cookies
+    payload = {"meta": header.get("meta") or {}, "cookies": cookies}
+    for r in _rows(body[cut:]):
+        payload[r["@"]] = r.get("value")
+    return payload
+
+def read_header(path: str) -> dict:
+    """Header of an NDJSON artifact ({"cookielab", "meta", "counts", ...}); a .json artifact is fully parsed."""
+    if format_of(path) == "json":
+        data = read(path)
+        if isinstance(data, list):
+            return {"meta": {}, "shape": "list", "counts": {"cookies": len(data)}}
+        return {"meta": data.get("meta") or {}, "counts": {"cookies": len(data.get("cookies") or [])}}
+    with open_text(path) as f:
+        return _header(f.readline(), path)
+
+def read_meta(path: str) -> dict:
+    return read_header(path).get("meta") or {}
+
+def iter_cookies(path: str):
+    """Yield cookies one at a time (NDJSON formats stream; .json is loaded whole)."""
+    if format_of(path) == "json":
+        data = read(path)
+        yield from data.get("cookies", []) if isinstance(data, dict) else data
+        return
+    loads = json.loads
+    with open_text(path) as f:
+        _header(f.readline(), path)
+        for line in f:
+            if not line.strip():
+                continue
+            row = loads(line)
+            if "@" in row:
+                return
+            yield row
+
+# ---------- conversion ----------
+def convert(src: str, fmt: str, remove: bool = False) -> str:
+    """Rewrite src as fmt next to it; returns the new path (src itself when already in fmt)."""
+    stem, _ = split_name(os.path.basename(src))
+    dst = path_for(os.path.dirname(src), stem, fmt)
+    if dst == src:
+        return src
+    tmp = path_for(os.path.dirname(src), stem + ".part", fmt)  # keep the extension: it picks the encoder
+    write(tmp, read(src))
+    os.replace(tmp, dst)
+    st = os.stat(src)
+    os.utime(dst, (st.st_atime, st.st_mtime))  # same age as the source, so find() treats them as equals
+    if remove:
+        os.remove(src)
+    return dst
+
+def find_files(paths):
+    """cookies_* artifacts among the given files / below the given dirs."""
+    for p in paths:
+        if os.path.isfile(p):
+            yield p
+            continue
+        for d, _, files in os.walk(p):
+            for fn in sorted(files):
+                if fn.startswith("cookies_") and split_name(fn)[0] and ".part." not in fn:
+                    yield os.path.join(d, fn)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert cookie artifacts between .json and compact NDJSON (.ndjson/.ndjson.gz/.ndjson.zst)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="Convert artifact files (or every cookies_* artifact below dirs)")
+    c.add_argument("paths", nargs="+")
+    c.add_argument("--to", choices=sorted(FORMATS), default="gz", help="Target format")
+    c.add_argument("--remove", action="store_true", help="Delete the source file after a successful conversion")
+    m = sub.add_parser("meta", help="Print an artifact's header (meta and counts) without reading its cookies")
+    m.add_argument("path")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.cmd == "meta":
+        print(json.dumps(read_header(args.path), ensure_ascii=False, indent=2))
+        return
+    format_or_abort(args.to)
+    done = before = after = failed = 0
+    for src in find_files(args.paths):
+        if format_of(src) == args.to:
+            continue
+        try:
+            size = os.path.getsize(src)
+            dst = convert(src, args.to, args.remove)
+        except (OSError, ValueError, RuntimeError) as e:
+            print(f"[WARN] {src}: {e}")
+            failed += 1
+            continue
+        done, before, after = done + 1, before + size, after + os.path.getsize(dst)
+    print(f"[INFO] converted {done} artifact(s) to {args.to}: {before / 1024:.0f} KiB -> {after / 1024:.0f} KiB"
+          + (f", {failed} failed" if failed else ""))
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse, os, sqlite3, sys
+from urllib.parse import urlsplit
+
+from cookielab import artifact
+
+# On-disk index of cookies_* artifacts (any cookielab.artifact format), keyed by
+# meta.final_domain and eTLD+1. One sqlite file per artifact directory; entries are
+# refreshed by mtime/size so unchanged jars are never parsed twice, and NDJSON
+# artifacts only have their header line decoded.
+
+INDEX_NAME = ".cookie_index.sqlite"
+# Bump when the stored columns (or how etld1 is derived) change; forces a rebuild
+INDEX_VERSION = "2"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS artifacts (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    final_domain TEXT NOT NULL,
+    etld1 TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS artifacts_domain ON artifacts(final_domain);
+CREATE INDEX IF NOT EXISTS artifacts_etld1 ON artifacts(etld1);
+"""
+
+def is_artifact_name(name: str) -> bool:
+    return name.startswith("cookies_") and artifact.split_name(name)[0] is not None
+
+def read_final_domain(path: str) -> str:
+    """meta.final_domain of an artifact, or '' (cookies_after_* lists have no meta)."""
+    try:
+        return artifact.read_meta(path).get("final_domain") or ""
+    except Exception:
+        return ""
+
+class ArtifactIndex:
+    def __init__(self, directory: str, etld1):
+        self.directory = directory
+        self.etld1 = etld1
+        try:
+            self.db = sqlite3.connect(os.path.join(directory, INDEX_NAME), timeout=30)
+            self.db.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            # Read-only or broken index: still answer from a throwaway in-memory one
+            print(f"[WARN] artifact index unavailable in {directory} ({e}); using in-memory index")
+            self.db = sqlite3.connect(":memory:")
+            self.db.executescript(SCHEMA)
+        row = self.db.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        if not row or row[0] != INDEX_VERSION:
+            with self.db:
+                self.db.execute("DELETE FROM artifacts")
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,))
+
+    def refresh(self) -> int:
+        """Sync with the directory listing; returns how many artifacts had to be (re)parsed."""
+        known = {name: (mt, sz) for name, mt, sz in
+                 self.db.execute("SELECT name, mtime_ns, size FROM artifacts")}
+        seen, parsed = set(), 0
+        with self.db:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not (is_artifact_name(entry.name) and entry.is_file()):
+                        continue
+                    seen.add(entry.name)
+                    st = entry.stat()
+                    if known.get(entry.name) == (st.st_mtime_ns, st.st_size):
+                        continue
+                    dom = read_final_domain(entry.path)
+                    self.db.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                                    (entry.name, st.st_mtime_ns, st.st_size, dom,
+                                     self.etld1(dom) if dom else ""))
+                    parsed += 1
+            gone = [(n,) for n in known if n not in seen]
+            if gone:
+                self.db.executemany("DELETE FROM artifacts WHERE name=?", gone)
+        return parsed
+
+    def best(self, target_domain: str, url: str):
+        """(score, path) of the best match using the importer's scoring, or None."""
+        row = self.db.execute("SELECT name FROM artifacts WHERE final_domain=? ORDER BY name LIMIT 1",
+                              (target_domain,)).fetchone()
+        if row:
+            return 3, os.path.join(self.directory, row[0])
+        row = self.db.execute("SELECT name FROM artifacts WHERE etld1=? AND final_domain!='' "
+                              "ORDER BY name LIMIT 1", (self.etld1(target_domain),)).fetchone()
+        if row:
+            return 2, os.path.join(self.directory, row[0])
+        # Substring match over distinct domains only (far fewer than artifacts)
+        for dom, name in self.db.execute("SELECT final_domain, MIN(name) FROM artifacts "
+                                         "WHERE final_domain!='' GROUP BY final_domain ORDER BY 2"):
+            if dom in url:
+                return 1, os.path.join(self.directory, name)
+        return None
+
+    def names(self, limit: int = 5):
+        return [os.path.join(self.directory, n) for (n,) in
+                self.db.execute("SELECT name FROM artifacts ORDER BY name LIMIT ?", (limit,))]
+
+    def close(self):
+        self.db.close()
+
+def select_artifact(search_dirs, target_domain: str, url: str, etld1):
+    """
+    Pick the best cookies_* artifact across search_dirs (earlier dirs win ties).
+    Returns (path or None, a few candidate paths for hints).
+    """
+    chosen, hints = None, []
+    for d in search_dirs:
+        if not os.path.isdir(d):
+            continue
+        idx = ArtifactIndex(d, etld1)
+        try:
+            idx.refresh()
+            hit = idx.best(target_domain, url)
+            if hit and (not chosen or hit[0] > chosen[0]):
+                chosen = hit
+            hints.extend(idx.names())
+        finally:
+            idx.close()
+    return (chosen[1] if chosen else None), hints[:5]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Print the cookies_* artifact the importer would pick for a URL",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("url", help="Target URL (e.g., https://www.bbc.com/)")
+    parser.add_argument("--dir", nargs="+", default=["output"], help="Artifact directories, in priority order")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from cookielab.psl import etld1
+    args = parse_args(argv)
+    target = urlsplit(args.url).hostname or args.url
+    chosen = next(filter(None, (artifact.find(d, f"cookies_{target}") for d in args.dir)), None)
+    hints = []
+    if not chosen:
+        chosen, hints = select_artifact(args.dir, target, args.url, etld1)
+    if not chosen:
+        print(f"[ERROR] no artifact for {target}; candidates: {' / '.join(hints) if hints else '(none)'}",
+              file=sys.stderr)
+        sys.exit(1)
+    print(chosen)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import asyncio, itertools, json, queue, threading
+from concurrent.futures import Future
+from urllib.request import urlopen
+
+# CDP transports.
+#
+# SeleniumCDP wraps driver.execute_cdp_cmd (one chromedriver HTTP round trip per
+# command, no events). DevToolsClient talks to the page's DevTools websocket
+# directly: commands carry ids and can be pipelined, replies are matched by id
+# on a reader thread, and events are queued for consumers such as settle.
+# Both expose call() / send() / batch() and the async acall() / abatch().
+
+class CDPError(RuntimeError):
+    pass
+
+def debugger_address(driver):
+    """host:port of the browser's remote debugging endpoint, from the session capabilities."""
+    caps = getattr(driver, "capabilities", None) or {}
+    for key in ("goog:chromeOptions", "ms:edgeOptions"):
+        addr = (caps.get(key) or {}).get("debuggerAddress")
+        if addr:
+            return addr
+    return None
+
+def list_targets(address: str, timeout: float = 5):
+    with urlopen(f"http://{address}/json/list", timeout=timeout) as r:
+        return json.loads(r.read().decode("utf-8"))
+
+def page_websocket_url(address: str, target_id: str = None, timeout: float = 5) -> str:
+    """webSocketDebuggerUrl of target_id (chromedriver window handles are target ids) or the first page."""
+    pages = [t for t in list_targets(address, timeout) if t.get("type") == "page"]
+    for t in pages:
+        if target_id and t.get("id") == target_id:
+            return t["webSocketDebuggerUrl"]
+    if not pages:
+        raise CDPError(f"no page targets at {address}")
+    return pages[0]["webSocketDebuggerUrl"]
+
+def browser_websocket_url(address: str, timeout: float = 5) -> str:
+    """Browser-level endpoint (Target.* commands such as createBrowserContext), from /json/version."""
+    with urlopen(f"http://{address}/json/version", timeout=timeout) as r:
+        return json.loads(r.read().decode("utf-8"))["webSocketDebuggerUrl"]
+
+class _Transport:
+    """Shared sync/async helpers; subclasses implement send() and events."""
+    supports_events = False
+
+    def send(self, method: str, params: dict = None, session_id: str = None) -> Future:
+        raise NotImplementedError
+
+    def call(self, method: str, params: dict = None, timeout: float = 30, session_id: str = None):
+        return self.send(method, params, session_id).result(timeout)
+
+    def batch(self, commands, timeout: float = 30):
+        """Send [(method, params), ...] back to back, then wait for all replies (in order)."""
+        futs = [self.send(m, p) for m, p in commands]
+        return [f.result(timeout) for f in futs]
+
+    async def acall(self, method: str, params: dict = None, session_id: str = None):
+        return await asyncio.wrap_future(self.send(method, params, session_id))
+
+    async def abatch(self, commands):
+        return await asyncio.gather(*(self.acall(m, p) for m, p in commands))
+
+    def drain_events(self):
+        return []
+
+    def close(self):
+        pass
+
+class SeleniumCDP(_Transport):
+    """Fallback transport over chromedriver's execute_cdp_cmd."""
+    name = "selenium"
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def send(self, method: str, params: dict = None, session_id: str = None) -> Future:
+        fut = Future()
+        try:
+            fut.set_result(self.driver.execute_cdp_cmd(method, params or {}))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+class DevToolsClient(_Transport):
+    """Direct DevTools websocket client with id-matched, pipelined commands."""
+    name = "ws"
+    supports_events = True
+
+    def __init__(self, ws_url: str, timeout: float = 10, max_events: int = 100000):
+        import websocket  # websocket-client, only needed for this transport
+        # Replies are json-decoded anyway; websocket-client's pure-Python UTF-8 check
+        # would otherwise dominate large results such as Network.getAllCookies
+        self.ws = websocket.create_connection(ws_url, timeout=timeout, enable_multithread=True,
+                                              suppress_origin=True, skip_utf8_validation=True)
+        self.ws.settimeout(None)
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._listeners = {}
+        # Bounded: if nobody drains events, the oldest ones are dropped rather than growing forever
+        self.events = queue.Queue(maxsize=max_events)
+        self.closed = False
+        self._reader = threading.Thread(target=self._read_loop, name="cdp-reader", daemon=True)
+        self._reader.start()
+
+    def send(self, method: str, params: dict = None, session_id: str = None) -> Future:
+        fut = Future()
+        msg = {"id": next(self._ids), "method": method, "params": params or {}}
+        if session_id:
+            msg["sessionId"] = session_id
+        with self._lock:
+            if self.closed:
+                fut.set_exception(CDPError("connection closed"))
+                return fut
+            self._pending[msg["id"]] = (method, fut)
+        try:
+            self.ws.send(json.dumps(msg))
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(msg["id"], None)
+            fut.set_exception(e)
+        return fut
+
+    def on(self, method: str, callback, session_id: str = None):
+        """Call callback(params) on the reader thread for every `method` event (of one session, if given)."""
+        key = (method, session_id) if session_id else method
+        with self._lock:  # copy on write: the reader thread iterates without locking
+            self._listeners[key] = self._listeners.get(key, []) + [callback]
+
+    def off(self, method: str, callback, session_id: str = None):
+        key = (method, session_id) if session_id else method
+        with self._lock:
+            rest = [cb for cb in self._listeners.get(key, []) if cb is not callback]
+            if rest:
+                self._listeners[key] = rest
+            else:
+                self._listeners.pop(key, None)
+
+    def drain_events(self):
+        out = []
+        while True:
+            try:
+                out.append(self.events.get_nowait())
+            except queue.Empty:
+                return out
+
+    def _read_loop(self):
+        err = None
+        try:
+            while True:
+                raw = self.ws.recv()
+                if not raw:
+                    break
+                msg = json.loads(raw)
+                if "id" in msg:
+                    with self._lock:
+                        method, fut = self._pending.pop(msg["id"], (None, None))
+                    if fut is None:
+                        continue
+                    if "error" in msg:
+                        e = msg["error"]
+                        fut.set_exception(CDPError(f"{method}: {e.get('message')} ({e.get('code')})"))
+                    else:
+                        fut.set_result(msg.get("result", {}))
+                elif "method" in msg:
+                    params = msg.get("params") or {}
+                    listeners = self._listeners.get(msg["method"], ())
+                    if "sessionId" in msg:
+                        listeners = [*listeners, *self._listeners.get((msg["method"], msg["sessionId"]), ())]
+                    for cb in listeners:
+                        try:
+                            cb(params)
+                        except Exception as e:
+                            print(f"[WARN] CDP listener for {msg['method']} failed: {e}")
+                    try:
+                        self.events.put_nowait((msg["method"], params))
+                    except queue.Full:
+                        try:
+                            self.events.get_nowait()
+                            self.events.put_nowait((msg["method"], params))
+                        except (queue.Empty, queue.Full):
+                            pass
+        except Exception as e:
+            err = e
+        finally:
+            with self._lock:
+                self.closed = True
+                pending, self._pending = self._pending, {}
+            for method, fut in pending.values():
+                if not fut.done():
+                    fut.set_exception(CDPError(f"{method}: connection closed ({err or 'eof'})"))
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+
+def connect(driver, transport: str = "selenium"):
+    """
+    CDP transport for a running Chromium driver. transport='ws' tries the direct
+    websocket first and falls back to execute_cdp_cmd if it cannot connect.
+    """
+    if transport == "ws":
+        addr = debugger_address(driver)
+        try:
+            if not addr:
+                raise CDPError("driver exposes no debuggerAddress")
+            return DevToolsClient(page_websocket_url(addr, getattr(driver, "current_window_handle", None)))
+        except Exception as e:
+            print(f"[WARN] DevTools websocket unavailable ({e}); using Selenium CDP transport.")
+    return SeleniumCDP(driver)
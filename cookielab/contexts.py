@@ -0,0 +1,155 @@
+import json, queue, threading
+
+from cookielab import cdp as cdp_transport
+
+# Many isolated sessions in one browser.
+#
+# BrowserContexts opens the browser-level DevTools websocket of a running Chromium
+# driver and hands out ContextSessions: each is a fresh Target.createBrowserContext
+# (its own cookie jar, storage and cache, like an incognito window) with one page,
+# attached as a flattened session on the shared connection. Sessions are independent,
+# so jobs can drive them from a thread pool at the same time; dispose() (or the
+# connection going away: disposeOnDetach) removes the context and its page.
+#
+# A ContextSession is a cookielab.cdp transport scoped to its page (call/send/batch,
+# on(), drain_events() for settle) and also offers the small WebDriver surface the
+# tools use (get, current_url, execute_script, quit), so extractor/importer helpers
+# written against (driver, cdp) take one session for both.
+
+SETTLE_EVENTS = ("Network.requestWillBeSent", "Network.loadingFinished", "Network.loadingFailed",
+                 "Page.frameNavigated", "Page.lifecycleEvent")
+LOAD_TIMEOUT = 60
+
+class ContextSession(cdp_transport._Transport):
+    name = "context"
+    supports_events = True
+
+    def __init__(self, owner, context_id: str, target_id: str, session_id: str, max_events: int = 10000):
+        self.owner, self.client = owner, owner.client
+        self.context_id, self.target_id, self.session_id = context_id, target_id, session_id
+        self.events = queue.Queue(maxsize=max_events)
+        self.loaded = threading.Event()
+        self.closed = False
+        self._subs = []
+        for method in SETTLE_EVENTS:
+            self.on(method, self._queue_event(method))
+        self.on("Page.loadEventFired", lambda p: self.loaded.set())
+
+    def _queue_event(self, method):
+        def put(params):
+            try:
+                self.events.put_nowait((method, params))
+            except queue.Full:
+                pass  # nobody is draining (no --settle); settle only needs recent events
+        return put
+
+    # ---------- transport ----------
+    def send(self, method: str, params: dict = None, session_id: str = None):
+        return self.client.send(method, params, session_id or self.session_id)
+
+    def on(self, method: str, callback, session_id: str = None):
+        """Listen on this page's session (or a child session attached through it)."""
+        sid = session_id or self.session_id
+        self.client.on(method, callback, sid)
+        self._subs.append((method, callback, sid))
+
+    def off(self, method: str, callback, session_id: str = None):
+        sid = session_id or self.session_id
+        self.client.off(method, callback, sid)
+        self._subs = [s for s in self._subs if s != (method, callback, sid)]
+
+    def drain_events(self):
+        out = []
+        while True:
+            try:
+                out.append(self.events.get_nowait())
+            except queue.Empty:
+                return out
+
+    # ---------- WebDriver-like surface ----------
+    def get(self, url: str, timeout: float = LOAD_TIMEOUT):
+        """Navigate and wait for the load event (like WebDriver's default page load strategy)."""
+        self.loaded.clear()
+        res = self.call("Page.navigate", {"url": url}, timeout)
+        if res.get("errorText"):
+            raise cdp_transport.CDPError(f"navigation to {url} failed: {res['errorText']}")
+        if res.get("loaderId") and not self.loaded.wait(timeout):
+            print(f"[WARN] context {self.context_id[:8]}: no load event within {timeout}s for {url}")
+
+    @property
+    def current_url(self) -> str:
+        hist = self.call("Page.getNavigationHistory", {})
+        entries = hist.get("entries") or [{}]
+        return entries[hist.get("currentIndex", len(entries) - 1)].get("url", "")
+
+    def execute_script(self, script: str, *args):
+        """Run a WebDriver-style script body (uses `return`, reads `arguments`); JSON-serializable values only."""
+        res = self.call("Runtime.evaluate", {
+            "expression": f"(function() {{\n{script}\n}}).apply(null, {json.dumps(list(args))})",
+            "returnByValue": True, "awaitPromise": True})
+        if res.get("exceptionDetails"):
+            raise cdp_transport.CDPError((res["exceptionDetails"].get("exception") or {}).get("description")
+                                         or res["exceptionDetails"].get("text", "script error"))
+        return (res.get("result") or {}).get("value")
+
+    def close(self):
+        """Dispose the context (its page, cookies and storage). Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        for method, cb, sid in self._subs:
+            self.client.off(method, cb, sid)
+        self.owner.dispose(self)
+
+    quit = close
+
+class BrowserContexts:
+    """Browser-level connection that creates and disposes isolated browser contexts."""
+
+    def __init__(self, driver, timeout: float = 10):
+        addr = cdp_transport.debugger_address(driver)
+        if not addr:
+            raise cdp_transport.CDPError("driver exposes no debuggerAddress")
+        self.client = cdp_transport.DevToolsClient(cdp_transport.browser_websocket_url(addr, timeout), timeout)
+        self.sessions = set()
+        self._lock = threading.Lock()
+
+    def open(self, url: str = "about:blank") -> ContextSession:
+        ctx = self.client.call("Target.createBrowserContext", {"disposeOnDetach": True})["browserContextId"]
+        try:
+            target = self.client.call("Target.createTarget", {"url": url, "browserContextId": ctx})["targetId"]
+            sid = self.client.call("Target.attachToTarget", {"targetId": target, "flatten": True})["sessionId"]
+        except Exception:
+            self._dispose_id(ctx)
+            raise
+        session = ContextSession(self, ctx, target, sid)
+        with self._lock:
+            self.sessions.add(session)
+        return session
+
+    def _dispose_id(self, context_id: str):
+        try:
+            self.client.call("Target.disposeBrowserContext", {"browserContextId": context_id})
+        except Exception as e:
+            print(f"[WARN] disposing browser context {context_id[:8]} failed: {e}")
+
+    def dispose(self, session: ContextSession):
+        with self._lock:
+            if session not in self.sessions:
+                return
+            self.sessions.discard(session)
+        self._dispose_id(session.context_id)
+
+    def close(self):
+        """Dispose whatever is still open and drop the browser connection."""
+        with self._lock:
+            left = list(self.sessions)
+        for s in left:
+            s.close()
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,166 @@
+import argparse, json, os, sys
+from urllib.request import urlopen
+
+from cookielab.profiles import compute_profile_dir
+
+# Warm browser daemon: one long-lived Chromium per (browser, profile) that the
+# extractor / importer attach to with --attach instead of cold-starting Chrome.
+#
+#   python -m cookielab.daemon start ProfileA --browser chrome
+#   python extractor/cookie_extractor.py https://example.com/ ProfileA --attach
+#   python -m cookielab.daemon stop ProfileA
+#
+# The browser is started through chromedriver with "detach" so it outlives this
+# process; its debugger address is kept in profiles/.daemon_<browser>_<profile>.json.
+
+DAEMON_BROWSERS = {"chrome", "edge", "brave", "chromium"}
+BRAVE_PATHS = [
+    r"C:\Program Files\BraveSoftware\Brave-Browser\Application\brave.exe",
+    r"C:\Program Files (x86)\BraveSoftware\Brave-Browser\Application\brave.exe",
+]
+
+def state_path(profile_name: str, browser: str) -> str:
+    return os.path.abspath(f"profiles/.daemon_{browser}_{profile_name}.json")
+
+def browser_version(address: str, timeout: float = 2):
+    """/json/version of a debugger address, or None if nothing answers there."""
+    try:
+        with urlopen(f"http://{address}/json/version", timeout=timeout) as r:
+            return json.loads(r.read().decode("utf-8"))
+    except Exception:
+        return None
+
+def read_state(profile_name: str, browser: str):
+    """State of a running daemon for this profile, or None (stale state files are removed)."""
+    path = state_path(profile_name, browser)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not browser_version(state.get("debugger_address", "")):
+        os.remove(path)
+        return None
+    return state
+
+def _options(browser: str):
+    if browser == "edge":
+        from selenium.webdriver.edge.options import Options
+    else:
+        from selenium.webdriver.chrome.options import Options
+    opts = Options()
+    if browser == "brave":
+        for p in BRAVE_PATHS:
+            if os.path.exists(p):
+                opts.binary_location = p
+                break
+    return opts
+
+def start(profile_name: str, browser: str, headless: bool) -> dict:
+    if browser not in DAEMON_BROWSERS:
+        raise SystemExit(f"[ABORT] daemon needs a Chromium browser (CDP), not {browser}")
+    state = read_state(profile_name, browser)
+    if state:
+        print(f"[INFO] daemon already running at {state['debugger_address']}")
+        return state
+    from selenium import webdriver
+    profile_dir = compute_profile_dir(profile_name, browser)
+    os.makedirs(profile_dir, exist_ok=True)
+    opts = _options(browser)
+    opts.add_argument(f"--user-data-dir={profile_dir}")
+    opts.add_argument("--log-level=3")
+    if headless: opts.add_argument("--headless=new")
+    opts.add_experimental_option("detach", True)
+    if browser != "edge":
+        opts.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
+    driver = webdriver.Edge(options=opts) if browser == "edge" else webdriver.Chrome(options=opts)
+    key = "ms:edgeOptions" if browser == "edge" else "goog:chromeOptions"
+    state = {
+        "browser": browser,
+        "profile": profile_name,
+        "profile_dir": profile_dir,
+        "debugger_address": driver.capabilities[key]["debuggerAddress"],
+        "headless": headless,
+    }
+    os.makedirs(os.path.dirname(state_path(profile_name, browser)), exist_ok=True)
+    with open(state_path(profile_name, browser), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    # Ends the chromedriver session only; "detach" keeps the browser running
+    try:
+        driver.service.stop()
+    except Exception:
+        pass
+    return state
+
+def stop(profile_name: str, browser: str) -> bool:
+    state = read_state(profile_name, browser)
+    if not state:
+        return False
+    from cookielab.cdp import DevToolsClient
+    ws_url = (browser_version(state["debugger_address"]) or {}).get("webSocketDebuggerUrl")
+    try:
+        if not ws_url:
+            print(f"[INFO] {browser}/{profile_name}: browser already gone, removing its state")
+        else:
+            client = DevToolsClient(ws_url)
+            try:
+                client.call("Browser.close", {}, timeout=10)
+            except Exception:
+                pass  # the socket usually drops before the reply
+            client.close()
+    finally:
+        try:
+            os.remove(state_path(profile_name, browser))
+        except OSError:
+            pass
+    return True
+
+def attach_driver(browser: str, address: str, perf_log: bool = False):
+    """New WebDriver session on an already running browser (no launch, no profile init)."""
+    from selenium import webdriver
+    from cookielab import settle
+    opts = _options(browser)
+    opts.debugger_address = address
+    if perf_log:
+        opts.set_capability(settle.EDGE_PERF_LOG_CAP if browser == "edge" else settle.PERF_LOG_CAP,
+                            settle.PERF_LOG_PREFS)
+    return webdriver.Edge(options=opts) if browser == "edge" else webdriver.Chrome(options=opts)
+
+def attach(profile_name: str, browser: str, perf_log: bool = False):
+    """Driver attached to the profile's daemon; RuntimeError when none is running (safe in worker threads)."""
+    state = read_state(profile_name, browser)
+    if not state:
+        raise RuntimeError(f"no daemon for {browser}/{profile_name}. Start one with: "
+                           f"python -m cookielab.daemon start {profile_name} --browser {browser}")
+    print(f"[INFO] Attaching to {browser} daemon at {state['debugger_address']} ...")
+    return attach_driver(browser, state["debugger_address"], perf_log=perf_log)
+
+def attach_or_abort(profile_name: str, browser: str, perf_log: bool = False):
+    try:
+        return attach(profile_name, browser, perf_log)
+    except RuntimeError as e:
+        print(f"[ABORT] {e}")
+        sys.exit(1)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Warm browser daemon for --attach",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("action", choices=["start", "stop", "status"])
+    parser.add_argument("profile_name", help="Profile name (stored under profiles/)")
+    parser.add_argument("--browser", choices=sorted(DAEMON_BROWSERS), default="chrome")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.action == "start":
+        state = start(args.profile_name, args.browser, headless=os.getenv("HEADLESS") == "1")
+        print(f"[COMPLETED] {args.browser}/{args.profile_name} daemon at {state['debugger_address']}")
+    elif args.action == "stop":
+        print("[COMPLETED] stopped" if stop(args.profile_name, args.browser) else "[INFO] not running")
+    else:
+        state = read_state(args.profile_name, args.browser)
+        print(json.dumps(state, indent=2) if state else "[INFO] not running")
+        sys.exit(0 if state else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import argparse, json, os, re, sys
+from concurrent.futures import ProcessPoolExecutor
+
+from cookielab import artifact
+from cookielab.psl import etld1
+
+# Rule-based cookie filter engine.
+#
+# A rule set is {"name": ..., "mode": "keep" | "drop", "rules": [rule, ...]}.
+# A rule matches a cookie when every field it specifies matches (AND); a rule
+# set matches when any of its rules does (OR). "keep" keeps only matching
+# cookies, "drop" removes them. Rule fields:
+#   names      exact cookie names            name_prefix  list of name prefixes
+#   name_regex list of regexes (re.search)   domains      cookie domains (leading dot ignored)
+#   etld1      registrable domains           httpOnly / secure  true / false
+
+AUTH_NAMES = ["reddit_session", "token_v2", "csrf_token"]
+CONSENT_NAMES = ["ckns_policy", "eu_cookie", "OptanonConsent", "OptanonAlertBoxClosed",
+                 "euconsent-v2", "CookieConsent", "cookieconsent_status"]
+
+BUILTIN_RULESETS = {
+    "all-except-auth": {"mode": "drop", "rules": [{"names": AUTH_NAMES}]},
+    "login-only": {"mode": "keep", "rules": [{"names": AUTH_NAMES}]},
+    "consent-only": {"mode": "keep", "rules": [{"names": CONSENT_NAMES}]},
+}
+
+def _bare(domain) -> str:
+    return (domain or "").lstrip(".").lower()
+
+class CompiledRule:
+    __slots__ = ("names", "prefix_re", "name_re", "domains", "etld1", "flags")
+
+    def __init__(self, spec: dict):
+        self.names = frozenset(spec.get("names") or ()) or None
+        # Each field is one compiled alternation (any prefix / any regex); the fields are ANDed
+        prefixes = [re.escape(p) for p in spec.get("name_prefix") or ()]
+        self.prefix_re = re.compile("(?:%s)" % "|".join(prefixes)) if prefixes else None
+        regexes = ["(?:%s)" % r for r in spec.get("name_regex") or ()]
+        self.name_re = re.compile("|".join(regexes)) if regexes else None
+        self.domains = frozenset(_bare(d) for d in spec.get("domains") or ()) or None
+        self.etld1 = frozenset(_bare(d) for d in spec.get("etld1") or ()) or None
+        self.flags = tuple((k, bool(spec[k])) for k in ("httpOnly", "secure") if k in spec)
+
+    def match(self, c: dict) -> bool:
+        name = c.get("name") or ""
+        if self.names is not None and name not in self.names:
+            return False
+        if self.prefix_re is not None and not self.prefix_re.match(name):
+            return False
+        if self.name_re is not None and not self.name_re.search(name):
+            return False
+        if self.domains is not None or self.etld1 is not None:
+            dom = _bare(c.get("domain"))
+            if self.domains is not None and dom not in self.domains:
+                return False
+            if self.etld1 is not None and etld1(dom) not in self.etld1:
+                return False
+        for k, want in self.flags:
+            if bool(c.get(k, False)) != want:
+                return False
+        return True
+
+class RuleSet:
+    def __init__(self, name: str, spec: dict):
+        mode = spec.get("mode", "drop")
+        if mode not in ("keep", "drop"):
+            raise ValueError(f"rule set {name}: mode must be 'keep' or 'drop', got {mode!r}")
+        self.name = name
+        self.keep_matches = mode == "keep"
+        self.rules = [CompiledRule(r) for r in spec.get("rules", [])]
+
+    def matches(self, c: dict) -> bool:
+        return any(r.match(c) for r in self.rules)
+
+    def apply(self, cookies):
+        return [c for c in cookies if self.matches(c) == self.keep_matches]
+
+def load_rulesets(names, rules_file: str = None):
+    """Resolve rule set names against the built-ins and an optional JSON file ({name: spec})."""
+    specs = dict(BUILTIN_RULESETS)
+    if rules_file:
+        with open(rules_file, "r", encoding="utf-8") as f:
+            specs.update(json.load(f))
+    missing = [n for n in names if n not in specs]
+    if missing:
+        raise SystemExit(f"[ABORT] unknown rule set(s): {', '.join(missing)} (known: {', '.join(sorted(specs))})")
+    return {n: specs[n] for n in names}
+
+def filter_payload(data, ruleset: RuleSet, source: str = None):
+    """Return a copy of an artifact with only the cookies the rule set keeps."""
+    cookies = data.get("cookies", []) if isinstance(data, dict) else data
+    kept = ruleset.apply(cookies)
+    if not isinstance(data, dict):
+        return kept
+    out = dict(data)
+    out["cookies"] = kept
+    meta = dict(out.get("meta") or {})
+    meta["filter"] = {"ruleset": ruleset.name, "kept": len(kept),
+                      "dropped": len(cookies) - len(kept), "source": source}
+    out["meta"] = meta
+    return out
+
+# ---------- parallel tree processing ----------
+_worker_rulesets = None
+
+def _init_worker(specs):
+    global _worker_rulesets
+    _worker_rulesets = [RuleSet(n, s) for n, s in specs.items()]
+
+def _process_file(job):
+    src, rel, out_dir, fmt = job
+    data = artifact.read(src)
+    if fmt:  # same relative path, other extension
+        rel = os.path.join(os.path.dirname(rel), artifact.split_name(os.path.basename(rel))[0] + artifact.FORMATS[fmt])
+    res = []
+    for rs in _worker_rulesets:
+        out = filter_payload(data, rs, source=src)
+        artifact.write(os.path.join(out_dir, rs.name, rel), out)
+        res.append((rs.name, len(out["cookies"] if isinstance(out, dict) else out)))
+    return rel, res
+
+def find_artifacts(root: str):
+    """Yield (path, path relative to root) for every extracted cookies_* artifact below root."""
+    if os.path.isfile(root):
+        yield root, os.path.basename(root)
+        return
+    for d, _, files in os.walk(root):
+        for fn in sorted(files):
+            if (fn.startswith("cookies_") and not fn.startswith("cookies_after_")
+                    and artifact.split_name(fn)[0] is not None):
+                p = os.path.join(d, fn)
+                yield p, os.path.relpath(p, root)
+
+def filter_tree(src: str, out_dir: str, specs: dict, workers: int = None, fmt: str = None):
+    """
+    Write <out_dir>/<ruleset>/<relative path> for every artifact under src and every rule
+    set, in the source's format or in fmt (a cookielab.artifact.FORMATS key).
+    """
+    jobs = [(p, rel, out_dir, fmt) for p, rel in find_artifacts(src)]
+    if workers == 1 or len(jobs) <= 1:
+        _init_worker(specs)
+        return [_process_file(j) for j in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,)) as ex:
+        return list(ex.map(_process_file, jobs, chunksize=max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cookie filter: derive consent-only / login-only / all-except-auth (or custom) variants",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("src", help="Artifact file or directory tree of cookies_* artifacts")
+    parser.add_argument("out_dir", help="Output root; variants go to <out_dir>/<ruleset>/...")
+    parser.add_argument("--rules", nargs="+", default=["consent-only", "login-only", "all-except-auth"],
+                        help="Rule set names to apply (built-in or from --rules-file)")
+    parser.add_argument("--rules-file", default=None, help="JSON file of extra rule sets {name: spec}")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--to", choices=sorted(artifact.FORMATS), default=None,
+                        help="Write variants in this artifact format (default: same as each source)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.to:
+        artifact.format_or_abort(args.to)
+    specs = load_rulesets(args.rules, args.rules_file)
+    results = filter_tree(args.src, args.out_dir, specs, args.workers, args.to)
+    for rel, counts in results:
+        print(f"[INFO] {rel}: " + ", ".join(f"{n}={k}" for n, k in counts))
+    print(f"[COMPLETED] {len(results)} artifact(s) x {len(specs)} rule set(s) -> {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import sys
+
+# Shared in-memory cookie model.
+#
+# Cookie keeps one cookie in __slots__ with interned name/domain/path/sameSite
+# strings (the same few domains and paths repeat across thousands of jars), and
+# converts between the three shapes the tools exchange:
+#   CDP       Network.Cookie / CookieParam  (expires, session, httpOnly, sameSite)
+#   JSON      artifact cookies_<domain>.json (expiry; key order kept stable)
+#   Selenium  WebDriver add_cookie / get_cookies (expiry, int)
+# Negative or missing expiries mean a session cookie (CDP reports -1) and become None.
+# CHIPS cookies keep CDP's partitionKey as-is (the top-level site string of older
+# Chromium, {"topLevelSite", "hasCrossSiteAncestor"} of newer ones); it is only
+# written out when set, and is part of the cookie's identity.
+#
+# Cookie.get() mirrors the JSON keys, so code written against dicts (filters,
+# planner, verify) accepts Cookie objects unchanged. CookieJar indexes cookies by
+# (name, domain, path, partition) and by bare domain.
+
+_intern = sys.intern
+SAME_SITE = {v: v for v in ("Lax", "Strict", "None")}  # lookup returns the interned literal
+
+def _expiry(v):
+    if type(v) is int:
+        return v if v >= 0 else None
+    if v is None or v == "":
+        return None
+    try:
+        v = int(float(v))
+    except (TypeError, ValueError):
+        return None
+    return v if v >= 0 else None
+
+def partition_id(pk):
+    """Hashable form of a partitionKey (either CDP spelling), None for unpartitioned cookies."""
+    if isinstance(pk, dict):
+        return (pk.get("topLevelSite"), bool(pk.get("hasCrossSiteAncestor"))) if pk.get("topLevelSite") else None
+    return (pk, False) if pk else None
+
+class Cookie:
+    __slots__ = ("name", "value", "domain", "path", "secure", "http_only", "same_site", "expiry", "partition_key")
+    # JSON key -> slot, for the dict-style get()
+    _FIELDS = {"name": "name", "value": "value", "domain": "domain", "path": "path", "secure": "secure",
+               "httpOnly": "http_only", "sameSite": "same_site", "expiry": "expiry",
+               "partitionKey": "partition_key"}
+
+    def __init__(self, name, value="", domain=None, path="/", secure=False, http_only=False,
+                 same_site=None, expiry=None, partition_key=None):
+        self.name = _intern(name) if name else ""
+        self.value = value if value is not None else ""
+        self.domain = _intern(domain) if domain else None
+        self.path = _intern(path) if path else "/"
+        self.secure = secure is True or bool(secure)
+        self.http_only = http_only is True or bool(http_only)
+        self.same_site = SAME_SITE.get(same_site) if same_site else None
+        self.expiry = _expiry(expiry)
+        self.partition_key = partition_key or None
+
+    # ---------- shapes in ----------
+    @classmethod
+    def from_cdp(cls, c: dict) -> "Cookie":
+        return cls(c.get("name"), c.get("value"), c.get("domain"), c.get("path"), c.get("secure"),
+                   c.get("httpOnly"), c.get("sameSite"), None if c.get("session") else c.get("expires"),
+                   c.get("partitionKey"))
+
+    @classmethod
+    def from_json(cls, c: dict) -> "Cookie":
+        """Artifact or Selenium dict (expiry); CDP-shaped dicts (expires) are accepted too."""
+        return cls(c.get("name"), c.get("value"), c.get("domain"), c.get("path"), c.get("secure"),
+                   c.get("httpOnly"), c.get("sameSite"), c.get("expiry", c.get("expires")), c.get("partitionKey"))
+
+    from_selenium = from_json
+
+    # ---------- shapes out ----------
+    def to_json(self) -> dict:
+        out = {"name": self.name, "value": self.value, "domain": self.domain, "path": self.path,
+               "secure": self.secure, "httpOnly": self.http_only, "sameSite": self.same_site,
+               "expiry": self.expiry}
+        if self.partition_key:
+            out["partitionKey"] = self.partition_key
+        return out
+
+    def to_cdp(self) -> dict:
+        """Network.setCookies CookieParam (optional fields only when set)."""
+        out = {"name": self.name, "value": self.value, "domain": self.domain, "path": self.path,
+               "secure": self.secure, "httpOnly": self.http_only}
+        if self.same_site:
+            out["sameSite"] = self.same_site
+        if self.expiry is not None:
+            out["expires"] = float(self.expiry)
+        if self.partition_key:
+            out["partitionKey"] = self.partition_key
+        return out
+
+    def to_selenium(self) -> dict:
+        out = {"name": self.name, "value": self.value, "path": self.path, "secure": self.secure,
+               "httpOnly": self.http_only}
+        if self.domain:
+            out["domain"] = self.domain
+        if self.same_site:
+            out["sameSite"] = self.same_site
+        if self.expiry is not None:
+            out["expiry"] = self.expiry
+        return out
+
+    # ---------- helpers ----------
+    @property
+    def key(self):
+        return self.name, self.domain, self.path, partition_id(self.partition_key)
+
+    @property
+    def host(self) -> str:
+        """Domain without the leading dot, lower-cased."""
+        return (self.domain or "").lstrip(".").lower()
+
+    @property
+    def host_only(self) -> bool:
+        return not (self.domain or "").startswith(".")
+
+    def get(self, key, default=None):
+        slot = self._FIELDS.get(key)
+        return getattr(self, slot) if slot else default
+
+    def __eq__(self, other):
+        return isinstance(other, Cookie) and all(getattr(self, s) == getattr(other, s) for s in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Cookie({self.name!r}, domain={self.domain!r}, path={self.path!r})"
+
+class CookieJar:
+    """
+    Cookies indexed by (name, domain, path, partition); a later cookie with the same key replaces
+    the earlier one. The by-domain index is built on first use.
+    """
+    __slots__ = ("_by_key", "_by_domain")
+
+    def __init__(self, cookies=()):
+        self._by_key = {c.key: c for c in cookies}
+        self._by_domain = None
+
+    @classmethod
+    def from_cdp(cls, cookies):
+        return cls(Cookie.from_cdp(c) for c in cookies)
+
+    @classmethod
+    def from_json(cls, payload):
+        """Artifact payload ({"cookies": [...]}) or a bare cookie list."""
+        cookies = payload.get("cookies", []) if isinstance(payload, dict) else payload
+        return cls(Cookie.from_json(c) for c in cookies)
+
+    from_selenium = from_json
+
+    def _domain_index(self):
+        if self._by_domain is None:
+            self._by_domain = {}
+            for key, c in self._by_key.items():
+                self._by_domain.setdefault(c.host, {})[key] = c
+        return self._by_domain
+
+    def add(self, c: Cookie):
+        key = c.key
+        old = self._by_key.get(key)
+        self._by_key[key] = c
+        if self._by_domain is not None:
+            if old is not None:
+                del self._by_domain[old.host][key]
+            self._by_domain.setdefault(c.host, {})[key] = c
+
+    def discard(self, key):
+        c = self._by_key.pop(key, None)
+        if c is not None and self._by_domain is not None:
+            del self._by_domain[c.host][key]
+
+    def get(self, name, domain, path="/", partition_key=None):
+        return self._by_key.get((name, domain, path or "/", partition_id(partition_key)))
+
+    def for_domain(self, domain: str, include_subdomains: bool = False):
+        """Cookies whose domain is `domain` (leading dot ignored), optionally also its subdomains."""
+        bare = (domain or "").lstrip(".").lower()
+        index = self._domain_index()
+        if not include_subdomains:
+            return list(index.get(bare, {}).values())
+        return [c for d, cs in index.items() if d == bare or d.endswith("." + bare) for c in cs.values()]
+
+    def domains(self):
+        return [d for d, cs in self._domain_index().items() if cs]
+
+    def filter(self, predicate) -> "CookieJar":
+        return CookieJar(c for c in self._by_key.values() if predicate(c))
+
+    def to_json(self):
+        return [c.to_json() for c in self._by_key.values()]
+
+    def to_cdp(self):
+        return [c.to_cdp() for c in self._by_key.values()]
+
+    def to_selenium(self):
+        return [c.to_selenium() for c in self._by_key.values()]
+
+    def keys(self):
+        return self._by_key.keys()
+
+    def __contains__(self, key):
+        return key in self._by_key
+
+    def __iter__(self):
+        return iter(self._by_key.values())
+
+    def __len__(self):
+        return len(self._by_key)
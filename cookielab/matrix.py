@@ -0,0 +1,243 @@
+import argparse, csv, json, os, queue, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from cookielab import artifact, filters, shots
+
+# Experiment matrix: sites x cookie variants x import browsers, unattended.
+#
+#   python -m cookielab.matrix matrix.json --out runs/m1 --workers 8
+#
+# matrix.json:
+#   {"sites": ["https://www.bbc.com/", {"url": "https://www.reddit.com/", "profile": "ProfileR"}],
+#    "variants": ["full", "consent-only", "login-only", "all-except-auth"],
+#    "browsers": ["chrome", "edge"],
+#    "extract": {"profile": "ProfileA", "browser": "chrome", "args": ["--wait", "90"]},
+#    "import": {"profile": "ProfileB", "template": null, "args": ["--wait", "3", "--screenshot"]},
+#    "rules_file": null}
+#
+# Extraction runs once per site, one at a time (sites share the extract profile).
+# As soon as a site is extracted its variants are derived with cookielab.filters
+# and its import cells are queued on a bounded pool of importer processes, so the
+# pool works while later sites are still being extracted. Every cell has its own
+# run dir <out>/cells/<site>/<variant>/<browser>/ with a cell.json status;
+# re-running the same command skips finished work and retries failed cells.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXTRACTOR = os.path.join(ROOT, "extractor", "cookie_extractor.py")
+IMPORTER = os.path.join(ROOT, "importer", "cookie_importer.py")
+FULL = "full"  # variant name for the unfiltered jar
+SUMMARY_FIELDS = ["site", "variant", "browser", "status", "returncode", "cookies", "applied", "skipped",
+                  "kept", "dropped", "changed", "extra", "elapsed_s", "screenshot", "look", "run_dir"]
+
+def load_spec(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["sites"] = [s if isinstance(s, dict) else {"url": s} for s in spec.get("sites", [])]
+    if not spec["sites"]:
+        raise SystemExit(f"[ABORT] no sites in {path}")
+    spec.setdefault("variants", [FULL])
+    spec.setdefault("browsers", ["chrome"])
+    spec.setdefault("extract", {})
+    spec.setdefault("import", {})
+    return spec
+
+def site_key(url: str) -> str:
+    return urlsplit(url).hostname or url
+
+def read_status(run_dir: str) -> dict:
+    try:
+        with open(os.path.join(run_dir, "cell.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_status(run_dir: str, status: dict):
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "cell.json"), "w", encoding="utf-8") as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+
+def run_logged(cmd, run_dir: str, status_extra: dict = None) -> dict:
+    """Run one tool invocation with output to <run_dir>/log.txt; records and returns cell.json."""
+    os.makedirs(run_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    with open(os.path.join(run_dir, "log.txt"), "w", encoding="utf-8") as log:
+        log.write("$ " + subprocess.list2cmdline(cmd) + "\n")
+        log.flush()
+        rc = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=ROOT)
+    status = dict(status_extra or {}, status="ok" if rc == 0 else "failed", returncode=rc,
+                  elapsed_s=round(time.perf_counter() - t0, 3), finished_at=int(time.time()))
+    write_status(run_dir, status)
+    return status
+
+class MatrixRunner:
+    def __init__(self, spec: dict, out: str, workers: int, force: bool = False):
+        self.spec, self.out, self.force = spec, os.path.abspath(out), force
+        self.workers = max(1, workers)
+        names = [v for v in spec["variants"] if v != FULL]
+        self.rulesets = {n: filters.RuleSet(n, s)
+                         for n, s in filters.load_rulesets(names, spec.get("rules_file")).items()}
+        # Without a profile template, concurrent imports need distinct profiles: one per pool slot
+        self.slots = queue.Queue()
+        for i in range(self.workers):
+            self.slots.put(i)
+        self.lock = threading.Lock()
+        self.rows = []
+
+    # ---------- extract ----------
+    def extract(self, site: dict):
+        """Extract a site once; returns the artifact path (reused when already done)."""
+        ex = self.spec["extract"]
+        run_dir = os.path.join(self.out, "extract", site_key(site["url"]))
+        artifacts = [p for p, _ in filters.find_artifacts(run_dir)] if os.path.isdir(run_dir) else []
+        if artifacts and read_status(run_dir).get("status") == "ok" and not self.force:
+            print(f"[INFO] extract {site['url']}: done earlier, reusing")
+            return artifacts[0]
+        cmd = [sys.executable, EXTRACTOR, site["url"], site.get("profile") or ex.get("profile", "ProfileA"),
+               "--browser", ex.get("browser", "chrome"), "--run-dir", run_dir] + list(ex.get("args", []))
+        print(f"[INFO] extract {site['url']} ...")
+        status = run_logged(cmd, run_dir, {"url": site["url"]})
+        artifacts = [p for p, _ in filters.find_artifacts(run_dir)]
+        if status["status"] != "ok" or not artifacts:
+            print(f"[WARN] extract {site['url']} failed (rc={status['returncode']}), see {run_dir}/log.txt")
+            return None
+        return artifacts[0]
+
+    def derive(self, site: dict, src: str):
+        """
+        Write each variant as cookies_<site host> (in the extracted artifact's format) into every
+        cell dir; returns [(site, variant, browser, run_dir, n_cookies, status)]. Finished cells
+        keep the jar they were imported from (unless --force).
+        """
+        data, fmt = artifact.read(src), artifact.format_of(src)
+        cells = []
+        host = site_key(site.get("import_url", site["url"]))  # the importer looks for cookies_<its host>.*
+        for variant in self.spec["variants"]:
+            out = data if variant == FULL else filters.filter_payload(data, self.rulesets[variant], source=src)
+            n = len(out.get("cookies", []) if isinstance(out, dict) else out)
+            for browser in self.spec["browsers"]:
+                run_dir = os.path.join(self.out, "cells", site_key(site["url"]), variant, browser)
+                status = read_status(run_dir)
+                done = status.get("status") == "ok" and not self.force
+                jar = artifact.find(run_dir, f"cookies_{host}") if done else None
+                if jar:
+                    try:
+                        n = artifact.read_header(jar).get("counts", {}).get("cookies", n)
+                    except (OSError, ValueError, RuntimeError):
+                        pass
+                else:
+                    artifact.write(artifact.path_for(run_dir, f"cookies_{host}", fmt), out)
+                cells.append((site, variant, browser, run_dir, n, status if done else {}))
+        return cells
+
+    # ---------- import ----------
+    def import_cell(self, site, variant, browser, run_dir, n_cookies):
+        im = self.spec["import"]
+        slot = self.slots.get()
+        try:
+            profile = im.get("profile", "ProfileB")
+            cmd = [sys.executable, IMPORTER, site.get("import_url", site["url"]),
+                   profile if im.get("template") else f"{profile}_s{slot}", "--browser", browser,
+                   "--run-dir", run_dir] + (["--profile-template", im["template"]] if im.get("template") else [])
+            status = run_logged(cmd + list(im.get("args", [])), run_dir,
+                                {"url": site["url"], "variant": variant, "browser": browser})
+        finally:
+            self.slots.put(slot)
+        self.record(site, variant, browser, run_dir, n_cookies, status)
+        print(f"[{'OK' if status['status'] == 'ok' else 'FAILED'}] {site_key(site['url'])} / {variant} / {browser} "
+              f"({status['elapsed_s']:.1f}s)")
+
+    def record(self, site, variant, browser, run_dir, n_cookies, status):
+        host = site_key(site.get("import_url", site["url"]))
+        meta = {}
+        try:
+            with open(os.path.join(run_dir, f"import_meta_{host}.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f).get("meta", {})
+        except (OSError, ValueError):
+            pass
+        verified = meta.get("verify") or {}
+        shot = (meta.get("screenshot") or {}).get("path") or ""
+        row = {"site": site_key(site["url"]), "variant": variant, "browser": browser,
+               "status": status.get("status", ""), "returncode": status.get("returncode", ""),
+               "cookies": n_cookies, "applied": meta.get("applied", ""), "skipped": meta.get("skipped", ""),
+               # Post-import verification (cookielab.verify counts, CDP imports only)
+               "kept": verified.get("applied", ""), "dropped": verified.get("dropped", ""),
+               "changed": (verified.get("value_changed", 0) + verified.get("attribute_changed", 0)) if verified else "",
+               "extra": verified.get("extra", ""),
+               "elapsed_s": status.get("elapsed_s", ""), "screenshot": shot if os.path.exists(shot) else "", "look": "",
+               "run_dir": os.path.relpath(run_dir, self.out)}
+        with self.lock:
+            self.rows.append(row)
+
+    # ---------- schedule ----------
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = []
+            for site in self.spec["sites"]:
+                src = self.extract(site)
+                if not src:
+                    for variant in self.spec["variants"]:
+                        for browser in self.spec["browsers"]:
+                            run_dir = os.path.join(self.out, "cells", site_key(site["url"]), variant, browser)
+                            self.record(site, variant, browser, run_dir, "", {"status": "extract_failed"})
+                    continue
+                for site_, variant, browser, run_dir, n, status in self.derive(site, src):
+                    if status:
+                        self.record(site_, variant, browser, run_dir, n, status)
+                        continue
+                    cell = (site_, variant, browser, run_dir, n)
+                    futures.append((pool.submit(self.import_cell, *cell), cell))
+            for fut, (site_, variant, browser, run_dir, n) in futures:
+                try:
+                    fut.result()
+                except Exception as e:  # one broken cell must not cost the summary of all others
+                    print(f"[FAILED] {site_key(site_['url'])} / {variant} / {browser}: {e}")
+                    self.record(site_, variant, browser, run_dir, n, {"status": "error", "error": str(e)})
+        return self.write_summary()
+
+    def write_summary(self) -> str:
+        order = {(site_key(s["url"]), v, b): i for i, (s, v, b) in enumerate(
+            (s, v, b) for s in self.spec["sites"] for v in self.spec["variants"] for b in self.spec["browsers"])}
+        rows = sorted(self.rows, key=lambda r: order.get((r["site"], r["variant"], r["browser"]), 0))
+        # Screenshot clusters per site; flags cells where the banner came back despite consent cookies
+        looks = {os.path.relpath(r["run_dir"], self.out): r
+                 for r in shots.compare_tree(os.path.join(self.out, "cells"))}
+        for r in rows:
+            look = looks.get(r["run_dir"])
+            if look and look["cluster"] is not None:
+                r["look"] = look["flag"] or f"cluster {look['cluster']}"
+        path = os.path.join(self.out, "summary.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+            w.writeheader()
+            w.writerows(rows)
+        print(f"\n{'site':<28}{'variant':<18}{'browser':<10}{'status':<16}{'cookies':>8}{'applied':>8}{'skipped':>8}"
+              f"{'kept':>8}{'dropped':>8}")
+        for r in rows:
+            print(f"{r['site']:<28}{r['variant']:<18}{r['browser']:<10}{r['status']:<16}"
+                  f"{r['cookies']!s:>8}{r['applied']!s:>8}{r['skipped']!s:>8}{r['kept']!s:>8}{r['dropped']!s:>8}")
+        return path
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run an extract -> variants -> import matrix (sites x variants x browsers)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("spec", help="Matrix spec JSON (format in the header of cookielab/matrix.py)")
+    parser.add_argument("--out", required=True, help="Run root; re-running with the same root resumes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Concurrent import processes")
+    parser.add_argument("--force", action="store_true", help="Redo extractions and cells that already succeeded")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    spec = load_spec(args.spec)
+    runner = MatrixRunner(spec, args.out, args.workers, args.force)
+    path = runner.run()
+    failed = [r for r in runner.rows if r["status"] != "ok"]
+    print(f"[ARTIFACT] Summary saved -> {path}")
+    print(f"[COMPLETED] {len(runner.rows) - len(failed)}/{len(runner.rows)} cell(s) ok")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
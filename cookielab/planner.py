@@ -0,0 +1,166 @@
+import time
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+from cookielab.jar import Cookie
+
+# Selenium-mode import planner (no CDP, e.g. Firefox).
+#
+# WebDriver can only set cookies for the document it is on, one HTTP round trip
+# per add_cookie. The planner groups the jar by registrable domain (eTLD+1),
+# picks the few hosts that can carry every cookie of the group, and visits each
+# once on a light path. Non-HttpOnly cookies are written in a single
+# execute_script (document.cookie) per visit; only HttpOnly ones, which scripts
+# cannot set, go through add_cookie.
+
+LIGHT_PATH = "/robots.txt"
+# Fewer script-safe cookies than this on one visit go through add_cookie as well:
+# one round trip each either way, without the document.cookie batch and read-back
+SCRIPT_MIN = 2
+# Characters document.cookie cannot carry in a value; such cookies use add_cookie
+_UNSAFE_VALUE = set(';\r\n')
+
+APPLY_JS = """
+const items = arguments[0];
+for (const it of items) { try { document.cookie = it[1]; } catch (e) {} }
+const jar = new Set(document.cookie ? document.cookie.split("; ") : []);
+return items.filter(it => it[3] && !jar.has(it[2])).map(it => it[0]);
+"""
+
+def cookie_host(c) -> str:
+    return (c.get("domain") or "").lstrip(".").lower()
+
+def is_host_only(c) -> bool:
+    return not (c.get("domain") or "").startswith(".")
+
+def cookie_string(c) -> str:
+    """document.cookie assignment reproducing the cookie's attributes."""
+    parts = [f"{c['name']}={c.get('value', '')}", f"path={c.get('path') or '/'}"]
+    if not is_host_only(c):
+        parts.append(f"domain={cookie_host(c)}")
+    if c.get("expiry") is not None:
+        parts.append("expires=" + formatdate(int(c["expiry"]), usegmt=True))
+    if c.get("secure"):
+        parts.append("secure")
+    if c.get("sameSite") in ("Lax", "Strict", "None"):
+        parts.append(f"samesite={c['sameSite']}")
+    return "; ".join(parts)
+
+def plan(cookies, etld1, target_url: str, include_target: bool = False):
+    """
+    Group cookies into visits [{"site", "origin", "cookies"}], one per host to open.
+    Host-only cookies need their exact host; domain cookies ride along on any visited
+    host inside their domain (else the domain itself is visited). The target's host is
+    visited last (always, with include_target) so the browser ends on the target site.
+    Returns (visits, dropped) where dropped is [(site, cookie, reason)].
+    """
+    # Through the shared model: CDP-style expiries of -1 (session) are not "expired"
+    cookies = [Cookie.from_json(c).to_json() for c in cookies]
+    target = urlsplit(target_url)
+    target_host = (target.hostname or "").lower()
+    site_of = lambda h: etld1(h) or h
+    now = time.time()
+    groups, dropped = {}, []
+    for c in cookies:
+        host = cookie_host(c) or target_host
+        if not c.get("name") or (c.get("expiry") is not None and float(c["expiry"]) <= now):
+            dropped.append((site_of(host), c, "expired or unnamed"))
+            continue
+        groups.setdefault(site_of(host), []).append(c)
+    if include_target and target_host:
+        groups.setdefault(site_of(target_host), [])
+
+    visits = []
+    for site, group in groups.items():
+        hosts = {}
+        for c in group:
+            if is_host_only(c):
+                hosts.setdefault(cookie_host(c) or target_host, []).append(c)
+        if site_of(target_host) == site:
+            hosts.setdefault(target_host, [])
+        for c in group:
+            if is_host_only(c):
+                continue
+            dom = cookie_host(c)
+            carrier = next((h for h in hosts if h == dom or h.endswith("." + dom)), dom)
+            hosts.setdefault(carrier, []).append(c)
+        for host, cs in hosts.items():
+            if cs or (host == target_host and include_target):
+                scheme = target.scheme if host == target_host and target.scheme else "https"
+                visits.append({"site": site, "origin": f"{scheme}://{host}", "cookies": cs})
+    visits.sort(key=lambda v: urlsplit(v["origin"]).hostname == target_host)
+    return visits, dropped
+
+def _webdriver_cookie(c):
+    return Cookie.from_json(c).to_selenium()
+
+def _covers(host: str, c) -> bool:
+    ch = cookie_host(c) or host
+    return host == ch if is_host_only(c) else (host == ch or host.endswith("." + ch))
+
+def apply_visit(driver, visit, clear: bool = False, carry=()):
+    """
+    Open the visit's light path and write its cookies. With clear, the cookies this
+    document can see are deleted first and `carry` (domain cookies written on earlier
+    visits of the same site) is written again. Returns (applied, [(cookie, reason)]).
+    """
+    driver.get(visit["origin"] + LIGHT_PATH)
+    host = (urlsplit(driver.current_url).hostname or "").lower()
+    if clear:
+        driver.delete_all_cookies()
+    rewrite = [c for c in carry if _covers(host, c)] if clear else []
+    skipped, scripted, singles = [], [], []
+    for c in rewrite + visit["cookies"]:
+        if not _covers(host, c):
+            skipped.append((c, f"redirected to {host}"))
+        elif c.get("httpOnly") or _UNSAFE_VALUE & set(str(c.get("value", ""))):
+            singles.append(c)
+        else:
+            scripted.append(c)
+    if len(scripted) < SCRIPT_MIN:
+        scripted, singles = [], scripted + singles
+    counted = {id(c) for c in visit["cookies"]}
+    applied = 0
+    if scripted:
+        # Only path=/ cookies are visible from the light path, the rest cannot be checked
+        batch = [[i, cookie_string(c), f"{c['name']}={c.get('value', '')}", (c.get("path") or "/") == "/"]
+                 for i, c in enumerate(scripted)]
+        missing = set(driver.execute_script(APPLY_JS, batch) or [])
+        for i, c in enumerate(scripted):
+            if id(c) not in counted:
+                continue
+            if i in missing:
+                skipped.append((c, "rejected by the browser"))
+            else:
+                applied += 1
+    for c in singles:
+        try:
+            driver.add_cookie(_webdriver_cookie(c))
+            applied += id(c) in counted
+        except Exception as e:
+            if id(c) in counted:
+                skipped.append((c, str(e).splitlines()[0] if str(e) else type(e).__name__))
+    return applied, skipped
+
+def apply_plan(driver, visits, dropped=(), clear: bool = False):
+    """Run every visit. Returns {site: {"applied", "skipped", "hosts"}} including plan-time drops."""
+    report, written = {}, {}
+    for site, c, reason in dropped:
+        report.setdefault(site, {"applied": 0, "skipped": 0, "hosts": []})["skipped"] += 1
+        print(f"[WARN] Cookie ignored: {c.get('name')} ({c.get('domain')}) - {reason}")
+    for v in visits:
+        r = report.setdefault(v["site"], {"applied": 0, "skipped": 0, "hosts": []})
+        r["hosts"].append(v["origin"])
+        try:
+            applied, skipped = apply_visit(driver, v, clear, written.get(v["site"], ()))
+            done = {id(c) for c, _ in skipped}
+            written.setdefault(v["site"], []).extend(
+                c for c in v["cookies"] if not is_host_only(c) and id(c) not in done)
+        except Exception as e:
+            applied, skipped = 0, [(c, f"visit failed: {str(e).splitlines()[0] if str(e) else e!r}")
+                                   for c in v["cookies"]]
+        r["applied"] += applied
+        r["skipped"] += len(skipped)
+        for c, reason in skipped:
+            print(f"[WARN] Cookie ignored: {c.get('name')} ({c.get('domain')}) - {reason}")
+    return report
@@ -0,0 +1,289 @@
+import argparse, errno, json, os, shutil, stat, sys, time
+
+# Browser profile directories.
+#
+# compute_profile_dir() is the classic persistent profile (profiles/<name> or
+# profiles/<browser>_<name>). Templates are pristine, already-initialized
+# profiles under profiles/_templates/; each run can take a throwaway clone under
+# profiles/_runs/ instead of paying Chrome's first-run setup in an empty dir.
+# clone_profile() takes the same kind of clone of a persistent profile, for runs
+# that wipe browser state (extractor batch workers) but must leave the source alone.
+#
+# Clones use reflinks (true copy-on-write, Linux FICLONE on btrfs/xfs) when the
+# filesystem supports them. Otherwise read-only component data (versioned
+# directories Chrome replaces rather than edits) is hardlinked and everything
+# else is copied: Chrome edits SQLite files such as Cookies in place, so a
+# hardlink there would leak writes back into the template.
+#
+# A clone is built under a hidden staging name (.<name>) with its owner marker
+# inside and renamed into place when complete, so gc_clones() never sees a
+# half-built clone without a marker.
+
+TEMPLATE_ROOT = "profiles/_templates"
+RUN_ROOT = "profiles/_runs"
+CLONE_MARKER = ".cookielab_clone.json"
+# Top-level profile entries holding immutable, versioned component data
+HARDLINK_SAFE = {"CertificateRevocation", "Crowd Deny", "FileTypePolicies", "hyphen-data", "MEIPreload",
+                 "OnDeviceHeadSuggestModel", "OptimizationHints", "OriginTrials", "PKIMetadata",
+                 "SafetyTips", "SSLErrorAssistant", "Subresource Filter", "TrustTokenKeyCommitments",
+                 "WidevineCdm", "ZxcvbnData", "segmentation_platform", "FirstPartySetsPreloaded",
+                 "AutofillStates", "ClientSidePhishing", "MediaFoundationWidevineCdm"}
+FICLONE = 0x40049409
+CLONE_MAX_AGE = 24 * 3600
+
+def compute_profile_dir(profile_name: str, browser: str) -> str:
+    legacy = os.path.abspath(f"profiles/{profile_name}")
+    scoped = os.path.abspath(f"profiles/{browser}_{profile_name}")
+    return legacy if os.path.exists(legacy) else scoped
+
+def template_dir(template: str, browser: str) -> str:
+    return os.path.abspath(os.path.join(TEMPLATE_ROOT, f"{browser}_{template}"))
+
+def _clear_readonly(func, path, exc):
+    # Windows cannot unlink read-only files (templates made by older versions chmod'ed
+    # their component files 0o444, and clones hardlink them): clear the bit and retry once
+    if func in (os.unlink, os.remove, os.rmdir) and os.path.lexists(path):
+        os.chmod(path, stat.S_IWRITE | stat.S_IREAD)
+        func(path)
+    else:
+        raise exc if isinstance(exc, BaseException) else exc[1]  # onexc passes the exception, onerror exc_info
+
+def remove_tree(path: str) -> bool:
+    """rmtree that also removes read-only files; logs and returns False instead of leaking silently."""
+    try:
+        if sys.version_info >= (3, 12):
+            shutil.rmtree(path, onexc=_clear_readonly)
+        else:
+            shutil.rmtree(path, onerror=_clear_readonly)
+        return True
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        print(f"[WARN] could not remove {path}: {e}")
+        return False
+
+# ---------- file cloning ----------
+def _reflink(src: str, dst: str) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
+def clone_tree(src: str, dst: str) -> dict:
+    """Clone src into dst file by file; returns {'reflink': n, 'hardlink': n, 'copy': n}."""
+    stats = {"reflink": 0, "hardlink": 0, "copy": 0}
+    use_reflink = True
+    for root, dirs, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        os.makedirs(os.path.join(dst, rel), exist_ok=True)
+        top = rel.split(os.sep)[0]
+        for fn in files:
+            s, d = os.path.join(root, fn), os.path.join(dst, rel, fn)
+            if os.path.islink(s):
+                continue  # Singleton* lock links belong to a running browser
+            if use_reflink and _reflink(s, d):
+                stats["reflink"] += 1
+                continue
+            use_reflink = False  # first failure means the filesystem cannot do it
+            if top in HARDLINK_SAFE:
+                try:
+                    os.link(s, d)
+                    stats["hardlink"] += 1
+                    continue
+                except OSError:
+                    pass
+            shutil.copy2(s, d)
+            stats["copy"] += 1
+    return stats
+
+# ---------- templates ----------
+def snapshot_template(src_profile_dir: str, template: str, browser: str) -> str:
+    """Freeze an initialized profile dir (browser closed) as a template."""
+    dst = template_dir(template, browser)
+    if os.path.exists(dst):
+        raise SystemExit(f"[ABORT] template already exists: {dst}")
+    tmp = dst + ".tmp"
+    remove_tree(tmp)
+    # HARDLINK_SAFE files stay writable: a read-only bit would be shared by every hardlinked
+    # clone and keep Windows from deleting them; Chrome replaces those dirs, it does not edit them
+    shutil.copytree(src_profile_dir, tmp, symlinks=True,
+                    ignore=shutil.ignore_patterns("Singleton*", "lockfile", "*.tmp"))
+    os.replace(tmp, dst)
+    return dst
+
+def init_template(template: str, browser: str, headless: bool = True, settle_s: float = 5) -> str:
+    """Bootstrap a fresh profile once (first-run init happens here) and snapshot it as a template."""
+    from selenium import webdriver
+    from cookielab.daemon import _options
+    work = os.path.abspath(os.path.join(TEMPLATE_ROOT, f".init_{browser}_{template}"))
+    remove_tree(work)
+    opts = _options(browser)
+    opts.add_argument(f"--user-data-dir={work}")
+    opts.add_argument("--log-level=3")
+    if headless: opts.add_argument("--headless=new")
+    driver = webdriver.Edge(options=opts) if browser == "edge" else webdriver.Chrome(options=opts)
+    try:
+        driver.get("about:blank")
+        time.sleep(settle_s)  # let component updates / first-run writes land
+    finally:
+        driver.quit()
+    try:
+        return snapshot_template(work, template, browser)
+    finally:
+        remove_tree(work)
+
+# ---------- per-run clones ----------
+def _pid_alive(pid: int) -> bool:
+    if not pid:
+        return False
+    if os.name == "nt":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+def _browser_running(profile_dir: str) -> bool:
+    """Chrome keeps SingletonLock (-> host-pid) on POSIX and a locked 'lockfile' on Windows."""
+    lock = os.path.join(profile_dir, "SingletonLock")
+    if os.path.islink(lock):
+        try:
+            return _pid_alive(int(os.readlink(lock).rsplit("-", 1)[1]))
+        except (OSError, ValueError, IndexError):
+            return True
+    lockfile = os.path.join(profile_dir, "lockfile")
+    if os.name == "nt" and os.path.exists(lockfile):
+        try:
+            os.remove(lockfile)
+        except OSError:
+            return True
+    return False
+
+def gc_clones(max_age: float = CLONE_MAX_AGE) -> int:
+    """Remove clones whose owner is gone (or that are older than max_age) and no browser is using."""
+    root = os.path.abspath(RUN_ROOT)
+    if not os.path.isdir(root):
+        return 0
+    removed, now = 0, time.time()
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name.startswith("."):  # clone still being built; only collect ones left by a crash
+            try:
+                if now - os.path.getmtime(path) < max_age:
+                    continue
+            except OSError:
+                continue
+        else:
+            try:
+                with open(os.path.join(path, CLONE_MARKER), "r", encoding="utf-8") as f:
+                    marker = json.load(f)
+            except (OSError, ValueError):
+                marker = {}
+            if _browser_running(path):
+                continue
+            if _pid_alive(marker.get("owner_pid")) and now - marker.get("created_at", 0) < max_age:
+                continue
+        removed += remove_tree(path)
+    return removed
+
+def _clone_dir(src: str, stem: str, marker: dict, what: str) -> str:
+    gc_clones()
+    name = f"{stem}_{os.getpid()}_{time.time_ns()}"
+    dst = os.path.abspath(os.path.join(RUN_ROOT, name))
+    staging = os.path.join(os.path.dirname(dst), "." + name)
+    t0 = time.perf_counter()
+    os.makedirs(staging)
+    try:
+        with open(os.path.join(staging, CLONE_MARKER), "w", encoding="utf-8") as f:
+            json.dump(dict(marker, owner_pid=os.getpid(), created_at=time.time()), f)
+        stats = clone_tree(src, staging)
+        os.rename(staging, dst)  # appears complete, marker included
+    except BaseException:
+        remove_tree(staging)
+        raise
+    print(f"[INFO] Profile cloned from {what} in {time.perf_counter() - t0:.2f}s "
+          f"(reflink={stats['reflink']}, hardlink={stats['hardlink']}, copy={stats['copy']})")
+    return dst
+
+def clone_for_run(template: str, browser: str, label: str = "") -> str:
+    """Fresh throwaway profile cloned from a template; old clones are collected first."""
+    src = template_dir(template, browser)
+    if not os.path.isdir(src):
+        raise SystemExit(f"[ABORT] no profile template {browser}/{template}. Create one with: "
+                         f"python -m cookielab.profiles init {template} --browser {browser}")
+    return _clone_dir(src, f"{browser}_{template}{label}", {"template": template, "browser": browser},
+                      f"template {template}")
+
+def clone_profile(profile_dir: str, browser: str, label: str = "") -> str:
+    """
+    Throwaway clone of a persistent profile (logins included) that a run may wipe freely;
+    the source is only read. A profile that does not exist yet gives an empty clone.
+    """
+    if _browser_running(profile_dir):
+        raise RuntimeError(f"{profile_dir} is in use by a running browser; close it (or use --attach)")
+    name = os.path.basename(os.path.normpath(profile_dir))
+    return _clone_dir(profile_dir, f"{name}{label}", {"profile": profile_dir, "browser": browser},
+                      f"profile {name}")
+
+def release_clone(profile_dir: str):
+    """Delete a run clone once its browser has quit (no-op for non-clone dirs)."""
+    if os.path.exists(os.path.join(profile_dir, CLONE_MARKER)) and not _browser_running(profile_dir):
+        remove_tree(profile_dir)
+
+# ---------- CLI ----------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile templates and per-run clones",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("init", help="Bootstrap a fresh profile once and save it as a template")
+    p.add_argument("template")
+    p.add_argument("--browser", choices=["chrome", "edge", "brave", "chromium"], default="chrome")
+    p = sub.add_parser("snapshot", help="Save an existing (closed) profile as a template")
+    p.add_argument("profile_name")
+    p.add_argument("template")
+    p.add_argument("--browser", choices=["chrome", "edge", "brave", "chromium"], default="chrome")
+    p = sub.add_parser("gc", help="Remove abandoned run clones")
+    p.add_argument("--max-age", type=float, default=CLONE_MAX_AGE, help="Seconds before live owners' clones go too")
+    sub.add_parser("list", help="List templates and clones")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.cmd == "init":
+        print(f"[COMPLETED] template -> {init_template(args.template, args.browser, os.getenv('HEADLESS', '1') == '1')}")
+    elif args.cmd == "snapshot":
+        src = compute_profile_dir(args.profile_name, args.browser)
+        if _browser_running(src):
+            print(f"[ABORT] a browser is still using {src}; close it first")
+            sys.exit(1)
+        print(f"[COMPLETED] template -> {snapshot_template(src, args.template, args.browser)}")
+    elif args.cmd == "gc":
+        print(f"[COMPLETED] removed {gc_clones(args.max_age)} clone(s)")
+    else:
+        for root in (TEMPLATE_ROOT, RUN_ROOT):
+            if os.path.isdir(root):
+                for name in sorted(os.listdir(root)):
+                    if not name.startswith("."):
+                        print(os.path.join(root, name))
+
+if __name__ == "__main__":
+    main()
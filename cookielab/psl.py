@@ -0,0 +1,129 @@
+import ipaddress, marshal, os
+from functools import lru_cache
+
+# Public Suffix List lookups (eTLD / eTLD+1) from a bundled, offline copy of
+# https://publicsuffix.org/list/public_suffix_list.dat (snapshot 2023-02-09).
+# Set COOKIE_LAB_PSL=/path/to/public_suffix_list.dat to use a newer list.
+#
+# The list is compiled into a label trie on first use and cached as a marshal
+# snapshot next to the list (when writable), so later processes skip parsing.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DEFAULT_LIST = os.path.join(DATA_DIR, "public_suffix_list.dat")
+SNAPSHOT_VERSION = 1
+
+# Terminal markers stored under the "" key of a trie node
+RULE, EXCEPTION = 1, 2
+
+_trie = None
+
+def list_path() -> str:
+    return os.getenv("COOKIE_LAB_PSL") or DEFAULT_LIST
+
+def _insert(trie: dict, labels, kind: int):
+    node = trie
+    for lab in reversed(labels):
+        node = node.setdefault(lab, {})
+    node[""] = kind
+
+def compile_list(path: str) -> dict:
+    """Parse a public_suffix_list.dat into a reversed-label trie (ICANN and private sections)."""
+    trie = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            rule = line.split(None, 1)[0] if line.strip() else ""
+            if not rule or rule.startswith("//"):
+                continue
+            kind = EXCEPTION if rule.startswith("!") else RULE
+            rule = rule.lstrip("!").lower()
+            _insert(trie, rule.split("."), kind)
+            # Cookie domains arrive in punycode, so index the ASCII form of IDN rules too
+            try:
+                ascii_rule = rule.encode("idna").decode("ascii")
+            except UnicodeError:
+                continue
+            if ascii_rule != rule:
+                _insert(trie, ascii_rule.split("."), kind)
+    return trie
+
+def _snapshot_path(path: str) -> str:
+    return os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".marshal")
+
+def load_trie(path: str = None) -> dict:
+    """Load the trie from the marshal snapshot if it matches the list, else compile (and try to save it)."""
+    path = path or list_path()
+    st = os.stat(path)
+    key = (SNAPSHOT_VERSION, st.st_size, st.st_mtime_ns)
+    snap = _snapshot_path(path)
+    try:
+        with open(snap, "rb") as f:
+            stored_key, trie = marshal.load(f)
+        if tuple(stored_key) == key:
+            return trie
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    trie = compile_list(path)
+    try:
+        tmp = f"{snap}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump((key, trie), f)
+        os.replace(tmp, snap)
+    except OSError:
+        pass
+    return trie
+
+def _get_trie() -> dict:
+    global _trie
+    if _trie is None:
+        _trie = load_trie()
+    return _trie
+
+def _suffix_len(labels) -> int:
+    """Number of trailing labels forming the public suffix (implicit '*' rule when nothing matches)."""
+    node, best = _get_trie(), 1
+    for i, lab in enumerate(reversed(labels)):
+        child = node.get(lab)
+        if child is not None and child.get("") == EXCEPTION:
+            return i
+        wild = node.get("*")
+        if wild is not None and wild.get("") == RULE:
+            best = max(best, i + 1)
+        if child is None:
+            break
+        if child.get("") == RULE:
+            best = i + 1
+        node = child
+    return best
+
+def _clean(host: str) -> str:
+    return (host or "").strip().lstrip(".").rstrip(".").lower()
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+@lru_cache(maxsize=65536)
+def public_suffix(host: str) -> str:
+    host = _clean(host)
+    if not host or _is_ip(host):
+        return host
+    labels = host.split(".")
+    return ".".join(labels[-_suffix_len(labels):])
+
+@lru_cache(maxsize=65536)
+def etld1(host: str) -> str:
+    """
+    Registrable domain (eTLD+1) of a host or cookie domain, e.g. news.bbc.co.uk -> bbc.co.uk.
+    Hosts that are themselves a public suffix, IPs and single labels are returned as-is.
+    """
+    host = _clean(host)
+    if not host or _is_ip(host):
+        return host
+    labels = host.split(".")
+    n = _suffix_len(labels)
+    if n >= len(labels):
+        return host
+    return ".".join(labels[-(n + 1):])
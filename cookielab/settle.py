@@ -0,0 +1,134 @@
+import json, time
+
+# Page "settle" detection: return as soon as the page's network has been quiet
+# for a short window instead of always sleeping for --wait seconds.
+#
+# CDP mode reads Network.* / Page.lifecycleEvent either from a DevTools
+# websocket transport (cookielab.cdp.DevToolsClient) or from chromedriver's
+# performance log (enabled with perf_log=True in make_driver). Selenium mode
+# (Firefox) polls document.readyState instead.
+
+PERF_LOG_CAP = "goog:loggingPrefs"
+EDGE_PERF_LOG_CAP = "ms:loggingPrefs"
+PERF_LOG_PREFS = {"performance": "ALL"}
+
+class SettleTracker:
+    """Feed CDP events in; settled() says whether the network has been idle long enough."""
+
+    def __init__(self, quiet: float = 0.5, idle_connections: int = 0):
+        self.quiet = quiet
+        self.idle_connections = idle_connections
+        self.inflight = set()
+        self.main_frame = None
+        self.loaded = False
+        self.network_idle = False
+        self.last_activity = time.monotonic()
+
+    def feed(self, method: str, params: dict, now: float = None):
+        now = time.monotonic() if now is None else now
+        if method == "Network.requestWillBeSent":
+            self.inflight.add(params.get("requestId"))
+            self.last_activity = now
+        elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+            self.inflight.discard(params.get("requestId"))
+            self.last_activity = now
+        elif method == "Page.frameNavigated":
+            frame = params.get("frame") or {}
+            if not frame.get("parentId"):
+                # New main document: earlier lifecycle state no longer applies
+                self.main_frame = frame.get("id")
+                self.loaded = self.network_idle = False
+        elif method == "Page.lifecycleEvent":
+            if self.main_frame and params.get("frameId") != self.main_frame:
+                return
+            name = params.get("name")
+            if name == "load":
+                self.loaded = True
+            elif name == "networkIdle":
+                self.network_idle = True
+        elif method == "Page.loadEventFired":
+            self.loaded = True
+
+    def settled(self, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self.network_idle:
+            return True
+        return (self.loaded and len(self.inflight) <= self.idle_connections
+                and now - self.last_activity >= self.quiet)
+
+def read_performance_log(driver):
+    """Drain chromedriver's performance log and return [(method, params), ...]."""
+    out = []
+    for entry in driver.get_log("performance"):
+        try:
+            msg = json.loads(entry["message"])["message"]
+            out.append((msg.get("method"), msg.get("params") or {}))
+        except Exception:
+            pass
+    return out
+
+def enable_events(cdp):
+    """Turn on the CDP domains the tracker listens to on a cookielab.cdp transport (CDP mode only)."""
+    try:
+        cdp.batch([("Network.enable", {}), ("Page.enable", {}),
+                   ("Page.setLifecycleEventsEnabled", {"enabled": True})])
+    except Exception as e:
+        print("[WARN] settle: enabling lifecycle events failed:", e)
+
+def event_source(driver, cdp=None):
+    """Callable returning new [(method, params), ...]: the websocket transport's queue or the performance log."""
+    if cdp is not None and cdp.supports_events:
+        return cdp.drain_events
+    return lambda: read_performance_log(driver)
+
+def discard_events(driver, cdp=None):
+    """Drop buffered events so a new navigation starts with a clean tracker."""
+    try:
+        event_source(driver, cdp)()
+    except Exception:
+        pass
+
+def wait_for_settle(driver, max_wait: float, quiet: float = 0.5, cdp: bool = True,
+                    events=None, poll: float = 0.1):
+    """
+    Block until the page settles or max_wait seconds pass. Returns (reason, elapsed).
+    events: optional callable returning [(method, params), ...]; defaults to the performance log.
+    Falls back to document.readyState polling when no event source is available.
+    """
+    start = time.monotonic()
+    deadline = start + max(0, max_wait)
+    if cdp:
+        source = events or (lambda: read_performance_log(driver))
+        tracker = SettleTracker(quiet=quiet)
+        try:
+            while True:
+                now = time.monotonic()
+                for method, params in source():
+                    tracker.feed(method, params, now)
+                if tracker.settled(now):
+                    return "network-idle", now - start
+                if now >= deadline:
+                    return "timeout", now - start
+                time.sleep(poll)
+        except Exception as e:
+            print("[WARN] settle: event source unavailable, polling readyState:", e)
+    return wait_ready_state(driver, deadline, quiet, start, poll)
+
+def wait_ready_state(driver, deadline: float, quiet: float, start: float, poll: float = 0.1):
+    """Selenium-mode fallback: document.readyState == 'complete' held for `quiet` seconds."""
+    complete_since = None
+    while True:
+        now = time.monotonic()
+        try:
+            state = driver.execute_script("return document.readyState")
+        except Exception:
+            state = None
+        if state == "complete":
+            complete_since = complete_since or now
+            if now - complete_since >= quiet:
+                return "ready-state", now - start
+        else:
+            complete_since = None
+        if now >= deadline:
+            return "timeout", now - start
+        time.sleep(poll)
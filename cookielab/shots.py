@@ -0,0 +1,271 @@
+import argparse, base64, csv, json, os, queue, struct, sys, threading, zlib
+from urllib.parse import urlsplit
+
+# Screenshots: cheap capture and perceptual comparison.
+#
+# capture() asks CDP Page.captureScreenshot for the configured format/quality/clip/
+# scale, plus a tiny (HASH_WIDTH px wide) PNG of the same area that the browser
+# downscales itself. The perceptual hash (dHash, 64 bit) is computed from that tiny
+# PNG with the stdlib decoder below, so no image library is needed. Base64
+# decoding, hashing and file writes happen on a ShotWriter thread, off the driver.
+#
+# compare_tree() groups screenshots across runs by Hamming distance and flags cells
+# whose page looks unlike the reference variant although the consent cookies were
+# imported (typically: the banner came back).
+#
+#   python -m cookielab.shots runs/m1 --threshold 10
+
+HASH_WIDTH = 64
+THRESHOLD = 10  # max differing bits (of 64) for "looks the same"
+EXT = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+REFERENCE = "full"
+CONSENT_VARIANTS = ("full", "consent-only", "all-except-auth")
+
+# ---------- PNG decoding (8-bit, non-interlaced: what Chromium emits) ----------
+def _paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    return a if pa <= pb and pa <= pc else b if pb <= pc else c
+
+def decode_png_gray(data: bytes):
+    """(width, height, rows of 0-255 luma) from PNG bytes."""
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("not a PNG")
+    pos, idat, width = 8, [], None
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        if kind == b"IHDR":
+            width, height, depth, ctype, _, _, interlace = struct.unpack(">IIBBBBB", chunk)
+            if depth != 8 or interlace or ctype not in (0, 2, 4, 6):
+                raise ValueError("unsupported PNG layout (need 8-bit, non-interlaced, gray/RGB[A])")
+            bpp = {0: 1, 2: 3, 4: 2, 6: 4}[ctype]
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+        pos += 12 + length
+    if width is None:
+        raise ValueError("PNG without IHDR")
+    raw = zlib.decompress(b"".join(idat))
+    stride = width * bpp
+    prev, rows = bytearray(stride), []
+    for y in range(height):
+        ftype, line = raw[y * (stride + 1)], bytearray(raw[y * (stride + 1) + 1:(y + 1) * (stride + 1)])
+        if ftype == 1:
+            for i in range(bpp, stride):
+                line[i] = (line[i] + line[i - bpp]) & 0xFF
+        elif ftype == 2:
+            for i in range(stride):
+                line[i] = (line[i] + prev[i]) & 0xFF
+        elif ftype == 3:
+            for i in range(stride):
+                line[i] = (line[i] + ((line[i - bpp] if i >= bpp else 0) + prev[i]) // 2) & 0xFF
+        elif ftype == 4:
+            for i in range(stride):
+                line[i] = (line[i] + _paeth(line[i - bpp] if i >= bpp else 0, prev[i],
+                                            prev[i - bpp] if i >= bpp else 0)) & 0xFF
+        prev = line
+        if bpp >= 3:
+            rows.append([(299 * line[i] + 587 * line[i + 1] + 114 * line[i + 2]) // 1000
+                         for i in range(0, stride, bpp)])
+        else:
+            rows.append(list(line[::bpp]))
+    return width, height, rows
+
+def dhash(width: int, height: int, rows) -> str:
+    """64-bit difference hash (9x8 box-averaged luma, left < right per row) as 16 hex chars."""
+    cells = []
+    for gy in range(8):
+        y0, y1 = gy * height // 8, max(gy * height // 8 + 1, (gy + 1) * height // 8)
+        band = rows[y0:y1]
+        line = []
+        for gx in range(9):
+            x0, x1 = gx * width // 9, max(gx * width // 9 + 1, (gx + 1) * width // 9)
+            line.append(sum(sum(r[x0:x1]) for r in band) / ((x1 - x0) * len(band)))
+        cells.append(line)
+    bits = 0
+    for line in cells:
+        for a, b in zip(line, line[1:]):
+            bits = (bits << 1) | (a < b)
+    return f"{bits:016x}"
+
+def hash_image(path: str):
+    """dHash of an image file: stdlib for PNG, PIL (optional) for anything else; None if impossible."""
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        with Image.open(path) as im:
+            small = im.convert("L").resize((HASH_WIDTH, max(8, HASH_WIDTH * im.height // im.width)))
+            px = list(small.getdata())
+            w, h = small.size
+            return dhash(w, h, [px[y * w:(y + 1) * w] for y in range(h)])
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(b"\x89PNG"):
+        return None
+    return dhash(*decode_png_gray(data))
+
+def _have_pil() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+# ---------- capture ----------
+class ShotWriter:
+    """Background thread: base64-decode, hash and write captures. close() returns {path: phash}."""
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = {}
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, path: str, b64: str, thumb_b64: str = None):
+        self.jobs.put((path, b64, thumb_b64))
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            path, b64, thumb = job
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(base64.b64decode(b64))
+                if thumb:
+                    self.results[path] = dhash(*decode_png_gray(base64.b64decode(thumb)))
+                else:  # full-size PNG in pure Python is slow; leave it to compare_tree unless PIL is there
+                    self.results[path] = hash_image(path) if _have_pil() else None
+            except Exception as e:
+                print(f"[WARN] screenshot write/hash failed for {path}: {e}")
+                self.results.setdefault(path, None)
+
+    def close(self) -> dict:
+        self.jobs.put(None)
+        self.thread.join()
+        return self.results
+
+def parse_clip(spec: str):
+    """'x,y,width,height' (CSS px) -> CDP clip dict without scale, or None."""
+    if not spec:
+        return None
+    x, y, w, h = (float(v) for v in spec.split(","))
+    return {"x": x, "y": y, "width": w, "height": h}
+
+def capture(cdp, writer: ShotWriter, path: str, fmt: str = "png", quality: int = None, clip=None, scale: float = 1.0):
+    """Two captureScreenshot calls (image + tiny hash PNG, pipelined); the rest happens on the writer thread."""
+    if clip is None:
+        vp = cdp.call("Page.getLayoutMetrics", {}).get("cssLayoutViewport", {})
+        clip = {"x": vp.get("pageX", 0), "y": vp.get("pageY", 0),
+                "width": vp.get("clientWidth", 1280), "height": vp.get("clientHeight", 720)}
+    params = {"format": fmt, "clip": dict(clip, scale=scale)}
+    if fmt != "png" and quality is not None:
+        params["quality"] = quality
+    thumb = {"format": "png", "clip": dict(clip, scale=HASH_WIDTH / max(1.0, clip["width"]))}
+    shot, small = cdp.batch([("Page.captureScreenshot", params), ("Page.captureScreenshot", thumb)])
+    writer.submit(path, shot["data"], small.get("data"))
+
+def screenshot_path(base_dir: str, domain: str, fmt: str = "png") -> str:
+    return os.path.join(base_dir, f"screenshot_after_{domain}.{EXT[fmt]}")
+
+# ---------- comparison ----------
+def collect(root: str):
+    """One record per import_meta_*.json that has a screenshot (hash from meta, else from the file)."""
+    out = []
+    for d, _, files in os.walk(root):
+        for fn in files:
+            if not (fn.startswith("import_meta_") and fn.endswith(".json")):
+                continue
+            with open(os.path.join(d, fn), "r", encoding="utf-8") as f:
+                meta = json.load(f).get("meta", {})
+            shot = meta.get("screenshot") or {}
+            path = shot.get("path")
+            if not path:
+                continue
+            if not os.path.exists(path):
+                path = os.path.join(d, os.path.basename(path))
+            phash = shot.get("phash") or (hash_image(path) if os.path.exists(path) else None)
+            out.append({"run_dir": d, "site": urlsplit(meta.get("url", "")).hostname or "",
+                        "browser": meta.get("browser", ""), "variant": meta.get("variant") or REFERENCE,
+                        "path": path, "phash": phash})
+    return out
+
+def cluster(records, threshold: int = THRESHOLD):
+    """Greedy clustering per site: join the first cluster whose seed is within threshold bits."""
+    seeds = {}
+    for r in sorted(records, key=lambda r: (r["site"], r["variant"] != REFERENCE, r["run_dir"])):
+        if not r["phash"]:
+            r["cluster"] = None
+            continue
+        site_seeds = seeds.setdefault(r["site"], [])
+        for i, s in enumerate(site_seeds):
+            if hamming(s, r["phash"]) <= threshold:
+                r["cluster"] = i
+                break
+        else:
+            r["cluster"] = len(site_seeds)
+            site_seeds.append(r["phash"])
+    return records
+
+def flag(records, reference: str = REFERENCE, consent_variants=CONSENT_VARIANTS):
+    """banner_reappeared: consent cookies were imported, but the page does not look like the reference."""
+    ref = {}
+    for r in records:
+        if r["variant"] == reference and r.get("cluster") is not None:
+            ref.setdefault((r["site"], r["browser"]), set()).add(r["cluster"])
+    for r in records:
+        expected = ref.get((r["site"], r["browser"]))
+        r["flag"] = ""
+        if r.get("cluster") is None:
+            r["flag"] = "no_hash"
+        elif expected and r["variant"] in consent_variants and r["cluster"] not in expected:
+            r["flag"] = "banner_reappeared"
+    return records
+
+def compare_tree(root: str, threshold: int = THRESHOLD, reference: str = REFERENCE, consent_variants=CONSENT_VARIANTS):
+    return flag(cluster(collect(root), threshold), reference, consent_variants)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cluster import screenshots by perceptual hash and flag cells where a banner reappeared",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("root", help="Run dir or matrix root (searched for import_meta_*.json)")
+    parser.add_argument("--threshold", type=int, default=THRESHOLD, help="Max differing hash bits within a cluster")
+    parser.add_argument("--reference", default=REFERENCE, help="Variant whose look is the expected state")
+    parser.add_argument("--consent-variants", nargs="+", default=list(CONSENT_VARIANTS),
+                        help="Variants that carry consent cookies (should look like the reference)")
+    parser.add_argument("--csv", default=None, help="Output table (default: <root>/screenshots.csv)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    records = compare_tree(args.root, args.threshold, args.reference, args.consent_variants)
+    if not records:
+        print(f"[ABORT] no screenshots recorded under {args.root}")
+        sys.exit(1)
+    records.sort(key=lambda r: (r["site"], r["variant"], r["browser"], r["run_dir"]))
+    path = args.csv or os.path.join(args.root, "screenshots.csv")
+    fields = ["site", "variant", "browser", "cluster", "flag", "phash", "path", "run_dir"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(records)
+    flagged = [r for r in records if r["flag"] == "banner_reappeared"]
+    for r in flagged:
+        print(f"[FLAG] {r['site']} / {r['variant']} / {r['browser']}: looks unlike '{args.reference}' -> {r['path']}")
+    print(f"[INFO] {len(records)} screenshot(s), {len({(r['site'], r['cluster']) for r in records})} cluster(s), "
+          f"{len(flagged)} flagged")
+    print(f"[ARTIFACT] Summary saved -> {path}")
+
+if __name__ == "__main__":
+    main()
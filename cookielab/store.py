@@ -0,0 +1,225 @@
+import argparse, hashlib, json, os, sqlite3, sys, time, zlib
+
+from cookielab import artifact
+from cookielab.jar import partition_id
+
+# Content-addressed, deduplicated store for extraction runs.
+#
+# Every cookie object and storage value is stored once, keyed by the sha256 of
+# its canonical JSON. A snapshot records only what changed against its parent
+# (cookies keyed by (name, domain, path[, CHIPS partition]), storage keyed by item name) plus the
+# run meta. Snapshots are chained per ref (the final domain); every
+# FULL_EVERY-th snapshot stores the complete key map so checkout never has to
+# walk a long chain. Other top-level payload keys (e.g. storageByOrigin) are
+# kept whole per snapshot as deduplicated objects. `checkout` rebuilds the
+# classic cookies_<domain>.json (or any other cookielab.artifact format).
+
+STORE_DB = "store.sqlite"
+SECTIONS = ("cookies", "localStorage", "sessionStorage")
+FULL_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (hash TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id TEXT PRIMARY KEY,
+    ref TEXT NOT NULL,
+    parent TEXT,
+    depth INTEGER NOT NULL,
+    created_at INTEGER NOT NULL,
+    meta TEXT NOT NULL,
+    delta BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_ref ON snapshots(ref, created_at);
+CREATE TABLE IF NOT EXISTS refs (name TEXT PRIMARY KEY, snapshot TEXT NOT NULL);
+"""
+
+def canonical(obj) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def cookie_key(c: dict) -> str:
+    """Cookie identity as in cookielab.jar; the partition only for CHIPS cookies, so older keys stay valid."""
+    key = [c.get("name"), c.get("domain"), c.get("path") or "/"]
+    partition = partition_id(c.get("partitionKey"))
+    if partition:
+        key.append(partition)
+    return canonical(key)
+
+class ArtifactStore:
+    def __init__(self, root: str):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.db = sqlite3.connect(os.path.join(root, STORE_DB), timeout=30)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ---------- objects ----------
+    def _put(self, obj) -> str:
+        raw = canonical(obj).encode("utf-8")
+        h = hashlib.sha256(raw).hexdigest()
+        self.db.execute("INSERT OR IGNORE INTO objects VALUES (?, ?)", (h, zlib.compress(raw)))
+        return h
+
+    def _get_many(self, hashes):
+        out, hashes = {}, list(set(hashes))
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            q = "SELECT hash, data FROM objects WHERE hash IN (%s)" % ",".join("?" * len(chunk))
+            for h, data in self.db.execute(q, chunk):
+                out[h] = json.loads(zlib.decompress(data).decode("utf-8"))
+        return out
+
+    # ---------- snapshots ----------
+    def _row(self, snap_id: str):
+        row = self.db.execute("SELECT ref, parent, depth, created_at, meta, delta FROM snapshots WHERE id=?",
+                              (snap_id,)).fetchone()
+        if not row:
+            raise KeyError(f"unknown snapshot: {snap_id}")
+        return row
+
+    def key_maps(self, snap_id: str):
+        """{section: {key: object hash}} for a snapshot, replaying deltas from the last full snapshot."""
+        chain = []
+        while snap_id:
+            ref, parent, depth, _, _, delta = self._row(snap_id)
+            chain.append(json.loads(zlib.decompress(delta).decode("utf-8")))
+            snap_id = parent if depth else None
+        maps = {s: {} for s in SECTIONS}
+        for delta in reversed(chain):
+            for s in SECTIONS:
+                d = delta.get(s) or {}
+                for k in d.get("del", ()):
+                    maps[s].pop(k, None)
+                maps[s].update(d.get("set", ()))
+                if "order" in d:
+                    maps[s] = {k: maps[s][k] for k in d["order"]}
+        return maps
+
+    def resolve(self, name: str) -> str:
+        """Snapshot id for a ref name, a full id or a unique id prefix."""
+        row = self.db.execute("SELECT snapshot FROM refs WHERE name=?", (name,)).fetchone()
+        if row:
+            return row[0]
+        rows = self.db.execute("SELECT id FROM snapshots WHERE id LIKE ?", (name + "%",)).fetchall()
+        if len(rows) != 1:
+            raise KeyError(f"no (unique) snapshot or ref: {name}")
+        return rows[0][0]
+
+    def commit(self, payload: dict, ref: str = None) -> str:
+        """Record an extraction payload as a snapshot on ref (default: meta.final_domain). Returns its id."""
+        meta = payload.get("meta") or {}
+        ref = ref or meta.get("final_domain") or "default"
+        row = self.db.execute("SELECT snapshot FROM refs WHERE name=?", (ref,)).fetchone()
+        parent = row[0] if row else None
+        parent_depth = self._row(parent)[2] if parent else -1
+        full = parent is None or parent_depth + 1 >= FULL_EVERY
+        old = self.key_maps(parent) if parent else {s: {} for s in SECTIONS}
+
+        delta = {}
+        with self.db:
+            for s in SECTIONS:
+                if s == "cookies":
+                    items = {cookie_key(c): self._put(c) for c in payload.get(s) or []}
+                else:
+                    items = {k: self._put(v) for k, v in (payload.get(s) or {}).items()}
+                # Pairs rather than a dict: canonical() sorts dict keys, and item order matters
+                if full:
+                    delta[s] = {"set": list(items.items())}
+                    continue
+                delta[s] = {"set": [(k, h) for k, h in items.items() if old[s].get(k) != h],
+                            "del": [k for k in old[s] if k not in items]}
+                # Replaying keeps surviving keys in parent order and appends new ones;
+                # only record the full order when the jar was actually reordered
+                replayed = [k for k in old[s] if k in items] + [k for k in items if k not in old[s]]
+                if replayed != list(items):
+                    delta[s]["order"] = list(items)
+            extras = {k: self._put(v) for k, v in payload.items() if k != "meta" and k not in SECTIONS}
+            if extras:
+                delta["extras"] = extras
+            body = canonical({"parent": parent, "meta": meta, "delta": delta})
+            snap_id = hashlib.sha256(body.encode("utf-8")).hexdigest()
+            self.db.execute("INSERT OR IGNORE INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (snap_id, ref, parent, 0 if full else parent_depth + 1, int(time.time()),
+                             canonical(meta), zlib.compress(canonical(delta).encode("utf-8"))))
+            self.db.execute("INSERT OR REPLACE INTO refs VALUES (?, ?)", (ref, snap_id))
+        return snap_id
+
+    def materialize(self, snap_id: str) -> dict:
+        """Full payload (same shape as cookies_<domain>.json) for a snapshot."""
+        row = self._row(snap_id)
+        meta = json.loads(row[4])
+        extras = json.loads(zlib.decompress(row[5]).decode("utf-8")).get("extras") or {}
+        maps = self.key_maps(snap_id)
+        objs = self._get_many([h for m in maps.values() for h in m.values()] + list(extras.values()))
+        payload = {
+            "meta": meta,
+            "cookies": [objs[h] for h in maps["cookies"].values()],
+            "localStorage": {k: objs[h] for k, h in maps["localStorage"].items()},
+            "sessionStorage": {k: objs[h] for k, h in maps["sessionStorage"].items()},
+        }
+        payload.update({k: objs[h] for k, h in extras.items()})
+        return payload
+
+    def checkout(self, name: str, out_dir: str, fmt: str = "json") -> str:
+        """Write cookies_<final_domain>.<fmt ext> for a ref/snapshot into out_dir; returns the path."""
+        payload = self.materialize(self.resolve(name))
+        domain = payload["meta"].get("final_domain") or name
+        return artifact.write(artifact.path_for(out_dir, f"cookies_{domain}", fmt), payload)
+
+    def log(self, ref: str):
+        """[(id, created_at, depth, meta)] newest first along a ref's chain."""
+        out, snap_id = [], self.resolve(ref)
+        while snap_id:
+            _, parent, depth, created_at, meta, _ = self._row(snap_id)
+            out.append((snap_id, created_at, depth, json.loads(meta)))
+            snap_id = parent
+        return out
+
+# ---------- CLI ----------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed cookie/storage snapshot store")
+    parser.add_argument("store", help="Store directory")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("add", help="Import existing cookies_<domain> artifacts (any format) as snapshots")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--ref", default=None, help="Ref name (default: meta.final_domain)")
+    p = sub.add_parser("checkout", help="Write cookies_<domain>.json for a ref or snapshot id")
+    p.add_argument("name")
+    p.add_argument("out_dir", nargs="?", default="output")
+    p.add_argument("--to", choices=sorted(artifact.FORMATS), default="json", help="Artifact format to write")
+    p = sub.add_parser("log", help="List snapshots of a ref")
+    p.add_argument("ref")
+    sub.add_parser("refs", help="List refs")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    st = ArtifactStore(args.store)
+    try:
+        if args.cmd == "add":
+            for fp in args.files:
+                payload = artifact.read(fp)
+                if not isinstance(payload, dict):
+                    print(f"[WARN] skipped (not an extraction payload): {fp}")
+                    continue
+                print(f"[INFO] {fp} -> {st.commit(payload, args.ref)[:12]}")
+        elif args.cmd == "checkout":
+            artifact.format_or_abort(args.to)
+            try:
+                print(f"[ARTIFACT] {st.checkout(args.name, args.out_dir, args.to)}")
+            except KeyError as e:
+                print(f"[ERROR] {e.args[0]}")
+                sys.exit(1)
+        elif args.cmd == "log":
+            for snap_id, created_at, depth, meta in st.log(args.ref):
+                when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created_at))
+                print(f"{snap_id[:12]}  {when}  depth={depth}  {meta.get('profile', '')} {meta.get('final_url', '')}")
+        elif args.cmd == "refs":
+            for name, snap_id in st.db.execute("SELECT name, snapshot FROM refs ORDER BY name"):
+                print(f"{name}\t{snap_id[:12]}")
+    finally:
+        st.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import json, os, queue, threading, time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from cookielab import settle
+
+# Cookie event timeline: every cookie the page sets while the extractor waits, in
+# order, instead of only the end-of-run Network.getAllCookies snapshot.
+#
+# Sources
+#   http  Set-Cookie headers from Network.responseReceivedExtraInfo, joined with the
+#         request URL / document / initiator from Network.requestWillBeSent
+#   js    document.cookie writes, reported by a setter wrapper injected with
+#         Page.addScriptToEvaluateOnNewDocument (frame URL + calling script URL)
+#
+# With the DevTools websocket transport (--cdp-transport ws) events arrive on the
+# reader thread; out-of-process iframes (most ad frames) are auto-attached so their
+# requests and scripts are recorded too. Over chromedriver (execute_cdp_cmd) there
+# is no event stream: Set-Cookie headers come from the performance log and JS writes
+# are buffered in the page and polled, so writes made right before a navigation are lost.
+#
+# The reader thread only files raw events into a bounded queue; parsing and JSON
+# encoding happen on a writer thread that writes one line per cookie to
+# cookie_timeline_<host>.ndjson next to the run's cookies_<host> artifact. Memory is
+# bounded by the queue and by the request-id -> URL map; overflow is counted
+# ("dropped") rather than buffered. Each start() rewrites the file, beginning with
+# a header line; meta.cookie_timeline of the artifact carries the same run id.
+#
+# Header: {"cookielab_timeline": 1, "run": id, "started_at": epoch s, "url"}
+# Line: {"t": epoch s, "source": "http"|"js", "action": "set"|"delete", "name", "value",
+#        "domain", "path", "expires", "url", "document", "initiator"[, "blocked": [reasons]]}
+
+BINDING = "__cookielabCookie"
+BUFFER = "__cookielabCookieLog"
+MAX_PENDING = 20000    # raw events waiting for the writer
+MAX_REQUESTS = 20000   # request ids remembered for URL/initiator lookup
+PAGE_BUFFER = 5000     # JS writes kept in the page between polls (chromedriver transport)
+POLL = 0.25
+VERSION = 1
+
+# Wraps the document.cookie setter; REPORT is the binding call or the in-page buffer
+HOOK_JS = r"""
+(() => {
+  const d = Object.getOwnPropertyDescriptor(Document.prototype, 'cookie');
+  if (!d || !d.set) return;
+  const report = (p) => { REPORT };
+  Object.defineProperty(Document.prototype, 'cookie', {
+    configurable: true, enumerable: d.enumerable, get: d.get,
+    set(v) {
+      try {
+        const caller = (new Error().stack || '').split('\n').slice(2).find(l => l.includes('http')) || '';
+        const m = caller.match(/(https?:\/\/[^\s()]+?)(?::\d+){0,2}\)?\s*$/);
+        report(JSON.stringify({t: Date.now() / 1000, line: String(v), url: location.href, script: m ? m[1] : null}));
+      } catch (e) {}
+      return d.set.call(this, v);
+    }
+  });
+})();
+"""
+BINDING_REPORT = f"const b = globalThis.{BINDING}; if (typeof b === 'function') b(p);"
+BUFFER_REPORT = (f"const q = globalThis.{BUFFER} || (globalThis.{BUFFER} = []); "
+                 f"if (q.length < {PAGE_BUFFER}) q.push(p);")
+DRAIN_JS = f"const q = globalThis.{BUFFER} || []; globalThis.{BUFFER} = []; return q;"
+
+def _expires(attrs: dict, now: float):
+    """Absolute expiry (epoch s) from Max-Age / Expires, or None for a session cookie."""
+    if "max-age" in attrs:
+        try:
+            return now + int(attrs["max-age"])
+        except ValueError:
+            pass
+    if "expires" in attrs:
+        try:
+            return parsedate_to_datetime(attrs["expires"].replace("-", " ")).timestamp()
+        except (TypeError, ValueError, IndexError):
+            pass
+    return None
+
+def parse_cookie_line(line: str, url: str, now: float) -> dict:
+    """One Set-Cookie / document.cookie string -> event fields (domain/path defaulted from url)."""
+    pair, *rest = line.split(";")
+    name, sep, value = pair.partition("=")
+    if not sep:
+        name, value = "", name
+    attrs = {}
+    for a in rest:
+        k, _, v = a.partition("=")
+        attrs[k.strip().lower()] = v.strip()
+    u = urlsplit(url or "")
+    domain = attrs.get("domain")
+    expires = _expires(attrs, now)
+    return {"action": "delete" if expires is not None and expires <= now else "set",
+            "name": name.strip(), "value": value.strip(),
+            "domain": "." + domain.lstrip(".").lower() if domain else (u.hostname or ""),
+            "path": attrs.get("path") or (u.path.rsplit("/", 1)[0] or "/"),
+            "expires": round(expires) if expires is not None else None}
+
+def _initiator(init: dict):
+    """URL of the script/document that caused a request, else the initiator type."""
+    if not init:
+        return None
+    if init.get("url"):
+        return init["url"]
+    for frame in ((init.get("stack") or {}).get("callFrames") or ()):
+        if frame.get("url"):
+            return frame["url"]
+    return init.get("type")
+
+class CookieTimeline:
+    """attach() once per browser connection; start()/stop() once per recorded page."""
+
+    def __init__(self, max_pending: int = MAX_PENDING, max_requests: int = MAX_REQUESTS):
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.max_requests = max_requests
+        self.requests = {}  # requestId -> (url, documentURL, initiator); insertion order = age
+        self.active = False
+        self.polling = False
+        self.driver = self.cdp = None
+        self.frames = {}  # sessionId -> targetId of auto-attached out-of-process iframes
+        self.dropped = 0
+        self._last_drain = 0.0
+        self._writer = None
+
+    # ---------- wiring ----------
+    def attach(self, cdp, driver):
+        """Install the document.cookie hook and subscribe to Set-Cookie events on this CDP transport."""
+        self.cdp, self.driver = cdp, driver
+        self.polling = not cdp.supports_events
+        if self.polling:
+            cdp.call("Page.addScriptToEvaluateOnNewDocument", {"source": HOOK_JS.replace("REPORT", BUFFER_REPORT)})
+            return self
+        self._subscribe()
+        cdp.batch(self._session_setup())
+        return self
+
+    def _subscribe(self, session_id: str = None):
+        for method, cb in (("Network.requestWillBeSent", self._on_request),
+                           ("Network.responseReceivedExtraInfo", self._on_extra_info),
+                           ("Runtime.bindingCalled", self._on_binding),
+                           ("Target.attachedToTarget", self._on_attached),
+                           ("Target.detachedFromTarget", self._on_detached)):
+            self.cdp.on(method, cb, session_id)
+
+    def _session_setup(self):
+        return [("Runtime.addBinding", {"name": BINDING}),
+                ("Page.addScriptToEvaluateOnNewDocument", {"source": HOOK_JS.replace("REPORT", BINDING_REPORT)}),
+                ("Target.setAutoAttach", {"autoAttach": True, "waitForDebuggerOnStart": True, "flatten": True})]
+
+    def _on_attached(self, params):
+        # Runs on the reader thread: fire and forget, waiting for replies here would deadlock
+        sid = params.get("sessionId")
+        kind = (params.get("targetInfo") or {}).get("type")
+        if kind == "iframe":
+            self.frames[sid] = (params.get("targetInfo") or {}).get("targetId")
+        if getattr(self.cdp, "session_id", None):  # session-scoped transport: child events need their own listeners
+            self._subscribe(sid)
+        cmds = [("Network.enable", {})] + (self._session_setup() if kind in ("iframe", "page") else [])
+        for method, p in cmds + [("Runtime.runIfWaitingForDebugger", {})]:
+            self.cdp.send(method, p, sid)
+
+    def _on_detached(self, params):
+        self.frames.pop(params.get("sessionId"), None)
+
+    def child_sessions(self):
+        """Sessions of the iframes attached so far (None when polling: nothing is attached)."""
+        return None if self.polling else list(self.frames)
+
+    # ---------- reader-thread callbacks (keep cheap) ----------
+    def _on_request(self, p):
+        reqs = self.requests
+        reqs[p.get("requestId")] = ((p.get("request") or {}).get("url"), p.get("documentURL"), p.get("initiator"))
+        if len(reqs) > self.max_requests:
+            reqs.pop(next(iter(reqs)), None)
+
+    def _on_extra_info(self, p):
+        if self.active:
+            self._put(("http", time.time(), p))
+
+    def _on_binding(self, p):
+        if self.active and p.get("name") == BINDING:
+            self._put(("js", None, p.get("payload")))
+
+    def _put(self, item):
+        try:
+            self.pending.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def feed(self, method: str, params: dict):
+        """Entry point for polled events (performance log)."""
+        if method == "Network.requestWillBeSent":
+            self._on_request(params)
+        elif method == "Network.responseReceivedExtraInfo":
+            self._on_extra_info(params)
+
+    # ---------- chromedriver transport: polling ----------
+    def pump(self, force: bool = False):
+        """Poll the performance log and the page's JS-write buffer (chromedriver transport only)."""
+        for method, params in settle.read_performance_log(self.driver):
+            self.feed(method, params)
+        self._drain_page(force)
+
+    def _drain_page(self, force: bool = False):
+        now = time.monotonic()
+        if not self.active or (not force and now - self._last_drain < POLL):
+            return
+        self._last_drain = now
+        try:
+            for payload in self.driver.execute_script(DRAIN_JS) or ():
+                self._put(("js", None, payload))
+        except Exception:
+            pass  # mid-navigation; the next poll catches up
+
+    def tee(self, source):
+        """Wrap a settle event source so the recorder sees the performance-log events settle drains."""
+        def read():
+            events = source()
+            for method, params in events:
+                self.feed(method, params)
+            self._drain_page()
+            return events
+        return read
+
+    def pump_for(self, seconds: float):
+        deadline = time.monotonic() + max(0, seconds)
+        while time.monotonic() < deadline:
+            self.pump()
+            time.sleep(min(POLL, max(0, deadline - time.monotonic())))
+
+    # ---------- recording ----------
+    def start(self, path: str, url: str = None):
+        """Write this page's events to path (replacing an earlier run's file) until stop()."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        header = {"cookielab_timeline": VERSION, "run": f"{os.getpid()}_{time.time_ns()}",
+                  "started_at": time.time(), "url": url}
+        self.stats = {"path": path, "run": header["run"], "events": 0, "http": 0, "js": 0, "deletes": 0}
+        self.dropped = 0
+        self._writer = threading.Thread(target=self._write_loop, args=(path, header), name="cookie-timeline",
+                                        daemon=True)
+        self._writer.start()
+        self.active = True
+
+    def stop(self) -> dict:
+        """Stop recording, flush the file and return {path, events, http, js, deletes, dropped}."""
+        if self._writer is None:
+            return {}
+        if self.polling:
+            self.pump(force=True)
+        self.active = False
+        self.pending.put(None)
+        self._writer.join()
+        self._writer = None
+        return dict(self.stats, dropped=self.dropped)
+
+    def _events(self, item):
+        kind, t, p = item
+        if kind == "http":
+            header = None
+            for k, v in (p.get("headers") or {}).items():
+                if k.lower() == "set-cookie":
+                    header = v
+                    break
+            if not header:
+                return
+            url, document, init = self.requests.get(p.get("requestId")) or (None, None, None)
+            blocked = {b.get("cookieLine"): b.get("blockedReasons") for b in p.get("blockedCookies") or ()}
+            for line in header.split("\n"):
+                if not line.strip():
+                    continue
+                ev = {"t": round(t, 3), "source": "http", **parse_cookie_line(line, url, t),
+                      "url": url, "document": document, "initiator": _initiator(init)}
+                if line in blocked:
+                    ev["blocked"] = blocked[line]
+                yield ev
+        else:
+            try:
+                js = json.loads(p)
+            except (TypeError, ValueError):
+                return
+            t = js.get("t") or time.time()
+            yield {"t": round(t, 3), "source": "js", **parse_cookie_line(js.get("line", ""), js.get("url"), t),
+                   "url": js.get("url"), "document": js.get("url"), "initiator": js.get("script")}
+
+    def _write_loop(self, path: str, header: dict):
+        stats, dumps = self.stats, json.dumps
+        last_flush = time.monotonic()
+        with open(path, "w", encoding="utf-8", buffering=1 << 16) as f:
+            f.write(dumps(header, ensure_ascii=False, separators=(",", ":")) + "\n")
+            while True:
+                try:
+                    item = self.pending.get(timeout=POLL)
+                except queue.Empty:
+                    f.flush()
+                    last_flush = time.monotonic()
+                    continue
+                if item is None:
+                    return
+                try:
+                    for ev in self._events(item):
+                        f.write(dumps(ev, ensure_ascii=False, separators=(",", ":")) + "\n")
+                        stats["events"] += 1
+                        stats[ev["source"]] += 1
+                        stats["deletes"] += ev["action"] == "delete"
+                except Exception as e:
+                    print(f"[WARN] cookie timeline: skipped an event ({e})")
+                if time.monotonic() - last_flush >= 1:  # readable while the page is still running
+                    f.flush()
+                    last_flush = time.monotonic()
+
+def timeline_path(base_dir: str, url: str) -> str:
+    return os.path.join(base_dir, f"cookie_timeline_{urlsplit(url).hostname or 'page'}.ndjson")
+
+def read_header(path: str) -> dict:
+    """The run header of a cookie_timeline_*.ndjson file ({} for files written before headers)."""
+    with open(path, "r", encoding="utf-8") as f:
+        first = json.loads(f.readline() or "{}")
+    return first if "cookielab_timeline" in first else {}
+
+def read_timeline(path: str):
+    """Yield the events of a cookie_timeline_*.ndjson file (the header is skipped)."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                ev = json.loads(line)
+                if "cookielab_timeline" not in ev:
+                    yield ev
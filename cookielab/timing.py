@@ -0,0 +1,54 @@
+import json, os, threading, time
+from contextlib import contextmanager
+
+# Lightweight phase timer. Spans go into meta.timings (seconds per phase, summed
+# when a phase repeats) and, with --trace, into a chrome://tracing / Perfetto
+# compatible JSON file ("X" complete events, microseconds).
+
+class Timer:
+    def __init__(self, process_name: str = "cookielab"):
+        self.process_name = process_name
+        self.t0 = self.started = time.perf_counter()
+        self.epoch_us = time.time() * 1e6
+        self.events = []
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            ev = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                  "ts": (start - self.t0) * 1e6, "dur": (end - start) * 1e6}
+            if args:
+                ev["args"] = args
+            with self._lock:
+                self.events.append(ev)
+                self.totals[name] = self.totals.get(name, 0.0) + (end - start)
+
+    def child(self):
+        """Timer with its own totals (e.g. one site of a batch) that still adds spans to this trace."""
+        c = Timer.__new__(Timer)
+        c.__dict__.update(self.__dict__)
+        c.totals, c.started = {}, time.perf_counter()
+        return c
+
+    def timings(self) -> dict:
+        """{phase: seconds} rounded to the millisecond, plus the total since the timer started."""
+        with self._lock:
+            out = {k: round(v, 3) for k, v in self.totals.items()}
+        out["total"] = round(time.perf_counter() - self.started, 3)
+        return out
+
+    def write_trace(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            events = list(self.events)
+        meta = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": self.process_name}}]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms",
+                       "otherData": {"started_at_us": self.epoch_us}}, f)
+        return path
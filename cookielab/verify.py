@@ -0,0 +1,168 @@
+import argparse, csv, json, os, sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from cookielab import artifact
+from cookielab.jar import CookieJar
+
+# Post-import verification: what the importer tried to set (cookies_<domain>.*)
+# vs what the browser holds afterwards (cookies_after_<domain>.*), in any
+# cookielab.artifact format.
+#
+# Both jars are CookieJars indexed by (name, domain, path, partition), so one run is a linear pass.
+# Every cookie is classified as
+#   applied            present with the same value and attributes
+#   value_changed      present, value differs (site or browser rewrote it)
+#   attribute_changed  same value, but secure/httpOnly/sameSite/expiry differ
+#   dropped            never made it (reason "expired" when it was already past its expiry)
+#   extra              in the browser but not in the input (set by the page after load)
+#
+#   python -m cookielab.verify runs/m1 --workers 8      # every run dir below runs/m1
+#   python -m cookielab.verify output                   # a single run dir
+
+CLASSES = ("applied", "value_changed", "attribute_changed", "dropped", "extra")
+ATTRS = ("secure", "httpOnly", "sameSite", "expiry")
+EXPIRY_SLACK = 1  # seconds; CDP reports fractional expiries, artifacts store ints
+
+def _entry(c) -> dict:
+    entry = {"name": c.name, "domain": c.domain, "path": c.path}
+    if c.partition_key:
+        entry["partitionKey"] = c.partition_key
+    return entry
+
+def diff_jars(before, after, imported_at: float = None) -> dict:
+    """
+    Classify cookies (cookie lists in artifact or CDP shape, or CookieJars); returns
+    {"counts": {...}, "cookies": {class: [compact entries]}} ('applied' is only counted).
+    """
+    want = before if isinstance(before, CookieJar) else CookieJar.from_json(before)
+    have = after if isinstance(after, CookieJar) else CookieJar.from_json(after)
+    out = {k: [] for k in CLASSES if k != "applied"}
+    applied = 0
+    for c in want:
+        entry = _entry(c)
+        got = have.get(c.name, c.domain, c.path, c.partition_key)
+        if got is None:
+            if imported_at and c.expiry is not None and c.expiry <= imported_at:
+                entry["reason"] = "expired"
+            out["dropped"].append(entry)
+            continue
+        if got.value != c.value:
+            out["value_changed"].append(entry)
+            continue
+        changed = {k: [c.get(k), got.get(k)] for k in ATTRS if c.get(k) != got.get(k) and not (
+            k == "expiry" and c.expiry is not None and got.expiry is not None
+            and abs(c.expiry - got.expiry) <= EXPIRY_SLACK)}
+        if changed:
+            entry["changed"] = changed
+            out["attribute_changed"].append(entry)
+        else:
+            applied += 1
+    out["extra"] = [_entry(c) for c in have if c.key not in want]
+    counts = {"applied": applied, **{k: len(v) for k, v in out.items()}}
+    return {"counts": counts, "cookies": out}
+
+def _cookies(payload):
+    return payload.get("cookies", []) if isinstance(payload, dict) else payload
+
+def _is_after(fn: str) -> bool:
+    return fn.startswith("cookies_after_") and artifact.split_name(fn)[0] is not None
+
+def run_pairs(run_dir: str):
+    """(domain, input path, after path, imported_at) for every cookies_after_<domain>.* in run_dir."""
+    # One pair per domain even when a converted copy sits next to the original
+    domains = {artifact.split_name(fn)[0][len("cookies_after_"):] for fn in os.listdir(run_dir) if _is_after(fn)}
+    for domain in sorted(domains):
+        after = artifact.find(run_dir, f"cookies_after_{domain}")
+        src = artifact.find(run_dir, f"cookies_{domain}") or os.path.join(run_dir, f"cookies_{domain}.json")
+        imported_at = os.path.getmtime(after)
+        meta_path = os.path.join(run_dir, f"import_meta_{domain}.json")
+        if os.path.exists(meta_path):  # the importer may have auto-selected another artifact
+            meta = artifact.read(meta_path).get("meta", {})
+            src, imported_at = meta.get("cookie_file") or src, meta.get("imported_at") or imported_at
+            if not os.path.exists(src):  # older runs recorded it relative to the importer's working dir
+                # --contexts runs verify in <run>/ctxNN/ while the jar sits in <run>/
+                src = next((p for p in (os.path.join(d, os.path.basename(src))
+                                        for d in (run_dir, os.path.dirname(os.path.abspath(run_dir))))
+                            if os.path.exists(p)), src)
+        yield domain, src, after, imported_at
+
+def write_report(run_dir: str, domain: str, report: dict):
+    # Compact on purpose: unindented dumps stays on the C encoder (bulk mode writes thousands)
+    with open(os.path.join(run_dir, f"verify_{domain}.json"), "w", encoding="utf-8") as f:
+        f.write(json.dumps(report, ensure_ascii=False))
+
+def verify_run(run_dir: str, write: bool = True):
+    """Verify every import in a run dir; writes verify_<domain>.json next to it. Returns [(domain, report)]."""
+    results = []
+    for domain, src, after_path, imported_at in run_pairs(run_dir):
+        try:
+            before = artifact.read(src)
+        except (OSError, ValueError) as e:
+            results.append((domain, {"error": f"input jar unreadable: {e}"}))
+            continue
+        meta = before.get("meta", {}) if isinstance(before, dict) else {}
+        report = diff_jars(_cookies(before), _cookies(artifact.read(after_path)), imported_at)
+        report["meta"] = {"domain": domain, "input": src, "after": after_path,
+                          "filter": (meta.get("filter") or {}).get("ruleset")}
+        if write:
+            write_report(run_dir, domain, report)
+        results.append((domain, report))
+    return results
+
+def _verify_job(run_dir):
+    return run_dir, verify_run(run_dir)
+
+def find_run_dirs(root: str):
+    for d, _, files in os.walk(root):
+        if any(_is_after(fn) for fn in files):
+            yield d
+
+def verify_tree(root: str, workers: int = None):
+    dirs = sorted(find_run_dirs(root))
+    if workers == 1 or len(dirs) <= 1:
+        return [_verify_job(d) for d in dirs]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_verify_job, dirs, chunksize=max(1, len(dirs) // ((workers or os.cpu_count() or 1) * 4))))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Diff imported cookie jars against cookies_after_* (single run dir or a whole tree)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("root", help="Run dir, or a root searched recursively for run dirs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--csv", default=None, help="Per-run counts table (default: <root>/verify_summary.csv)")
+    parser.add_argument("--top", type=int, default=10, help="Most frequently dropped/changed cookies to list")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = verify_tree(args.root, args.workers)
+    totals, lost = Counter(), Counter()
+    rows = []
+    for run_dir, reports in results:
+        for domain, rep in reports:
+            if "error" in rep:
+                print(f"[WARN] {run_dir}: {rep['error']}")
+                continue
+            totals.update(rep["counts"])
+            for cls in ("dropped", "value_changed", "attribute_changed"):
+                lost.update((cls, e["name"], e["domain"]) for e in rep["cookies"][cls])
+            rows.append({"run_dir": os.path.relpath(run_dir, args.root), "domain": domain,
+                         "variant": rep["meta"]["filter"] or "", **rep["counts"]})
+    if not rows:
+        print(f"[ABORT] no cookies_after_* artifacts under {args.root}")
+        sys.exit(1)
+    path = args.csv or os.path.join(args.root, "verify_summary.csv")
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["run_dir", "domain", "variant", *CLASSES])
+        w.writeheader()
+        w.writerows(rows)
+    print(f"[INFO] {len(rows)} import(s): " + ", ".join(f"{k}={totals[k]}" for k in CLASSES))
+    for (cls, name, domain), n in lost.most_common(args.top):
+        print(f"[INFO]   {n:>6}x {cls:<18} {name} ({domain})")
+    print(f"[ARTIFACT] Summary saved -> {path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
-import json, os, sys, time, argparse
+import os, sys, time, argparse, queue, threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlsplit
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.edge.options import Options as EdgeOptions
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+# Make the shared cookielab package importable when run as a plain script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cookielab import artifact, cdp as cdp_transport, contexts, daemon, profiles, settle, store, timeline, timing
+from cookielab.jar import Cookie
+from cookielab.psl import etld1
 
 CDP_BROWSERS = {"chrome", "edge", "brave", "chromium"}
 
@@ -11,32 +14,25 @@ def host_from_url(url: str) -> str:
     host = urlsplit(url).netloc
     return host.split(":")[0]
 
-def normalize_from_cdp(cookie):
-    return {
-        "name": cookie.get("name"),
-        "value": cookie.get("value"),
-        "domain": cookie.get("domain"),
-        "path": cookie.get("path", "/"),
-        "secure": cookie.get("secure", False),
-        "httpOnly": cookie.get("httpOnly", False),
-        "sameSite": cookie.get("sameSite"),
-        "expiry": int(cookie["expires"]) if cookie.get("expires") else None,
-    }
+def origin_of(url: str) -> str:
+    return "{0.scheme}://{0.netloc}".format(urlsplit(url))
 
-def compute_profile_dir(profile_name: str, browser: str) -> str:
-    legacy = os.path.abspath(f"profiles/{profile_name}")
-    scoped = os.path.abspath(f"profiles/{browser}_{profile_name}")
-    return legacy if os.path.exists(legacy) else scoped
+def normalize_from_cdp(cookie):
+    return Cookie.from_cdp(cookie).to_json()
 
-def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool):
+def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool, perf_log: bool = False):
+    # selenium is imported here (not at module level) so offline commands start fast
+    from selenium import webdriver
     os.makedirs(profile_dir, exist_ok=True)
     if browser in {"chrome", "brave", "chromium"}:
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
         opts = ChromeOptions()
         opts.add_argument(f"--user-data-dir={profile_dir}")
         opts.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
         opts.add_argument("--log-level=3")
         if headless: opts.add_argument("--headless=new")
         if detach: opts.add_experimental_option("detach", True)
+        if perf_log: opts.set_capability(settle.PERF_LOG_CAP, settle.PERF_LOG_PREFS)
         # Brave binary hint
         if browser == "brave":
             for p in [
@@ -49,13 +45,16 @@ def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool):
         return webdriver.Chrome(options=opts)
 
     if browser == "edge":
+        from selenium.webdriver.edge.options import Options as EdgeOptions
         opts = EdgeOptions()
         opts.add_argument(f"--user-data-dir={profile_dir}")
         opts.add_argument("--log-level=3")
         if headless: opts.add_argument("--headless=new")
+        if perf_log: opts.set_capability(settle.EDGE_PERF_LOG_CAP, settle.PERF_LOG_PREFS)
         return webdriver.Edge(options=opts)
 
     if browser == "firefox":
+        from selenium.webdriver.firefox.options import Options as FirefoxOptions
         opts = FirefoxOptions()
         if headless: opts.add_argument("-headless")
         return webdriver.Firefox(options=opts)
@@ -92,96 +91,542 @@ def get_storage(driver, storage_type: str):
         print(f"[WARN] {storage_type} read exception: {e}")
         return {}
 
-def parse_args():
+def frame_origins(frame_tree: dict):
+    """Distinct security origins of every frame in a Page.getFrameTree result (opaque origins skipped)."""
+    out, stack = [], [frame_tree.get("frameTree") or {}]
+    while stack:
+        node = stack.pop()
+        origin = (node.get("frame") or {}).get("securityOrigin") or ""
+        if origin.startswith("http") and origin not in out:
+            out.append(origin)
+        stack.extend(reversed(node.get("childFrames") or []))
+    return out
+
+AUTO_ATTACH = {"autoAttach": True, "waitForDebuggerOnStart": False, "flatten": True}
+
+def child_frame_sessions(cdp, known=None):
+    """
+    Flattened session ids of the page's out-of-process iframes (cross-site frames live in
+    their own renderer and are invisible to the page session's frame tree). Auto-attach is
+    applied to every child in turn so nested OOPIFs are found too. `known`: sessions a
+    cookie timeline recorder already auto-attached (Chromium does not report those twice).
+    Empty on transports without events (chromedriver's execute_cdp_cmd).
+    """
+    if not cdp.supports_events:
+        return []
+    if known is not None:
+        return list(known)
+    found, scoped = [], getattr(cdp, "session_id", None)
+
+    def on_attached(params):
+        if (params.get("targetInfo") or {}).get("type") == "iframe":
+            found.append(params["sessionId"])
+
+    subs = [None]
+    cdp.on("Target.attachedToTarget", on_attached)
+    try:
+        # attachedToTarget events for existing frames arrive before the command's reply
+        cdp.call("Target.setAutoAttach", AUTO_ATTACH)
+        done = 0
+        while done < len(found):
+            sid = found[done]
+            done += 1
+            if scoped:  # session-scoped transport: the child's own events need their own listener
+                cdp.on("Target.attachedToTarget", on_attached, sid)
+                subs.append(sid)
+            cdp.call("Target.setAutoAttach", AUTO_ATTACH, session_id=sid)
+    except Exception as e:
+        print("[WARN] out-of-process iframes not attached:", e)
+    finally:
+        for sid in subs:
+            cdp.off("Target.attachedToTarget", on_attached, sid)
+    return found
+
+def get_storage_all_origins(cdp, sessions=None):
+    """
+    CDP-only: localStorage / sessionStorage of every frame origin in one pass -- the page's
+    own frames plus, on event-capable transports, out-of-process iframes through their
+    flattened sessions (see child_frame_sessions; `sessions` is passed through as `known`).
+    Returns {origin: {"localStorage": {...}, "sessionStorage": {...}}}.
+    """
+    try:
+        frames = {None: frame_origins(cdp.call("Page.getFrameTree", {}))}
+        cdp.call("DOMStorage.enable", {})
+    except Exception as e:
+        print("[WARN] frame tree / DOMStorage unavailable:", e)
+        return {}
+    for sid in child_frame_sessions(cdp, sessions):
+        try:
+            frames[sid] = frame_origins(cdp.call("Page.getFrameTree", {}, session_id=sid))
+            cdp.call("DOMStorage.enable", {}, session_id=sid)
+        except Exception as e:  # the frame navigated away or was removed meanwhile
+            print(f"[WARN] iframe session {sid} skipped: {e}")
+    reqs = [(sid, o, t) for sid, origins in frames.items() for o in origins for t in ("localStorage", "sessionStorage")]
+    futs = [cdp.send("DOMStorage.getDOMStorageItems",
+                     {"storageId": {"securityOrigin": o, "isLocalStorage": t == "localStorage"}}, sid)
+            for sid, o, t in reqs]
+    out = {o: {"localStorage": {}, "sessionStorage": {}} for origins in frames.values() for o in origins}
+    for (sid, o, t), fut in zip(reqs, futs):
+        try:
+            out[o][t].update(fut.result(30).get("entries", []))
+        except Exception as e:
+            print(f"[WARN] {t} read failed for {o}: {e}")
+    return out
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Cookie Extractor (Selenium or CDP, multi-browser)",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
-    parser.add_argument("url", help="Target URL (e.g., https://example.com/)")
+    parser.add_argument("url", help="Target URL (e.g., https://example.com/), or with --batch a file of URLs ('-' for stdin)")
     parser.add_argument("profile_name", help="Profile name (stored under profiles/)")
     parser.add_argument("--browser", choices=["chrome","edge","brave","chromium","firefox"], default="chrome")
     parser.add_argument("--wait", type=int, default=5, help="Seconds to wait after page load")
     parser.add_argument("--detach", action="store_true", help="Keep the browser window open after execution")
+    parser.add_argument("--attach", action="store_true",
+                        help="Attach to the warm browser daemon of this profile (python -m cookielab.daemon start ...) "
+                             "instead of launching one")
+    parser.add_argument("--profile-template", default=None,
+                        help="Run in a throwaway clone of this profile template (python -m cookielab.profiles init ...) "
+                             "instead of profiles/<profile_name>; the clone is removed afterwards")
     parser.add_argument("--mode", choices=["selenium", "cdp"], default="cdp",
                         help="Selenium API (no HttpOnly) or CDP (HttpOnly supported)")
     parser.add_argument("--run-dir", default=None, help="Directory to save outputs (e.g., runs/...)")
     parser.add_argument("--with-storage", action="store_true",
                         help="Also dump localStorage & sessionStorage for the final origin")
-    return parser.parse_args()
+    parser.add_argument("--storage-scope", choices=["final", "all"], default="final",
+                        help="With --with-storage in CDP mode, 'all' also captures every iframe origin "
+                             "(written to storageByOrigin)")
+    parser.add_argument("--cdp-transport", choices=["selenium", "ws"], default="selenium",
+                        help="How CDP commands are sent: chromedriver (execute_cdp_cmd) or the DevTools websocket directly")
+    parser.add_argument("--settle", action="store_true",
+                        help="Stop waiting once the network is idle (--wait becomes the upper bound). "
+                             "Leave off when you need the wait window to interact with the page")
+    parser.add_argument("--quiet-ms", type=int, default=500, help="Network quiet window for --settle")
+    parser.add_argument("--cookie-timeline", action="store_true",
+                        help="CDP mode: record every Set-Cookie header and document.cookie write during the wait "
+                             "to cookie_timeline_<host>.ndjson (best with --cdp-transport ws)")
+    parser.add_argument("--store", default=None,
+                        help="Record a deduplicated snapshot in this store instead of writing cookies_<domain>.json "
+                             "(materialize with: python -m cookielab.store <store> checkout <domain> <dir>)")
+    parser.add_argument("--artifact-format", choices=sorted(artifact.FORMATS), default="json",
+                        help="cookies_<domain> file format: json, or compact NDJSON (ndjson, gz, zst; "
+                             "zst needs the zstandard package)")
+    parser.add_argument("--trace", action="store_true",
+                        help="Write a chrome://tracing compatible trace_extract_*.json of all phases into --run-dir")
+    parser.add_argument("--batch", action="store_true",
+                        help="Treat url as a list of URLs (one per line) and extract them over a browser pool")
+    parser.add_argument("--workers", type=int, default=2, help="Number of long-lived browsers in --batch mode")
+    parser.add_argument("--contexts", action="store_true",
+                        help="With --batch (CDP): one browser, every URL in its own fresh browser context, "
+                             "--workers contexts at a time")
+    return parser.parse_args(argv)
 
-def main():
-    if os.getenv("COOKIE_LAB_TESTMODE") != "1":
-        print("[ABORT] TESTMODE not set. Set COOKIE_LAB_TESTMODE=1 to run in test environment.")
-        sys.exit(1)
+def read_url_list(path: str):
+    """Read URLs one per line from a file or stdin ('-'); blank lines and # comments are skipped."""
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        return [ln.strip() for ln in f if ln.strip() and not ln.strip().startswith("#")]
+    finally:
+        if f is not sys.stdin:
+            f.close()
 
-    args = parse_args()
-    url = args.url
-    headless = os.getenv("HEADLESS") == "1"
+def profile_dir_for(args, profile_name: str, label: str = "") -> str:
+    """Persistent profile dir, or a fresh clone of --profile-template."""
+    if args.profile_template:
+        return profiles.clone_for_run(args.profile_template, args.browser, label)
+    return profiles.compute_profile_dir(profile_name, args.browser)
 
-    # Firefox CDP fallback
-    if args.mode == "cdp" and args.browser not in CDP_BROWSERS:
-        print("[WARN] CDP is not supported on this browser. Falling back to Selenium mode.")
-        args.mode = "selenium"
+def launch_or_attach(args, profile_name: str, profile_dir: str, headless: bool, detach: bool, abort: bool = True):
+    """
+    Cold-start a browser, or with --attach reuse the running daemon for this profile.
+    A missing daemon aborts the run, or raises RuntimeError with abort=False (batch worker threads).
+    """
+    # The performance log feeds --settle, and --cookie-timeline when there is no websocket event stream
+    perf_log = use_cdp(args) and (args.settle or (args.cookie_timeline and args.cdp_transport != "ws"))
+    if args.attach:
+        attach = daemon.attach_or_abort if abort else daemon.attach
+        return attach(profile_name, args.browser, perf_log=perf_log)
+    return make_driver(args.browser, profile_dir, headless=headless, detach=detach, perf_log=perf_log)
 
-    profile_dir = compute_profile_dir(args.profile_name, args.browser)
-    print("[INFO] Launching", args.browser, "...")
-    driver = make_driver(args.browser, profile_dir, headless=headless, detach=args.detach)
+def use_cdp(args) -> bool:
+    return args.mode == "cdp" and args.browser in CDP_BROWSERS
 
+def open_cdp(driver, args):
+    """CDP transport for this driver with Network (and settle events) enabled, or None in Selenium mode."""
+    if not use_cdp(args):
+        return None
+    cdp = cdp_transport.connect(driver, args.cdp_transport)
+    cdp.call("Network.enable", {})
+    if args.settle:
+        settle.enable_events(cdp)
+    return cdp
+
+def open_timeline(driver, args, cdp):
+    """Cookie event recorder attached to this browser (CDP mode with --cookie-timeline), else None."""
+    if not (args.cookie_timeline and cdp):
+        return None
     try:
-        if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-            driver.execute_cdp_cmd("Network.enable", {})
+        rec = timeline.CookieTimeline().attach(cdp, driver)
+    except Exception as e:
+        print("[WARN] cookie timeline unavailable:", e)
+        return None
+    if rec.polling:
+        print("[INFO] Cookie timeline via performance log + page polling (use --cdp-transport ws for iframes)")
+    return rec
 
-        print(f"[INFO] Accessing {url} ...")
-        driver.get(url)
-        time.sleep(args.wait)
+def wait_page(driver, args, cdp=None, recorder=None):
+    """Fixed sleep of --wait seconds, or with --settle return as soon as the page goes idle."""
+    polling = recorder is not None and recorder.polling
+    if not args.settle:
+        if polling:
+            recorder.pump_for(args.wait)
+        else:
+            time.sleep(max(0, args.wait))
+        return
+    events = settle.event_source(driver, cdp) if cdp else None
+    if polling:  # both read the performance log; the recorder taps what settle drains
+        events = recorder.tee(events)
+    reason, elapsed = settle.wait_for_settle(driver, args.wait, quiet=args.quiet_ms / 1000, cdp=use_cdp(args),
+                                             events=events)
+    print(f"[INFO] Page settled ({reason}) after {elapsed:.2f}s")
 
-        final_url = driver.current_url
-        domain = host_from_url(final_url)
+def extract_one(driver, url: str, args, cdp=None, timer=None, recorder=None) -> str:
+    """
+    Navigate to url with an already running driver and write the cookies_<domain> artifact
+    (or a snapshot with --store). Returns the file path / snapshot id.
+    Phase durations up to the write go into meta.timings.
+    """
+    timer = timer or timing.Timer("extract")
+    if use_cdp(args) and cdp is None:
+        cdp = cdp_transport.SeleniumCDP(driver)
+    print(f"[INFO] Accessing {url} ...")
+    out_base = args.run_dir or "output"
+    os.makedirs(out_base, exist_ok=True)
+    if args.settle:
+        settle.discard_events(driver, cdp)
+    if recorder:
+        recorder.start(timeline.timeline_path(out_base, url), url)
+    try:
+        with timer.span("navigation", url=url):
+            driver.get(url)
+        with timer.span("settle_wait" if args.settle else "wait"):
+            wait_page(driver, args, cdp, recorder)
+    finally:
+        recorded = recorder.stop() if recorder else None
+    if recorded:
+        # Named after the page the run ended on, like the cookies_<domain> artifact it belongs to
+        final_path = timeline.timeline_path(out_base, driver.current_url)
+        if final_path != recorded["path"]:
+            os.replace(recorded["path"], final_path)
+            recorded["path"] = final_path
+        print(f"[ARTIFACT] Cookie timeline ({recorded['events']} event(s), {recorded['dropped']} dropped) "
+              f"-> {recorded['path']}")
+
+    final_url = driver.current_url
+    domain = host_from_url(final_url)
 
-        out_base = args.run_dir or "output"
-        os.makedirs(out_base, exist_ok=True)
-        cookie_file = os.path.join(out_base, f"cookies_{domain}.json")
+    cookie_file = artifact.path_for(out_base, f"cookies_{domain}", args.artifact_format)
 
-        # Cookies
+    # Cookies
+    with timer.span("cookie_read"):
         if args.mode == "cdp" and args.browser in CDP_BROWSERS:
             print("[INFO] Retrieving cookies via CDP (includes HttpOnly)...")
-            all_cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+            all_cookies = cdp.call("Network.getAllCookies", {})["cookies"]
             cookies = [normalize_from_cdp(c) for c in all_cookies]
         else:
             print("[INFO] Retrieving cookies via Selenium (no HttpOnly)...")
             cookies = driver.get_cookies()
 
-        # Storage (optional)
-        local_storage, session_storage = {}, {}
-        if args.with_storage:
-            print("[INFO] Reading localStorage / sessionStorage for", domain, "...")
-            local_storage = get_storage(driver, "localStorage")
-            session_storage = get_storage(driver, "sessionStorage")
-            print(f"[INFO] Storage now: localStorage={len(local_storage)}, sessionStorage={len(session_storage)}")
-
-        payload = {
-            "meta": {
-                "browser": args.browser,
-                "profile": args.profile_name,
-                "mode": args.mode,
-                "extracted_at": int(time.time()),
-                "requested_url": url,
-                "final_url": final_url,
-                "final_domain": domain
-            },
-            "cookies": cookies,
-            "localStorage": local_storage,
-            "sessionStorage": session_storage
-        }
+    # Storage (optional)
+    with timer.span("storage_read"):
+        local_storage, session_storage, by_origin = read_storage(driver, args, cdp, final_url, domain,
+                                                                   recorder.child_sessions() if recorder else None)
 
-        with open(cookie_file, "w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2, ensure_ascii=False)
+    payload = {
+        "meta": {
+            "browser": args.browser,
+            "profile": args.profile_name,
+            "mode": args.mode,
+            "extracted_at": int(time.time()),
+            "requested_url": url,
+            "final_url": final_url,
+            "final_domain": domain,
+            "final_etld1": etld1(domain),
+            "timings": timer.timings()
+        },
+        "cookies": cookies,
+        "localStorage": local_storage,
+        "sessionStorage": session_storage
+    }
+    if by_origin is not None:
+        payload["storageByOrigin"] = by_origin
+    if recorded:
+        payload["meta"]["cookie_timeline"] = recorded
 
-        print(f"[COMPLETED] Saved -> {cookie_file}")
+    with timer.span("cookie_write"):
+        if args.store:
+            st = store.ArtifactStore(args.store)
+            try:
+                snap_id = st.commit(payload)
+            finally:
+                st.close()
+            print(f"[COMPLETED] Stored snapshot {snap_id[:12]} (ref {domain}) -> {args.store}")
+            return snap_id
 
+        artifact.write(cookie_file, payload)
+
+    print(f"[COMPLETED] Saved -> {cookie_file}")
+    return cookie_file
+
+def read_storage(driver, args, cdp, final_url: str, domain: str, sessions=None):
+    """(localStorage, sessionStorage, storageByOrigin or None) according to --with-storage / --storage-scope."""
+    local_storage, session_storage, by_origin = {}, {}, None
+    if args.with_storage and args.storage_scope == "all" and use_cdp(args):
+        print("[INFO] Reading DOM storage of all frame origins via CDP ...")
+        by_origin = get_storage_all_origins(cdp, sessions)
+        final_origin = origin_of(final_url)
+        top = by_origin.get(final_origin) or {}
+        local_storage, session_storage = top.get("localStorage", {}), top.get("sessionStorage", {})
+        print(f"[INFO] Storage now: {len(by_origin)} origin(s), "
+              f"{sum(len(v['localStorage']) + len(v['sessionStorage']) for v in by_origin.values())} item(s)")
+    elif args.with_storage:
+        print("[INFO] Reading localStorage / sessionStorage for", domain, "...")
+        local_storage = get_storage(driver, "localStorage")
+        session_storage = get_storage(driver, "sessionStorage")
+        print(f"[INFO] Storage now: localStorage={len(local_storage)}, sessionStorage={len(session_storage)}")
+    return local_storage, session_storage, by_origin
+
+def visited_origins(cdp, sessions=None):
+    """Origins the tab may have written storage on: its navigation history and every frame now open."""
+    origins = {origin_of(e.get("url", "")) for e in cdp.call("Page.getNavigationHistory", {}).get("entries", [])}
+    for sid in [None] + child_frame_sessions(cdp, sessions):
+        try:
+            origins.update(frame_origins(cdp.call("Page.getFrameTree", {}, session_id=sid)))
+        except Exception:
+            pass  # iframe gone meanwhile
+    return sorted(o for o in origins if o.startswith("http"))
+
+def reset_browser_state(driver, args, cdp=None, recorder=None):
+    """
+    Drop all cookies and the storage of every origin the last site touched, so the next
+    site in a batch starts from the same state a fresh single-URL run would see.
+    Only ever called on a worker's throwaway profile clone.
+    """
+    try:
+        if args.mode == "cdp" and args.browser in CDP_BROWSERS:
+            cdp = cdp or cdp_transport.SeleniumCDP(driver)
+            origins = visited_origins(cdp, recorder.child_sessions() if recorder else None)
+            cdp.batch([("Network.clearBrowserCookies", {})] +
+                      [("Storage.clearDataForOrigin", {"origin": o, "storageTypes": "all"}) for o in origins])
+        else:
+            driver.delete_all_cookies()
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        driver.get("about:blank")
+    except Exception as e:
+        print("[WARN] state reset between sites failed:", e)
+
+def run_batch(urls, args, headless: bool):
+    """
+    Fan urls out over a pool of long-lived browsers. Each worker runs on its own throwaway
+    clone (of --profile-template, else of the persistent profile), since the state reset
+    between sites wipes cookies and storage; the source profile is never written.
+    """
+    jobs = queue.Queue()
+    for u in urls:
+        jobs.put(u)
+    n_workers = max(1, min(args.workers, len(urls)))
+    results = {"ok": 0, "failed": []}
+    lock = threading.Lock()
+    timer = timing.Timer("extract-batch")
+
+    def worker(idx: int):
+        name = args.profile_name if idx == 0 else f"{args.profile_name}_w{idx}"
+        profile_dir = None
+        try:
+            with timer.span("profile_clone", worker=idx):
+                if args.profile_template:
+                    profile_dir = profiles.clone_for_run(args.profile_template, args.browser, f"_w{idx}")
+                elif not args.attach:
+                    profile_dir = profiles.clone_profile(
+                        profiles.compute_profile_dir(args.profile_name, args.browser), args.browser, f"_w{idx}")
+            print(f"[INFO] worker {idx}: launching {args.browser} ({profile_dir or 'daemon ' + name}) ...")
+            with timer.span("driver_launch", worker=idx):
+                driver = launch_or_attach(args, name, profile_dir, headless, False, abort=False)
+        except Exception as e:
+            print(f"[WARN] worker {idx}: launch failed: {e}")
+            if profile_dir:
+                profiles.release_clone(profile_dir)
+            return
+        cdp = recorder = None
+        try:
+            with timer.span("cdp_enable", worker=idx):
+                cdp = open_cdp(driver, args)
+                recorder = open_timeline(driver, args, cdp)
+            first = True
+            while True:
+                try:
+                    url = jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if not (first or args.attach):  # a daemon's profile is the user's own: never wiped
+                    with timer.span("state_reset", worker=idx):
+                        reset_browser_state(driver, args, cdp, recorder)
+                first = False
+                try:
+                    extract_one(driver, url, args, cdp, timer.child(), recorder)
+                    with lock:
+                        results["ok"] += 1
+                except Exception as e:
+                    print(f"[WARN] worker {idx}: {url} failed: {e}")
+                    with lock:
+                        results["failed"].append(url)
+        finally:
+            with timer.span("quit", worker=idx):
+                if cdp:
+                    cdp.close()
+                driver.quit()
+            if profile_dir:
+                profiles.release_clone(profile_dir)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(n_workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    # URLs left in the queue belong to workers whose browser never came up
+    while not jobs.empty():
+        results["failed"].append(jobs.get_nowait())
+    return finish_batch(results, f"{n_workers} workers", timer, args)
+
+def run_batch_contexts(urls, args, headless: bool):
+    """
+    --batch --contexts: a single browser; every URL gets a fresh browser context (own
+    cookies and storage, nothing to reset between sites), --workers contexts at a time.
+    """
+    results = {"ok": 0, "failed": []}
+    lock = threading.Lock()
+    timer = timing.Timer("extract-batch")
+    with timer.span("profile_clone"):
+        profile_dir = profile_dir_for(args, args.profile_name)
+    print(f"[INFO] Launching {args.browser} for {len(urls)} context(s) ...")
+    with timer.span("driver_launch"):
+        driver = launch_or_attach(args, args.profile_name, profile_dir, headless, False)
+
+    def job(ctxs, url):
+        t = timer.child()
+        s = None
+        try:
+            with t.span("context_open"):
+                s = ctxs.open()
+                # Page.enable as well: ContextSession.get() waits for Page.loadEventFired
+                s.batch([("Network.enable", {}), ("Page.enable", {})])
+                if args.settle:
+                    settle.enable_events(s)
+                recorder = open_timeline(s, args, s)
+            extract_one(s, url, args, s, t, recorder)
+            with lock:
+                results["ok"] += 1
+        except Exception as e:
+            print(f"[WARN] {url} failed: {e}")
+            with lock:
+                results["failed"].append(url)
+        finally:
+            if s:
+                with t.span("context_close"):
+                    s.close()
+
+    try:
+        with contexts.BrowserContexts(driver) as ctxs, ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            list(pool.map(lambda u: job(ctxs, u), urls))
+    except Exception as e:  # browser endpoint unreachable: nothing was extracted
+        print(f"[WARN] browser contexts unavailable: {e}")
+        results["failed"] = [u for u in urls]
     finally:
-        if not args.detach:
+        with timer.span("quit"):
             driver.quit()
+        if args.profile_template:
+            profiles.release_clone(profile_dir)
+    return finish_batch(results, f"{max(1, args.workers)} contexts at a time", timer, args)
+
+def finish_batch(results, how: str, timer, args):
+    print(f"[COMPLETED] batch: ok={results['ok']}, failed={len(results['failed'])} ({how})")
+    for u in results["failed"]:
+        print(f"[FAILED] {u}")
+    if args.trace:
+        path = timer.write_trace(os.path.join(args.run_dir or "output", "trace_extract_batch.json"))
+        print(f"[ARTIFACT] Trace saved -> {path}")
+    return results
+
+def main(argv=None):
+    if os.getenv("COOKIE_LAB_TESTMODE") != "1":
+        print("[ABORT] TESTMODE not set. Set COOKIE_LAB_TESTMODE=1 to run in test environment.")
+        sys.exit(1)
+
+    args = parse_args(argv)
+    url = args.url
+    headless = os.getenv("HEADLESS") == "1"
+    artifact.format_or_abort(args.artifact_format)
+
+    # Firefox CDP fallback
+    if args.mode == "cdp" and args.browser not in CDP_BROWSERS:
+        print("[WARN] CDP is not supported on this browser. Falling back to Selenium mode.")
+        args.mode = "selenium"
+    if args.contexts and not (args.batch and args.mode == "cdp"):
+        print("[WARN] --contexts needs --batch in CDP mode; ignoring it.")
+        args.contexts = False
+    if args.batch and args.attach and not args.contexts:
+        if args.mode == "cdp":
+            print("[INFO] --batch --attach: every URL gets its own browser context in the daemon (its profile is not touched).")
+            args.contexts = True
+        else:
+            print("[WARN] --batch --attach in Selenium mode: sites share the daemons' state (their profiles are never reset).")
+    if args.cookie_timeline and args.mode != "cdp":
+        print("[WARN] --cookie-timeline needs CDP mode; only the end-of-run snapshot is taken.")
+    if args.profile_template and (args.attach or args.browser not in CDP_BROWSERS):
+        print("[WARN] --profile-template needs a launched Chromium browser; using the profile directly.")
+        args.profile_template = None
+
+    if args.batch:
+        urls = read_url_list(url)
+        if not urls:
+            print("[ABORT] no URLs in", url)
+            sys.exit(1)
+        if args.detach:
+            print("[WARN] --detach is ignored in --batch mode.")
+        results = (run_batch_contexts if args.contexts else run_batch)(urls, args, headless)
+        sys.exit(1 if results["failed"] else 0)
+
+    timer = timing.Timer("extract")
+    with timer.span("profile_clone"):
+        profile_dir = profile_dir_for(args, args.profile_name)
+    print("[INFO] Launching", args.browser, "...")
+    with timer.span("driver_launch"):
+        driver = launch_or_attach(args, args.profile_name, profile_dir, headless, args.detach)
+
+    cdp = None
+    domain = host_from_url(url)
+    try:
+        with timer.span("cdp_enable"):
+            cdp = open_cdp(driver, args)
+            recorder = open_timeline(driver, args, cdp)
+        extract_one(driver, url, args, cdp, timer, recorder)
+        domain = host_from_url(driver.current_url)
+
+    finally:
+        with timer.span("quit"):
+            if cdp:
+                cdp.close()
+            # Attached sessions: quit only ends chromedriver's session, the daemon keeps running
+            if args.attach or not args.detach:
+                driver.quit()
+                if args.profile_template:
+                    profiles.release_clone(profile_dir)
+        print("[INFO] Timings: " + ", ".join(f"{k}={v:.3f}s" for k, v in timer.timings().items()))
+        if args.trace:
+            path = timer.write_trace(os.path.join(args.run_dir or "output", f"trace_extract_{domain}.json"))
+            print(f"[ARTIFACT] Trace saved -> {path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
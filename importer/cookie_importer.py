@@ -1,9 +1,13 @@
 import json, os, sys, time, argparse
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlsplit
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options as ChromeOptions
-from selenium.webdriver.edge.options import Options as EdgeOptions
-from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+# Make the shared cookielab package importable when run as a plain script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cookielab import (artifact, artifact_index, cdp as cdp_transport, contexts, daemon, planner, profiles,
+                       settle, shots, store, timing, verify)
+from cookielab.jar import Cookie
+from cookielab.psl import etld1
 
 CDP_BROWSERS = {"chrome", "edge", "brave", "chromium"}
 
@@ -12,32 +16,45 @@ def host_from_url(url: str) -> str:
     host = urlsplit(url).netloc
     return host.split(":")[0]
 
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
 def origin_from_url(url: str) -> str:
+    """scheme://host[:port] spelled like location.origin (lower-case host, default port dropped)."""
     u = urlsplit(url)
-    scheme = u.scheme or "https"
-    host = u.netloc
-    return f"{scheme}://{host}"
-
-def etld1(host: str) -> str:
-    parts = host.split(".")
-    if len(parts) >= 3 and parts[-2] in {"co", "com", "org", "gov", "ac", "net"}:
-        return ".".join(parts[-3:])
-    return ".".join(parts[-2:]) if len(parts) >= 2 else host
-
-def compute_profile_dir(profile_name: str, browser: str) -> str:
-    legacy = os.path.abspath(f"profiles/{profile_name}")
-    scoped = os.path.abspath(f"profiles/{browser}_{profile_name}")
-    return legacy if os.path.exists(legacy) else scoped
-
-def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool):
+    scheme = (u.scheme or "https").lower()
+    host = u.hostname or ""
+    if ":" in host:  # IPv6 literal
+        host = f"[{host}]"
+    try:
+        port = u.port
+    except ValueError:
+        port = None
+    return f"{scheme}://{host}" + (f":{port}" if port and port != DEFAULT_PORTS.get(scheme) else "")
+
+def storage_origin(payload, url: str) -> str:
+    """Origin the artifact's storage belongs to: where the extraction landed (meta.final_url), else url."""
+    meta = (payload.get("meta") or {}) if isinstance(payload, dict) else {}
+    return origin_from_url(meta.get("final_url") or url)
+
+def warn_if_landed_elsewhere(current_url: str, origin: str):
+    landed = origin_from_url(current_url)
+    if landed != origin:
+        print(f"[WARN] Landed on {landed} but the artifact's storage belongs to {origin}; "
+              "it is not visible on this origin")
+
+def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool, perf_log: bool = False):
+    # selenium is imported here (not at module level) so offline commands start fast
+    from selenium import webdriver
     os.makedirs(profile_dir, exist_ok=True)
     if browser in {"chrome", "brave", "chromium"}:
+        from selenium.webdriver.chrome.options import Options as ChromeOptions
         opts = ChromeOptions()
         opts.add_argument(f"--user-data-dir={profile_dir}")
         opts.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
         opts.add_argument("--log-level=3")
         if headless: opts.add_argument("--headless=new")
         if detach: opts.add_experimental_option("detach", True)
+        if perf_log: opts.set_capability(settle.PERF_LOG_CAP, settle.PERF_LOG_PREFS)
         # Brave browser binary location (if installed in default paths)
         if browser == "brave":
             for p in [
@@ -50,13 +67,16 @@ def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool):
         return webdriver.Chrome(options=opts)
 
     if browser == "edge":
+        from selenium.webdriver.edge.options import Options as EdgeOptions
         opts = EdgeOptions()
         opts.add_argument(f"--user-data-dir={profile_dir}")
         opts.add_argument("--log-level=3")
         if headless: opts.add_argument("--headless=new")
+        if perf_log: opts.set_capability(settle.EDGE_PERF_LOG_CAP, settle.PERF_LOG_PREFS)
         return webdriver.Edge(options=opts)
 
     if browser == "firefox":
+        from selenium.webdriver.firefox.options import Options as FirefoxOptions
         opts = FirefoxOptions()
         if headless: opts.add_argument("-headless")
         return webdriver.Firefox(options=opts)
@@ -64,68 +84,272 @@ def make_driver(browser: str, profile_dir: str, headless: bool, detach: bool):
     raise SystemExit(f"[ABORT] unsupported browser: {browser}")
 
 def sanitize_cookie_for_cdp(c):
-    out = {
-        "name": c["name"],
-        "value": c.get("value", ""),
-        "domain": c.get("domain"),
-        "path": c.get("path") or "/",
-        "secure": bool(c.get("secure", False)),
-        "httpOnly": bool(c.get("httpOnly", False)),
-    }
-    if c.get("sameSite") in ("Lax", "Strict", "None"):
-        out["sameSite"] = c["sameSite"]
-    if c.get("expiry") is not None:
-        try:
-            out["expires"] = float(c["expiry"])
-        except Exception:
-            pass
-    return out
+    return Cookie.from_json(c).to_cdp()
+
+# Above this many bytes of serialized storage, --storage-restore auto switches
+# from the document-start script to DOMStorage.setDOMStorageItem batches
+PRELOAD_LIMIT = 256 * 1024
+# Max setDOMStorageItem commands in flight at once
+DOMSTORAGE_WINDOW = 256
 
-def add_preload_storage_script(driver, local_storage: dict, session_storage: dict):
+def storage_size(local_storage: dict, session_storage: dict) -> int:
+    return sum(len(k) + len(v or "") for m in (local_storage, session_storage) for k, v in (m or {}).items())
+
+def add_preload_storage_script(cdp, origin: str, local_storage: dict, session_storage: dict):
     """
     Inject before navigation. At the earliest timing (document start),
-    set localStorage / sessionStorage.
+    set localStorage / sessionStorage -- only in documents of `origin`.
+    The data travels as one JSON string literal (JSON.parse is much cheaper for
+    V8 than an object literal), and only the storages being restored are cleared.
     """
     # Do nothing if both storages are empty
     if not (local_storage or session_storage):
         return None
 
-    import json as _json
-    ls_json = _json.dumps(local_storage or {}, ensure_ascii=False)
-    ss_json = _json.dumps(session_storage or {}, ensure_ascii=False)
-
+    data = json.dumps({"localStorage": local_storage or {}, "sessionStorage": session_storage or {}})
     script = f"""
     (function() {{
+      if (location.origin !== {json.dumps(origin)}) return;
       try {{
-        const __LS__ = {ls_json};
-        const __SS__ = {ss_json};
-        // Clear storages first (may duplicate with pre-clear but safer)
-        try {{ window.localStorage.clear(); }} catch (e) {{}}
-        try {{ window.sessionStorage.clear(); }} catch (e) {{}}
-
-        // Restore values
-        try {{
-          for (const [k,v] of Object.entries(__LS__)) {{
-            try {{ window.localStorage.setItem(k, v); }} catch (e) {{}}
-          }}
-        }} catch (e) {{}}
-
-        try {{
-          for (const [k,v] of Object.entries(__SS__)) {{
-            try {{ window.sessionStorage.setItem(k, v); }} catch (e) {{}}
-          }}
-        }} catch (e) {{}}
+        const data = JSON.parse({json.dumps(data)});
+        for (const type of ["localStorage", "sessionStorage"]) {{
+          const items = data[type];
+          if (!Object.keys(items).length) continue;
+          try {{
+            const store = window[type];
+            store.clear();
+            for (const [k,v] of Object.entries(items)) {{
+              try {{ store.setItem(k, v); }} catch (e) {{}}
+            }}
+          }} catch (e) {{}}
+        }}
       }} catch (e) {{}}
     }})();
     """
     try:
-        return driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script})
+        return cdp.call("Page.addScriptToEvaluateOnNewDocument", {"source": script})
     except Exception as e:
         print("[WARN] preload storage script install failed:", e)
         return None
 
+def restore_storage_domstorage(driver, cdp, origin: str, local_storage: dict, session_storage: dict):
+    """
+    Write storage with batched DOMStorage.setDOMStorageItem after visiting a
+    lightweight same-origin path (DOMStorage needs a frame of that origin).
+    Returns {type: (ok, total)}.
+    """
+    counts = {}
+    if not (local_storage or session_storage):
+        return counts
+    driver.get(origin + "/robots.txt")
+    cdp.call("DOMStorage.enable", {})
+    for type_, items in (("localStorage", local_storage), ("sessionStorage", session_storage)):
+        if not items:
+            continue
+        sid = {"securityOrigin": origin, "isLocalStorage": type_ == "localStorage"}
+        try:
+            cdp.call("DOMStorage.clear", {"storageId": sid})
+        except Exception as e:
+            print(f"[WARN] DOMStorage.clear ({type_}) failed:", e)
+        ok, inflight = 0, []
+        for k, v in items.items():
+            inflight.append((k, cdp.send("DOMStorage.setDOMStorageItem",
+                                         {"storageId": sid, "key": k, "value": v if v is not None else ""})))
+            if len(inflight) >= DOMSTORAGE_WINDOW:
+                ok += _settle_storage_writes(type_, inflight)
+                inflight = []
+        ok += _settle_storage_writes(type_, inflight)
+        counts[type_] = (ok, len(items))
+    return counts
+
+def _settle_storage_writes(type_: str, inflight) -> int:
+    ok = 0
+    for k, fut in inflight:
+        try:
+            fut.result(30)
+            ok += 1
+        except Exception as e:
+            print(f"[WARN] {type_} item not restored: {k} - {e}")
+    return ok
+
+def verify_storage(cdp, origin: str, local_storage: dict, session_storage: dict):
+    """{type: (matching keys, expected keys)} read back through DOMStorage after navigation."""
+    counts = {}
+    for type_, items in (("localStorage", local_storage), ("sessionStorage", session_storage)):
+        if not items:
+            continue
+        try:
+            got = dict(cdp.call("DOMStorage.getDOMStorageItems", {"storageId": {
+                "securityOrigin": origin, "isLocalStorage": type_ == "localStorage"}}).get("entries", []))
+        except Exception as e:
+            print(f"[WARN] {type_} verification failed:", e)
+            continue
+        counts[type_] = (sum(1 for k, v in items.items() if got.get(k) == v), len(items))
+    return counts
+
+def storage_types(pre_clear) -> str:
+    """Storage.clearDataForOrigin storageTypes for the --pre-clear selection ('' if none)."""
+    return ",".join(t for t, name in (("local_storage", "localStorage"), ("session_storage", "sessionStorage"))
+                    if name in pre_clear)
+
+def restore_storage_cdp(driver, cdp, strategy: str, origin: str, local_storage: dict, session_storage: dict):
+    """CDP storage restore before navigation; returns the preload script id (remove it after navigating)."""
+    if strategy == "auto":
+        strategy = "domstorage" if storage_size(local_storage, session_storage) > PRELOAD_LIMIT else "preload"
+    print(f"[INFO] Restoring storage for {origin} ({strategy}) ...")
+    if strategy == "preload":
+        return add_preload_storage_script(cdp, origin, local_storage, session_storage)
+    try:
+        counts = restore_storage_domstorage(driver, cdp, origin, local_storage, session_storage)
+        print("[INFO] Storage written: " + ", ".join(f"{t}={ok}/{n}" for t, (ok, n) in counts.items()))
+    except Exception as e:
+        print("[WARN] DOMStorage restore failed:", e)
+    return None
+
+def read_after_and_verify(cdp, base_dir: str, target_domain: str, cookies, started_at: float, cookie_file: str,
+                          variant: str = None):
+    """
+    Write cookies_after_<domain> (same artifact format as cookie_file) and verify_<domain>.json;
+    returns the verify counts (None on failure).
+    """
+    try:
+        after_c = cdp.call("Network.getAllCookies", {})["cookies"]
+        artifact.write(artifact.path_for(base_dir, f"cookies_after_{target_domain}", artifact.format_of(cookie_file)),
+                       after_c)
+    except Exception as e:
+        print("[WARN] post-read cookies failed:", e)
+        return None
+    # What the browser kept of what we set (verify_<domain>.json, python -m cookielab.verify for trees)
+    report = verify.diff_jars(cookies, after_c, imported_at=started_at)
+    report["meta"] = {"domain": target_domain, "input": cookie_file, "filter": variant}
+    verify.write_report(base_dir, target_domain, report)
+    return report["counts"]
+
+# ---------- isolated browser contexts ----------
+def import_in_context(ctxs, idx: int, args, url: str, cookies, cdp_cookies, local_storage: dict,
+                      session_storage: dict, cookie_file: str, variant: str, base_dir: str, target_origin: str,
+                      writer=None) -> dict:
+    """
+    One isolated session: a fresh browser context gets the pre-clear, cookies and storage
+    before its first navigation, then wait, screenshot and verification go to <base_dir>/ctxNN/.
+    Returns the session's meta (the screenshot hash is added once the writer is done).
+    """
+    timer = timing.Timer(f"import-ctx{idx}")
+    started_at = time.time()
+    run_dir = os.path.join(base_dir, f"ctx{idx:02d}")
+    os.makedirs(run_dir, exist_ok=True)
+    target_domain = host_from_url(url)
+    meta = {"browser": args.browser, "profile": args.profile_name, "mode": "cdp", "context": idx,
+            "imported_at": int(started_at), "url": url, "cookie_file": os.path.abspath(cookie_file),
+            "applied": 0, "skipped": 0, "verify": None, "variant": variant, "screenshot": None}
+    s = None
+    try:
+        with timer.span("context_open"):
+            s = ctxs.open()
+        with timer.span("cdp_enable"):
+            s.batch([("Network.enable", {}), ("Page.enable", {})])
+            if args.settle:
+                settle.enable_events(s)
+        with timer.span("pre_clear"):
+            # A new context starts empty; clearing anyway keeps the flow identical to profile runs
+            clear = [("Network.clearBrowserCookies", {})] if "cookies" in args.pre_clear else []
+            if storage_types(args.pre_clear):
+                clear.append(("Storage.clearDataForOrigin",
+                              {"origin": target_origin, "storageTypes": storage_types(args.pre_clear)}))
+            s.batch(clear)
+        with timer.span("cookie_write"):
+            if cdp_cookies:
+                s.call("Network.setCookies", {"cookies": cdp_cookies})
+                meta["applied"] = len(cdp_cookies)
+        preload_id = None
+        with timer.span("storage_restore"):
+            if local_storage or session_storage:
+                preload_id = restore_storage_cdp(s, s, args.storage_restore, target_origin,
+                                                 local_storage, session_storage)
+        if args.settle:
+            settle.discard_events(s, s)
+        with timer.span("navigation", url=url):
+            s.get(url)
+        if preload_id and "identifier" in preload_id:
+            s.call("Page.removeScriptToEvaluateOnNewDocument", {"identifier": preload_id["identifier"]})
+        with timer.span("storage_verify"):
+            if local_storage or session_storage:
+                warn_if_landed_elsewhere(s.current_url, target_origin)
+                meta["storage"] = verify_storage(s, target_origin, local_storage, session_storage)
+        with timer.span("settle_wait" if args.settle else "wait"):
+            if args.settle:
+                settle.wait_for_settle(s, args.wait, quiet=args.quiet_ms / 1000, events=s.drain_events)
+            else:
+                time.sleep(max(0, args.wait))
+        if writer:
+            with timer.span("screenshot"):
+                path = shots.screenshot_path(run_dir, target_domain, args.screenshot_format)
+                shots.capture(s, writer, path, args.screenshot_format, args.screenshot_quality,
+                              shots.parse_clip(args.screenshot_clip), args.screenshot_scale)
+                meta["screenshot"] = {"path": path}
+        with timer.span("cookies_after_read"):
+            meta["verify"] = read_after_and_verify(s, run_dir, target_domain, cookies, started_at, cookie_file, variant)
+    except Exception as e:
+        meta["error"] = str(e)
+    finally:
+        if s:
+            with timer.span("context_close"):
+                s.close()
+    meta["run_dir"] = run_dir
+    meta["timings"] = timer.timings()
+    v = meta["verify"] or {}
+    if "error" in meta:
+        print(f"[FAILED] ctx{idx:02d}: {meta['error']}")
+    else:
+        print(f"[OK] ctx{idx:02d}: applied={meta['applied']}, kept={v.get('applied', '-')}, "
+              f"dropped={v.get('dropped', '-')} ({meta['timings']['total']:.2f}s)")
+    return meta
+
+def run_contexts(driver, args, url: str, cookie_file: str, payload, base_dir: str) -> list:
+    """
+    --contexts N: replay the jar into N isolated browser contexts of this one browser,
+    --context-workers at a time. Writes per-context artifacts and contexts_<domain>.json.
+    """
+    cookies = payload.get("cookies", payload if isinstance(payload, list) else [])
+    cdp_cookies = [sanitize_cookie_for_cdp(c) for c in cookies]
+    local_storage = payload.get("localStorage", {}) if isinstance(payload, dict) else {}
+    session_storage = payload.get("sessionStorage", {}) if isinstance(payload, dict) else {}
+    variant = (((payload.get("meta") or {}).get("filter") or {}).get("ruleset") if isinstance(payload, dict) else None)
+    target_origin = storage_origin(payload, url)
+    workers = max(1, min(args.context_workers or args.contexts, args.contexts))
+    writer = shots.ShotWriter() if args.screenshot else None
+    print(f"[INFO] Importing {len(cookies)} cookies into {args.contexts} browser context(s), {workers} at a time ...")
+    t0 = time.perf_counter()
+    with contexts.BrowserContexts(driver) as ctxs, ThreadPoolExecutor(max_workers=workers) as pool:
+        metas = list(pool.map(lambda i: import_in_context(
+            ctxs, i, args, url, cookies, cdp_cookies, local_storage, session_storage, cookie_file, variant,
+            base_dir, target_origin, writer), range(args.contexts)))
+    elapsed = time.perf_counter() - t0
+    hashes = writer.close() if writer else {}
+    target_domain = host_from_url(url)
+    for meta in metas:
+        shot = meta["screenshot"]
+        if shot:
+            meta["screenshot"] = dict(shot, phash=hashes.get(shot["path"])) if os.path.exists(shot["path"]) else None
+        with open(os.path.join(meta["run_dir"], f"import_meta_{target_domain}.json"), "w", encoding="utf-8") as f:
+            json.dump({"meta": meta}, f, indent=2, ensure_ascii=False)
+    failed = [m for m in metas if "error" in m]
+    totals = sorted(m["timings"]["total"] for m in metas)
+    summary = {"url": url, "cookie_file": cookie_file, "contexts": args.contexts, "workers": workers,
+               "failed": len(failed), "elapsed_s": round(elapsed, 3),
+               "context_total_s": {"median": totals[len(totals) // 2], "max": totals[-1]},
+               "runs": [{"context": m["context"], "run_dir": m["run_dir"], "error": m.get("error"),
+                         "verify": m["verify"], "total_s": m["timings"]["total"]} for m in metas]}
+    path = os.path.join(base_dir, f"contexts_{target_domain}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"[COMPLETED] {args.contexts - len(failed)}/{args.contexts} context(s) ok in {elapsed:.2f}s "
+          f"(per context: median {summary['context_total_s']['median']:.2f}s, max {totals[-1]:.2f}s)")
+    print(f"[ARTIFACT] Summary saved -> {path}")
+    return failed
+
 # ---------- args ----------
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Cookie Importer (apply-before-nav) + Storage restore at document start (CDP preferred)",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -140,16 +364,45 @@ def parse_args():
                         help="What to clear before import (cookies, localStorage, sessionStorage)")
     parser.add_argument("--run-dir", default=None, help="Directory to read/write artifacts")
     parser.add_argument("--screenshot", action="store_true", help="Capture screenshot after import")
+    parser.add_argument("--screenshot-format", choices=["png", "jpeg", "webp"], default="png",
+                        help="Screenshot encoding (CDP mode; Selenium mode always writes PNG)")
+    parser.add_argument("--screenshot-quality", type=int, default=80, help="JPEG/WebP quality (0-100)")
+    parser.add_argument("--screenshot-clip", default=None,
+                        help="Capture only x,y,width,height (CSS px) instead of the viewport (CDP mode)")
+    parser.add_argument("--screenshot-scale", type=float, default=1.0, help="Downscale factor for the capture (CDP mode)")
     parser.add_argument("--detach", action="store_true", help="Keep the browser window open after execution")
-    return parser.parse_args()
+    parser.add_argument("--attach", action="store_true",
+                        help="Attach to the warm browser daemon of this profile (python -m cookielab.daemon start ...) "
+                             "instead of launching one")
+    parser.add_argument("--profile-template", default=None,
+                        help="Import into a throwaway clone of this profile template (python -m cookielab.profiles init ...) "
+                             "instead of profiles/<profile_name>; the clone is removed afterwards")
+    parser.add_argument("--cdp-transport", choices=["selenium", "ws"], default="selenium",
+                        help="How CDP commands are sent: chromedriver (execute_cdp_cmd) or the DevTools websocket directly")
+    parser.add_argument("--storage-restore", choices=["auto", "preload", "domstorage"], default="auto",
+                        help="CDP storage restore: document-start script for the target origin, batched "
+                             "DOMStorage writes after a lightweight same-origin visit, or auto by payload size")
+    parser.add_argument("--trace", action="store_true",
+                        help="Write a chrome://tracing compatible trace_import_<domain>.json into --run-dir")
+    parser.add_argument("--store", default=None,
+                        help="Snapshot store to materialize cookies_<domain>.json from when it is missing")
+    parser.add_argument("--settle", action="store_true",
+                        help="Stop the final wait once the network is idle (--wait becomes the upper bound)")
+    parser.add_argument("--quiet-ms", type=int, default=500, help="Network quiet window for --settle")
+    parser.add_argument("--contexts", type=int, default=0,
+                        help="CDP: replay the jar into this many isolated browser contexts of one browser "
+                             "(results per context in <run-dir>/ctxNN/) instead of the profile's own session")
+    parser.add_argument("--context-workers", type=int, default=0,
+                        help="Contexts driven at the same time with --contexts (0: all of them)")
+    return parser.parse_args(argv)
 
 # ---------- main ----------
-def main():
+def main(argv=None):
     if os.getenv("COOKIE_LAB_TESTMODE") != "1":
         print("[ABORT] TESTMODE not set. Set COOKIE_LAB_TESTMODE=1 to run in test environment.")
         sys.exit(1)
 
-    args = parse_args()
+    args = parse_args(argv)
     url = args.url
     headless = os.getenv("HEADLESS") == "1"
 
@@ -157,182 +410,252 @@ def main():
     if args.mode == "cdp" and args.browser not in CDP_BROWSERS:
         print("[WARN] CDP is not supported on this browser. Falling back to Selenium mode.")
         args.mode = "selenium"
-
-    profile_dir = compute_profile_dir(args.profile_name, args.browser)
+    if args.contexts and args.mode != "cdp":
+        print("[WARN] --contexts needs CDP mode on a Chromium browser; importing into the profile instead.")
+        args.contexts = 0
+    if args.profile_template and (args.attach or args.browser not in CDP_BROWSERS):
+        print("[WARN] --profile-template needs a launched Chromium browser; using the profile directly.")
+        args.profile_template = None
+
+    timer = timing.Timer("import")
+    started_at = time.time()
+    verified = None
     target_domain = host_from_url(url)
-    target_origin = origin_from_url(url)
     base_dir = args.run_dir or "output"
     os.makedirs(base_dir, exist_ok=True)
-    cookie_file = os.path.join(base_dir, f"cookies_{target_domain}.json")
-
-    # Cookie file selection (auto-select if exact match not found)
-    if not os.path.exists(cookie_file):
-        search_dirs = [base_dir] + (["output"] if base_dir != "output" else [])
-        candidates = []
-        for d in search_dirs:
-            if os.path.exists(d):
-                for p in os.listdir(d):
-                    if p.startswith("cookies_") and p.endswith(".json"):
-                        candidates.append(os.path.join(d, p))
-        chosen = None
-        tgt_etld = etld1(target_domain)
-        for cpath in candidates:
+    cookie_file = (artifact.find(base_dir, f"cookies_{target_domain}")
+                   or os.path.join(base_dir, f"cookies_{target_domain}.json"))
+
+    with timer.span("artifact_select"):
+        # Materialize from the snapshot store (latest snapshot of the target domain's ref)
+        if args.store and not os.path.exists(cookie_file):
+            st = store.ArtifactStore(args.store)
             try:
-                with open(cpath, "r", encoding="utf-8") as f:
-                    pl = json.load(f)
-                meta = pl.get("meta", {}) if isinstance(pl, dict) else {}
-                final_dom = meta.get("final_domain") or ""
-                score = 0
-                if final_dom == target_domain: score = 3
-                elif final_dom and etld1(final_dom) == tgt_etld: score = 2
-                elif final_dom and final_dom in url: score = 1
-                if score and (not chosen or score > chosen[0]): chosen = (score, cpath)
-            except Exception:
-                pass
-        if chosen:
-            cookie_file = chosen[1]
-            print(f"[INFO] Cookie file auto-selected -> {cookie_file}")
-        else:
-            print(f"[ERROR] Cookie file not found: {cookie_file}")
-            print(f"[HINT] Candidates: {' / '.join(candidates[:5]) if candidates else '(none)'}")
-            sys.exit(1)
+                cookie_file = st.checkout(target_domain, base_dir)
+                print(f"[INFO] Cookie file materialized from store -> {cookie_file}")
+            except KeyError:
+                print(f"[INFO] No snapshot for {target_domain} in {args.store}; trying artifact files")
+            finally:
+                st.close()
+
+        # Cookie file selection (auto-select if exact match not found)
+        if not os.path.exists(cookie_file):
+            search_dirs = [base_dir] + (["output"] if base_dir != "output" else [])
+            chosen, candidates = artifact_index.select_artifact(search_dirs, target_domain, url, etld1)
+            if chosen:
+                cookie_file = chosen
+                print(f"[INFO] Cookie file auto-selected -> {cookie_file}")
+            else:
+                print(f"[ERROR] Cookie file not found: {cookie_file}")
+                print(f"[HINT] Candidates: {' / '.join(candidates) if candidates else '(none)'}")
+                sys.exit(1)
 
     # Launch browser (first at about:blank)
-    driver = make_driver(args.browser, profile_dir, headless=headless, detach=args.detach)
-    print(f"[INFO] Launching {args.browser} at about:blank ...")
-    driver.get("about:blank")
-
-    # Enable CDP features
-    if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-        driver.execute_cdp_cmd("Network.enable", {})
-        driver.execute_cdp_cmd("Page.enable", {})
-
-    # Load JSON file
-    with open(cookie_file, "r", encoding="utf-8") as f:
-        payload = json.load(f)
-    cookies = payload.get("cookies", payload if isinstance(payload, list) else [])
-    local_storage = payload.get("localStorage", {})
-    session_storage = payload.get("sessionStorage", {})
-
-    # --- Pre-clear executed *before* navigation ---
-    if "cookies" in args.pre_clear:
-        try:
-            if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    use_cdp = args.mode == "cdp" and args.browser in CDP_BROWSERS
+    with timer.span("profile_clone"):
+        if args.profile_template:
+            profile_dir = profiles.clone_for_run(args.profile_template, args.browser)
+        else:
+            profile_dir = profiles.compute_profile_dir(args.profile_name, args.browser)
+    # Everything after the clone runs under try/finally: the browser quits and the clone is
+    # released on errors and sys.exit too, not only when the import completes
+    driver = cdp = None
+    shot_writer = ss_path = None
+    try:
+        with timer.span("driver_launch"):
+            if args.attach:
+                driver = daemon.attach_or_abort(args.profile_name, args.browser, perf_log=args.settle and use_cdp)
             else:
-                driver.delete_all_cookies()
-        except Exception as e:
-            print("[WARN] clear cookies:", e)
-
-    if ("localStorage" in args.pre_clear) or ("sessionStorage" in args.pre_clear):
-        try:
+                driver = make_driver(args.browser, profile_dir, headless=headless, detach=args.detach,
+                                     perf_log=args.settle and use_cdp)
+            print(f"[INFO] Launching {args.browser} at about:blank ...")
+            driver.get("about:blank")
+
+        if args.contexts:
+            payload = artifact.read(cookie_file)
+            failed = run_contexts(driver, args, url, cookie_file, payload, base_dir)
+            sys.exit(1 if failed else 0)
+
+        # Enable CDP features (independent commands, pipelined on the websocket transport)
+        with timer.span("cdp_enable"):
+            if use_cdp:
+                cdp = cdp_transport.connect(driver, args.cdp_transport)
+                cdp.batch([("Network.enable", {}), ("Page.enable", {})])
+                if args.settle:
+                    settle.enable_events(cdp)
+
+        # Load the artifact (.json or .ndjson[.gz|.zst])
+        with timer.span("cookie_file_read"):
+            payload = artifact.read(cookie_file)
+            cookies = payload.get("cookies", payload if isinstance(payload, list) else [])
+            local_storage = payload.get("localStorage", {})
+            session_storage = payload.get("sessionStorage", {})
+            # Storage was read where the extraction landed, which differs from url after a redirect
+            target_origin = storage_origin(payload, url)
+
+        # --- Pre-clear executed *before* navigation ---
+        with timer.span("pre_clear"):
+            if "cookies" in args.pre_clear:
+                try:
+                    if args.mode == "cdp" and args.browser in CDP_BROWSERS:
+                        cdp.call("Network.clearBrowserCookies", {})
+                    else:
+                        driver.delete_all_cookies()
+                except Exception as e:
+                    print("[WARN] clear cookies:", e)
+
+            if ("localStorage" in args.pre_clear) or ("sessionStorage" in args.pre_clear):
+                try:
+                    if args.mode == "cdp" and args.browser in CDP_BROWSERS:
+                        cdp.call("Storage.clearDataForOrigin", {
+                            "origin": target_origin, "storageTypes": storage_types(args.pre_clear)})
+                    # In Selenium mode, no origin exists before navigation,
+                    # so JS-based clearing happens with the storage restore on the target origin
+                except Exception as e:
+                    print("[WARN] clear storage:", e)
+
+        # --- Apply cookies *before* navigation (CDP can set across domains) ---
+        applied = skipped = 0
+        domains = None
+        restore_in_page = bool(local_storage or session_storage or
+                               {"localStorage", "sessionStorage"} & set(args.pre_clear))
+        with timer.span("cookie_write"):
             if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-                driver.execute_cdp_cmd("Storage.clearDataForOrigin", {
-                    "origin": target_origin,
-                    "storageTypes": ",".join(
-                        [s for s, t in (("local_storage","localStorage" in args.pre_clear),
-                                        ("session_storage","sessionStorage" in args.pre_clear)) if t]
-                    )
-                })
-            # In Selenium mode, no origin exists before navigation,
-            # so JS-based clearing will be handled later
-        except Exception as e:
-            print("[WARN] clear storage:", e)
-
-    # --- Apply cookies *before* navigation (CDP can set across domains) ---
-    applied = skipped = 0
-    if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-        payload2 = {"cookies": [sanitize_cookie_for_cdp(c) for c in cookies]}
-        try:
-            if payload2["cookies"]:
-                driver.execute_cdp_cmd("Network.setCookies", payload2)
-                applied = len(payload2["cookies"])
-        except Exception as e:
-            print("[WARN] CDP setCookies failed:", e)
-    else:
-        # In Selenium mode, add_cookie before navigation is limited,
-        # so cookies will be applied later after reaching origin
-        pass
-
-    # --- Restore storage at *document start* (CDP: Page.addScriptToEvaluateOnNewDocument) ---
-    preload_id = None
-    if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-        preload_id = add_preload_storage_script(driver, local_storage, session_storage)
-
-    # Now navigate to the target URL for the first time
-    print(f"[INFO] Navigating to {url} with pre-applied state ...")
-    driver.get(url)
-
-    # Selenium fallback: apply after reaching origin (not perfect)
-    if args.mode != "cdp" or (args.browser not in CDP_BROWSERS):
-        # Apply as many cookies as possible
-        for c in cookies:
+                payload2 = {"cookies": [sanitize_cookie_for_cdp(c) for c in cookies]}
+                try:
+                    if payload2["cookies"]:
+                        cdp.call("Network.setCookies", payload2)
+                        applied = len(payload2["cookies"])
+                except Exception as e:
+                    print("[WARN] CDP setCookies failed:", e)
+            else:
+                # Selenium mode writes cookies only for the current document: visit each needed
+                # host once on a light path (target last) and batch the writes there
+                visits, dropped = planner.plan(cookies, etld1, url, include_target=restore_in_page)
+                print(f"[INFO] Applying {len(cookies)} cookies over {len(visits)} host visit(s) ...")
+                domains = planner.apply_plan(driver, visits, dropped, clear="cookies" in args.pre_clear)
+                applied = sum(r["applied"] for r in domains.values())
+                skipped = sum(r["skipped"] for r in domains.values())
+                for site, r in sorted(domains.items()):
+                    print(f"[INFO]   {site}: applied={r['applied']}, skipped={r['skipped']} ({len(r['hosts'])} host(s))")
+
+        # --- Restore storage at *document start* (CDP: Page.addScriptToEvaluateOnNewDocument) ---
+        preload_id = None
+        with timer.span("storage_restore"):
+            if use_cdp and (local_storage or session_storage):
+                preload_id = restore_storage_cdp(driver, cdp, args.storage_restore, target_origin,
+                                                 local_storage, session_storage)
+            elif not use_cdp and restore_in_page:
+                # Selenium mode: the planner's last visit left the browser on the target origin
+                try:
+                    if origin_from_url(driver.current_url) != target_origin:
+                        driver.get(target_origin + planner.LIGHT_PATH)
+                    driver.execute_script("""
+                      const [data, clear] = arguments;
+                      for (const type of ["localStorage", "sessionStorage"]) {
+                        const store = window[type];
+                        if (clear.includes(type)) store.clear();
+                        for (const [k, v] of Object.entries(data[type] || {})) { try { store.setItem(k, v); } catch (e) {} }
+                      }
+                    """, {"localStorage": local_storage, "sessionStorage": session_storage}, args.pre_clear)
+                except Exception as e:
+                    print("[WARN] storage restore (selenium) failed:", e)
+
+        # Now navigate to the target URL for the first time
+        print(f"[INFO] Navigating to {url} with pre-applied state ...")
+        if args.settle:
+            settle.discard_events(driver, cdp)
+        with timer.span("navigation", url=url):
+            driver.get(url)
+
+        # The document-start script has run for the main document; drop it so later
+        # navigations and iframes do not re-parse the payload or clobber the site's writes
+        if preload_id and "identifier" in preload_id:
             try:
-                d = {k: v for k, v in c.items()
-                     if k in {"name","value","path","domain","secure","httpOnly","expiry","sameSite"}}
-                if "expiry" in d and d["expiry"] is not None:
-                    try: d["expiry"] = int(d["expiry"])
-                    except: d.pop("expiry", None)
-                if not d.get("path"): d["path"] = "/"
-                driver.add_cookie(d)
-                applied += 1
-            except Exception as e:
-                skipped += 1
-                print(f"[WARN] Cookie ignored: {c.get('name')} - {e}")
-        # Restore storage afterward (requires JS, happens after first render)
-        try:
-            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
-        except Exception:
-            pass
-        try:
-            # localStorage
-            if local_storage:
-                driver.execute_script("""
-                  const items = arguments[0] || {};
-                  for (const [k,v] of Object.entries(items)) { try { localStorage.setItem(k, v); } catch(e){} }
-                """, local_storage)
-            # sessionStorage
-            if session_storage:
-                driver.execute_script("""
-                  const items = arguments[0] || {};
-                  for (const [k,v] of Object.entries(items)) { try { sessionStorage.setItem(k, v); } catch(e){} }
-                """, session_storage)
-        except Exception as e:
-            print("[WARN] storage restore (selenium) failed:", e)
-        # Reload the page to apply restored state
-        driver.get(url)
-
-    # Final wait
-    time.sleep(max(0, args.wait))
-
-    print(f"[INFO] Cookie application complete: applied={applied}, skipped={skipped}")
+                cdp.call("Page.removeScriptToEvaluateOnNewDocument", {"identifier": preload_id["identifier"]})
+            except Exception:
+                pass
+        with timer.span("storage_verify"):
+            if local_storage or session_storage:
+                warn_if_landed_elsewhere(driver.current_url, target_origin)
+            if use_cdp and (local_storage or session_storage):
+                counts = verify_storage(cdp, target_origin, local_storage, session_storage)
+                if counts:
+                    print("[INFO] Storage restored: " + ", ".join(f"{t}={ok}/{n}" for t, (ok, n) in counts.items()))
+
+        # Final wait
+        with timer.span("settle_wait" if args.settle else "wait"):
+            if args.settle:
+                reason, elapsed = settle.wait_for_settle(driver, args.wait, quiet=args.quiet_ms / 1000, cdp=use_cdp,
+                                                         events=settle.event_source(driver, cdp) if cdp else None)
+                print(f"[INFO] Page settled ({reason}) after {elapsed:.2f}s")
+            else:
+                time.sleep(max(0, args.wait))
 
-    if args.screenshot:
-        ss_path = os.path.join(base_dir, f"screenshot_after_{target_domain}.png")
-        try:
-            driver.save_screenshot(ss_path)
-            print(f"[ARTIFACT] Screenshot saved -> {ss_path}")
-        except Exception as e:
-            print("[WARN] screenshot failed:", e)
+        print(f"[INFO] Cookie application complete: applied={applied}, skipped={skipped}")
 
-    # Post-verification (CDP only)
-    if args.mode == "cdp" and args.browser in CDP_BROWSERS:
-        try:
-            after_c = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
-            with open(os.path.join(base_dir, f"cookies_after_{target_domain}.json"), "w", encoding="utf-8") as f:
-                json.dump(after_c, f, indent=2, ensure_ascii=False)
-            # Unregister preload script after use (optional)
-            if preload_id and "identifier" in preload_id:
+        # Capture now; base64 decoding, hashing and the file write run on a writer thread
+        if args.screenshot:
+            with timer.span("screenshot"):
+                shot_writer = shots.ShotWriter()
                 try:
-                    driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument",
-                                           {"identifier": preload_id["identifier"]})
-                except Exception:
-                    pass
-        except Exception as e:
-            print("[WARN] post-read cookies failed:", e)
+                    if use_cdp:
+                        ss_path = shots.screenshot_path(base_dir, target_domain, args.screenshot_format)
+                        shots.capture(cdp, shot_writer, ss_path, args.screenshot_format, args.screenshot_quality,
+                                      shots.parse_clip(args.screenshot_clip), args.screenshot_scale)
+                    else:
+                        ss_path = shots.screenshot_path(base_dir, target_domain)
+                        shot_writer.submit(ss_path, driver.get_screenshot_as_base64())
+                except Exception as e:
+                    ss_path = None
+                    print("[WARN] screenshot failed:", e)
+
+        # Post-verification (CDP only)
+        with timer.span("cookies_after_read"):
+            if args.mode == "cdp" and args.browser in CDP_BROWSERS:
+                verified = read_after_and_verify(cdp, base_dir, target_domain, cookies, started_at, cookie_file,
+                                                 ((payload.get("meta") or {}).get("filter") or {}).get("ruleset"))
+                if verified:
+                    print("[INFO] Verify: " + ", ".join(f"{k}={v}" for k, v in verified.items()))
+    finally:
+        with timer.span("quit"):
+            if cdp:
+                cdp.close()
+            # Attached sessions: quit only ends chromedriver's session, the daemon keeps running
+            if driver and (args.attach or not args.detach):
+                driver.quit()
+            if args.profile_template and (driver is None or not args.detach):
+                profiles.release_clone(profile_dir)
+
+    screenshot = None
+    if shot_writer:
+        phash = shot_writer.close().get(ss_path)
+        if ss_path and os.path.exists(ss_path):
+            screenshot = {"path": ss_path, "phash": phash}
+            print(f"[ARTIFACT] Screenshot saved -> {ss_path}")
 
-    if not args.detach:
-        driver.quit()
+    # Where the time went: meta.timings in import_meta_<domain>.json (+ optional trace)
+    timings = timer.timings()
+    print("[INFO] Timings: " + ", ".join(f"{k}={v:.3f}s" for k, v in timings.items()))
+    with open(os.path.join(base_dir, f"import_meta_{target_domain}.json"), "w", encoding="utf-8") as f:
+        json.dump({"meta": {
+            "browser": args.browser,
+            "profile": args.profile_name,
+            "mode": args.mode,
+            "imported_at": int(started_at),
+            "url": url,
+            "cookie_file": os.path.abspath(cookie_file),  # verify reads it from any working dir
+            "applied": applied,
+            "skipped": skipped,
+            "domains": domains,
+            "verify": verified,
+            "variant": ((payload.get("meta") or {}).get("filter") or {}).get("ruleset"),
+            "screenshot": screenshot,
+            "timings": timings
+        }}, f, indent=2, ensure_ascii=False)
+    if args.trace:
+        path = timer.write_trace(os.path.join(base_dir, f"trace_import_{target_domain}.json"))
+        print(f"[ARTIFACT] Trace saved -> {path}")
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,23 @@
 # tools/make_all_except_auth.py
-import json, sys, os
+import sys
+
+from cookielab import artifact, filters
 
 if len(sys.argv) < 3:
-    print("Usage: py -3 tools\\make_all_except_auth.py <in.json> <out.json>")
+    print("Usage: py -3 tools\\make_all_except_auth.py <in.json> <out.json>   (.ndjson[.gz|.zst] work too)")
+    print("       (whole trees / other variants: python -m cookielab filter <src> <out_dir> --rules ...)")
     raise SystemExit(1)
 
 src = sys.argv[1]
 dst = sys.argv[2]
 
-with open(src, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-# Exclude authentication-related cookies only (add more here if needed)
-DENY = {"reddit_session", "token_v2", "csrf_token"}
+data = artifact.read(src)
 
-kept = [c for c in data.get("cookies", []) if c.get("name") not in DENY]
-data["cookies"] = kept
+# Exclude authentication-related cookies only (extend filters.AUTH_NAMES if needed)
+rs = filters.RuleSet("all-except-auth", filters.BUILTIN_RULESETS["all-except-auth"])
+data = filters.filter_payload(data, rs, source=src)
+kept = data if isinstance(data, list) else data.get("cookies", [])
 
-os.makedirs(os.path.dirname(dst), exist_ok=True)
-with open(dst, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
+artifact.write(dst, data)
 
 print(f"kept {len(kept)} cookies -> {dst}")
-
-
-